@@ -2,13 +2,41 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     database_url: str
+    lock_pool_size: int = 5  # Connections per worker for holding advisory locks (separate from requests)
+    lock_pool_timeout_seconds: int = 5  # Give up on a lock if no lock connection frees up in time
     postgres_password: str
     gemini_api_key: str
     resend_api_key: str
     resend_webhook_secret: str = ""  # Optional — for webhook signature verification
+    webhook_retention_days: int = 7  # Applied/skipped inbox events are deleted after this (min 1 — Svix retries for ~a day)
     api_base_url: str = "http://localhost:8000"
     ai_provider: str
     secret_key: str
+    discovery_fuzzy_match: bool = False  # Trigram fallback for discovery cache misses (needs pg_trgm)
+    discovery_fuzzy_threshold: float = 0.6
+    discovery_cache_fresh_seconds: int = 7 * 24 * 3600  # Served as-is while younger than this
+    discovery_cache_max_age_seconds: int = 90 * 24 * 3600  # Refreshed in the background until this old, then inline
+    ai_requests_per_minute: int = 10  # Shared AI call budget across all workers (0 = unlimited)
+    ai_tokens_per_minute: int = 250_000  # Shared AI token budget across all workers (0 = unlimited)
+    ai_request_burst: int = 1  # Calls allowed back-to-back before spacing kicks in
+    ai_rate_limit_max_wait_seconds: int = 120  # Fail a call instead of queueing longer than this
+    pitch_cache_enabled: bool = True  # Reuse generated pitches for identical brand/profile inputs
+    pitch_cache_ttl_seconds: int = 30 * 24 * 3600  # Cached pitches older than this are regenerated
+    pitch_cache_max_entries: int = 10_000  # Least recently used rows beyond this are evicted
+    pitch_cache_memory_entries: int = 256  # Per-worker LRU in front of the table
+    autopilot_queue_size: int = 20  # Items buffered between autopilot pipeline stages
+    autopilot_create_workers: int = 2  # Threads saving accepted discovered brands
+    autopilot_create_per_minute: int = 0  # 0 = unlimited
+    autopilot_generate_workers: int = 2  # Threads making (batched) pitch generation calls
+    autopilot_generate_per_minute: int = 0  # On top of the shared AI rate limit (0 = unlimited)
+    autopilot_send_workers: int = 2  # Threads sending approved pitches
+    autopilot_send_per_minute: int = 60  # Email provider pacing (0 = unlimited)
+    autopilot_work_lease_seconds: int = 900  # A claimed work item is reclaimable after this long without progress
+    autopilot_work_max_attempts: int = 3  # Failed steps before a work item is given up on
+    autopilot_pool_low_water: int = 5  # Pooled candidates left before a run discovers more
+    autopilot_pool_refill_size: int = 10  # Brands asked for per refill discovery call (at most the provider's max_discovered_brands)
+    autopilot_pool_max_age_days: int = 14  # Pooled candidates older than this are dropped
+    scheduler_leader_poll_seconds: int = 30  # How often workers check/claim background scheduler leadership
 
     class Config:
         env_file = ".env"
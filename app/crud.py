@@ -1,14 +1,42 @@
+"""Database reads and writes for every model.
+
+Commit hooks: sessions made by app.database.SessionLocal run four
+listeners (registered next to analytics_cache) —
+
+- before_flush notes brand/pitch inserts, deletes and pitch status
+  changes as deltas for the analytics_counters rows
+- before_commit flushes, then writes the rollup events buffered by
+  record_rollup_event (one upsert per event type) and the counter deltas
+  (one upsert), in the committing transaction
+- after_commit clears analytics_cache if a pitch event was committed
+- after_rollback drops the buffered events, deltas and that flag
+
+so a caller only has to commit. A Session built some other way gets none
+of this: buffered rollup events would never be written, and its brand
+and pitch changes would not reach the counters (rebuild them with
+python -m app.tasks.rebuild_analytics_rollup).
+"""
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timezone
+from sqlalchemy import func, inspect, select, text, update, and_, or_, cast, column, values as sa_values, Date, Integer, String, TIMESTAMP
+from sqlalchemy.event import listens_for
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timezone, date, timedelta
+import re
+import unicodedata
 from app.models import (
     Brand as BrandModel, Profile as ProfileModel, Pitch as PitchModel,
-    AutopilotConfig as AutopilotConfigModel, AutopilotLog as AutopilotLogModel
+    AutopilotConfig as AutopilotConfigModel, AutopilotLog as AutopilotLogModel,
+    AnalyticsDailyRollup as AnalyticsDailyRollupModel, AnalyticsCounter as AnalyticsCounterModel,
+    WebhookEvent as WebhookEventModel,
+    BrandDiscoveryCache as BrandDiscoveryCacheModel, DiscoverySearchLease as DiscoverySearchLeaseModel,
+    PitchGenerationCache as PitchGenerationCacheModel,
+    AIUsageDaily as AIUsageDailyModel, AutopilotWorkItem as AutopilotWorkItemModel
 )
 from typing import Optional, List, Union, Dict
-from app.services.gemini import GeminiProvider
+from app.services.cache import TTLCache
 from app.schemas import BrandCreate, BrandUpdate, ProfileCreate, ProfileUpdate, PitchCreate, PitchUpdate
 from app.config import settings
+from app.database import SessionLocal
 
 
 def create_brand(db: Session, brand: Union[BrandCreate, Dict]) -> BrandModel:
@@ -33,7 +61,7 @@ def create_brand(db: Session, brand: Union[BrandCreate, Dict]) -> BrandModel:
 
 
 def get_brand(db: Session, brand_id: int) -> Optional[BrandModel]:
-    return db.query(BrandModel).filter(BrandModel.id == brand_id).first()
+    return db.get(BrandModel, brand_id)
 
 
 def get_brands(
@@ -84,12 +112,49 @@ def delete_brand(db: Session, brand_id: int) -> bool:
     return True
 
 
+def get_brands_by_ids(db: Session, brand_ids: List[int]) -> Dict[int, BrandModel]:
+    """Load many brands with one IN query (they stay in the session's identity map)."""
+    if not brand_ids:
+        return {}
+    brands = db.query(BrandModel).filter(BrandModel.id.in_(brand_ids)).all()
+    return {brand.id: brand for brand in brands}
+
+
 def get_brand_by_email(db: Session, email: str) -> Optional[BrandModel]:
     """Check if a brand with this email already exists."""
     return db.query(BrandModel).filter(BrandModel.email == email).first()
 
 
-def update_brand_status(db: Session, brand_id: int, status: str) -> Optional[BrandModel]:
+def get_existing_brand_emails(db: Session, emails: List[str]) -> Dict[str, int]:
+    """Which of these emails already belong to a brand (case-insensitively), with one IN query.
+    
+    Returns:
+        lowercased email → brand id
+    """
+    candidates = {email.lower() for email in emails if email}
+    if not candidates:
+        return {}
+    rows = db.query(BrandModel.email, BrandModel.id).filter(
+        func.lower(BrandModel.email).in_(candidates)
+    ).all()
+    return {email.lower(): brand_id for email, brand_id in rows}
+
+
+def _save(db: Session, instance, commit: bool = True) -> None:
+    """Commit + refresh, or leave the change pending when the caller owns the transaction.
+    
+    Batch callers (e.g. the webhook event consumer) pass commit=False to
+    several CRUD functions and commit once at the end of the batch — the
+    pending changes are written in one flush at commit time.
+    """
+    if commit:
+        db.commit()
+        db.refresh(instance)
+    else:
+        db.add(instance)
+
+
+def update_brand_status(db: Session, brand_id: int, status: str, commit: bool = True) -> Optional[BrandModel]:
     """Update a brand's status to reflect where it is in the pitch lifecycle.
     
     Status flow:
@@ -100,6 +165,7 @@ def update_brand_status(db: Session, brand_id: int, status: str) -> Optional[Bra
         db: Database session
         brand_id: The brand to update
         status: New status string
+        commit: False to leave committing to the caller (batch processing)
     
     Returns:
         Updated BrandModel, or None if brand not found
@@ -110,107 +176,234 @@ def update_brand_status(db: Session, brand_id: int, status: str) -> Optional[Bra
     
     brand.status = status
     brand.last_pitched_at = datetime.now(timezone.utc) if status == "pitched" else brand.last_pitched_at
-    db.commit()
-    db.refresh(brand)
+    _save(db, brand, commit)
     return brand
 
 
-def get_discovered_brand_cache(db: Session, brand_name: str) -> Optional[dict]:
-    """Check if we've already discovered this brand via AI.
+def _is_latin(char: str) -> bool:
+    return unicodedata.name(char, "").startswith("LATIN ")
+
+
+def normalize_brand_key(brand_name: str) -> str:
+    """Normalize a brand name into the discovery cache key.
     
-    Searches the brands table for any entry that:
-    1. Has a name containing the brand_name (case-insensitive)
-    2. Was discovered by AI (discovered_by_ai = True)
-    3. Has cached metadata stored in brand_metadata
+    Case-folds, strips accents from Latin letters and drops everything
+    that isn't a letter, digit or (non-Latin) combining mark, so "CeraVe",
+    "cerave " and "Cera-Ve" share one key while "Dove" and "Dovetail" stay
+    different. Marks are part of the letter in other scripts ("バス" is not
+    "ハス", "कुल" is not "कल"), so they are kept there. A trailing "(...)"
+    label such as "(discovered)" or "(pr)" is ignored.
     
-    If found, returns the cached discovery data so we don't
-    have to call the Gemini API again.
+    Examples:
+        "L'Oréal Paris" → "lorealparis"
+        "CeraVe (discovered)" → "cerave"
+        "資生堂" → "資生堂"
+        "Лэтуаль" → "лэтуаль"
+    """
+    name = re.sub(r"\s*\([^)]*\)\s*$", "", brand_name or "")
+    # NFKC folds compatibility forms (full-width letters, ligatures) and
+    # composes each letter with its marks, so a mark stays with its letter
+    name = unicodedata.normalize("NFKC", unicodedata.normalize("NFKC", name).casefold())
+    
+    key = []
+    after_latin = False
+    for char in name:
+        category = unicodedata.category(char)
+        if category.startswith("M"):
+            if not after_latin:
+                key.append(char)  # vowel signs, dakuten, ... change the letter
+            continue
+        if category[0] not in "LN":
+            after_latin = False
+            continue
+        base = unicodedata.normalize("NFD", char)[0]
+        after_latin = _is_latin(base)
+        key.append(base if after_latin else char)
+    return "".join(key)[:255]
+
+
+def get_discovery_cache_entry(db: Session, brand_name: str) -> Optional[BrandDiscoveryCacheModel]:
+    """Find the discovery cache entry for a brand name.
+    
+    Looks the normalized brand key up in brand_discovery_cache — a single
+    unique-index probe with exactly one possible match. If
+    settings.discovery_fuzzy_match is enabled (requires the pg_trgm
+    extension, see app.tasks.upgrade_schema), a miss falls back to the
+    most similar key above settings.discovery_fuzzy_threshold.
     
     Args:
         db: Database session
         brand_name: Brand name to search for (e.g., "CeraVe")
     
     Returns:
-        dict: Cached discovery data matching BrandDiscoveryResponse format
-        None: If brand hasn't been discovered before
+        The cache entry (discovery_data + discovered_at), or None
     """
-    # Search for any AI-discovered brand with a matching name
-    # func.lower() makes it case-insensitive: "cerave" matches "CeraVe (pr)"
-    # .like() with % wildcards matches partial names: "CeraVe" matches "CeraVe (pr)"
-    cached_brand = db.query(BrandModel).filter(
-        func.lower(BrandModel.name).like(f"%{brand_name.lower()}%"),
-        BrandModel.discovered_by_ai.is_(True)
+    brand_key = normalize_brand_key(brand_name)
+    if not brand_key:
+        return None
+    
+    cached = db.query(BrandDiscoveryCacheModel).filter(
+        BrandDiscoveryCacheModel.brand_key == brand_key
     ).first()
     
-    # If no match found, or match has no cached metadata, return None
-    if not cached_brand or not cached_brand.brand_metadata:
-        return None
+    if not cached and settings.discovery_fuzzy_match:
+        # Trigram fallback for typos ("cerav" → "cerave"). The % operator
+        # uses the GIN trigram index; ties resolve by key for determinism.
+        similarity = func.similarity(BrandDiscoveryCacheModel.brand_key, brand_key)
+        cached = db.query(BrandDiscoveryCacheModel).filter(
+            BrandDiscoveryCacheModel.brand_key.op("%")(brand_key),
+            similarity >= settings.discovery_fuzzy_threshold
+        ).order_by(similarity.desc(), BrandDiscoveryCacheModel.brand_key).first()
     
-    # Return the cached metadata (it's already in BrandDiscoveryResponse format)
-    return cached_brand.brand_metadata
+    return cached
 
 
-def cache_discovered_brand(db: Session, discovery_data: dict) -> BrandModel:
-    """Save Gemini discovery results to the database as a cache entry.
+def get_discovery_cache_entries(db: Session, brand_keys: List[str]) -> Dict[str, BrandDiscoveryCacheModel]:
+    """Look up many normalized brand keys with one IN query (exact matches only)."""
+    if not brand_keys:
+        return {}
+    entries = db.query(BrandDiscoveryCacheModel).filter(
+        BrandDiscoveryCacheModel.brand_key.in_(brand_keys)
+    ).all()
+    return {entry.brand_key: entry for entry in entries}
+
+
+def get_discovered_brand_cache(db: Session, brand_name: str) -> Optional[dict]:
+    """Check if we've already discovered this brand via AI.
+    
+    If found, returns the cached discovery data so we don't
+    have to call the Gemini API again. Freshness is ignored here — see
+    app.services.discovery for the stale-while-revalidate policy.
     
-    Creates ONE brand entry specifically for caching purposes:
-    - Uses the first contact email as the brand email
-    - Stores the FULL discovery response in brand_metadata (JSONB)
-    - Marks discovered_by_ai = True so we can find it later
-    - Sets status to 'discovered' (not 'not_contacted')
+    Returns:
+        dict: Cached discovery data matching BrandDiscoveryResponse format
+        None: If brand hasn't been discovered before
+    """
+    cached = get_discovery_cache_entry(db, brand_name)
+    return cached.discovery_data if cached else None
+
+
+def cache_discovered_brand(
+    db: Session, discovery_data: dict, search_name: Optional[str] = None
+) -> List[str]:
+    """Save Gemini discovery results to the discovery cache.
     
-    This cache entry exists so that future searches for the same brand
-    return instantly from the database instead of calling the API.
+    The result is stored under the normalized key of the name Gemini
+    returned AND of the name the user searched for (if different), so
+    both "CeraVe" and "cerave skincare" hit the cache next time. Existing
+    entries are overwritten with the fresh data (upsert on brand_key).
     
-    The actual brand entries for pitching are created later by the
-    /discover/pitch endpoint (one per selected contact).
+    Cache entries live in their own table — the brands table only holds
+    real contacts, created later by the /discover/pitch endpoint (one per
+    selected contact).
     
     Args:
         db: Database session
         discovery_data: Full response from gemini.discover_brand_contacts()
+        search_name: The brand name as the user searched for it
     
     Returns:
-        BrandModel: The created cache entry
+        The brand keys that were written
     """
-    brand_name = discovery_data.get("brand_name", "Unknown")
+    brand_name = discovery_data.get("brand_name") or search_name or "Unknown"
+    brand_keys = {normalize_brand_key(brand_name), normalize_brand_key(search_name or "")}
+    brand_keys.discard("")
+    if not brand_keys:
+        return []
     
-    # ALWAYS use a placeholder email for cache entries.
-    # Previously, we used the first contact's real email here, which caused
-    # the "ghost brand" bug: when /discover/pitch later tried to create a brand
-    # with that same real email, get_brand_by_email() found this cache entry
-    # and marked the contact as "duplicate" — so the real brand was never created,
-    # and the pitch was never generated. The cache entry would sit in the database
-    # with a name like "CeraVe (discovered)" and no pitch attached.
-    cache_email = f"cache-{brand_name.lower().replace(' ', '-')}@discovered.hermes"
+    now = datetime.now(timezone.utc)
+    stmt = pg_insert(BrandDiscoveryCacheModel).values([
+        {"brand_key": key, "brand_name": brand_name[:255], "discovery_data": discovery_data, "discovered_at": now}
+        for key in sorted(brand_keys)
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["brand_key"],
+        set_={
+            "brand_name": stmt.excluded.brand_name,
+            "discovery_data": stmt.excluded.discovery_data,
+            "discovered_at": stmt.excluded.discovered_at,
+            "updated_at": func.now(),
+        }
+    )
+    db.execute(stmt)
+    db.commit()
+    return sorted(brand_keys)
+
+
+def claim_discovery_lease(db: Session, brand_key: str, holder: str, lease_seconds: int) -> bool:
+    """Claim the right to search a brand key, unless another search holds a live lease.
     
-    # Check if this exact cache entry already exists (avoid duplicates)
-    existing = get_brand_by_email(db, cache_email)
-    if existing:
-        # Update the existing entry's metadata with fresh data
-        existing.brand_metadata = discovery_data
-        existing.discovered_at = datetime.now(timezone.utc)
-        db.commit()
-        db.refresh(existing)
-        return existing
+    One conditional upsert: the row is inserted, or taken over if its
+    lease has run out — so exactly one of several racing workers wins.
     
-    # Create a new cache entry
-    cache_brand = BrandModel(
-        name=f"{brand_name} (discovered)",
-        email=cache_email,
-        website=discovery_data.get("website"),
-        instagram=discovery_data.get("instagram"),
-        category=discovery_data.get("category"),
-        notes=discovery_data.get("description"),
-        status="discovered",
-        discovered_by_ai=True,
-        discovered_at=datetime.now(timezone.utc),
-        brand_metadata=discovery_data
+    Returns:
+        True if this holder now owns the lease
+    """
+    now = datetime.now(timezone.utc)
+    stmt = pg_insert(DiscoverySearchLeaseModel).values(
+        brand_key=brand_key,
+        holder=holder,
+        searching_until=now + timedelta(seconds=lease_seconds),
     )
-    db.add(cache_brand)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["brand_key"],
+        set_={"holder": stmt.excluded.holder, "searching_until": stmt.excluded.searching_until},
+        where=DiscoverySearchLeaseModel.searching_until < now,
+    ).returning(DiscoverySearchLeaseModel.brand_key)
+    claimed = db.execute(stmt).scalar() is not None
+    db.commit()
+    return claimed
+
+
+def release_discovery_lease(db: Session, brand_key: str, holder: str) -> None:
+    """Drop a lease this holder owns (a no-op if it ran out and was taken over)."""
+    db.query(DiscoverySearchLeaseModel).filter(
+        DiscoverySearchLeaseModel.brand_key == brand_key,
+        DiscoverySearchLeaseModel.holder == holder
+    ).delete(synchronize_session=False)
     db.commit()
-    db.refresh(cache_brand)
+
+
+def backfill_discovery_cache(db: Session) -> int:
+    """Copy legacy discovery cache entries from the brands table.
+    
+    Before brand_discovery_cache existed, discoveries were cached as
+    placeholder brands ("<name> (discovered)", cache-...@discovered.hermes)
+    with the payload in brand_metadata. Existing keys are left untouched,
+    so this is safe to re-run.
+    
+    Returns:
+        Number of cache rows inserted
+    """
+    legacy = db.query(BrandModel).filter(
+        BrandModel.discovered_by_ai.is_(True),
+        BrandModel.brand_metadata.isnot(None)
+    ).order_by(BrandModel.discovered_at.desc().nullslast(), BrandModel.id.desc()).all()
+    
+    # Newest discovery wins when several legacy rows normalize to one key
+    rows = {}
+    for brand in legacy:
+        metadata = brand.brand_metadata if isinstance(brand.brand_metadata, dict) else None
+        if not metadata or "contacts" not in metadata:
+            continue
+        brand_name = metadata.get("brand_name") or brand.name
+        brand_key = normalize_brand_key(brand_name)
+        if brand_key and brand_key not in rows:
+            rows[brand_key] = {
+                "brand_key": brand_key,
+                "brand_name": brand_name[:255],
+                "discovery_data": metadata,
+                "discovered_at": brand.discovered_at or brand.created_at,
+            }
     
-    return cache_brand
+    if not rows:
+        return 0
+    
+    stmt = pg_insert(BrandDiscoveryCacheModel).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_nothing(index_elements=["brand_key"]).returning(BrandDiscoveryCacheModel.id)
+    inserted = len(db.execute(stmt).all())
+    db.commit()
+    return inserted
 
 
 # ============ Creator Profile CRUD ============
@@ -318,34 +511,177 @@ def delete_pitch(db: Session, pitch_id: int) -> bool:
     db.commit()
     return True
 
-def update_pitch_after_send(db: Session, pitch_id: int, tracking_pixel_id: str) -> PitchModel:
+def update_pitch_after_send(
+    db: Session,
+    pitch_id: int,
+    tracking_pixel_id: str,
+    resend_email_id: Optional[str] = None
+) -> PitchModel:
     pitch = db.query(PitchModel).filter(PitchModel.id == pitch_id).first()
     if pitch:
+        first_send = pitch.sent_at is None
         pitch.status = "sent"
         pitch.tracking_pixel_id = tracking_pixel_id
+        pitch.resend_email_id = resend_email_id
         pitch.sent_at = datetime.now(timezone.utc)
+        if first_send:
+            record_rollup_event(db, pitch, "sent", pitch.sent_at)
         db.commit()
         db.refresh(pitch)
     return pitch
 
+def get_pitch_by_resend_email_id(db: Session, resend_email_id: str) -> Optional[PitchModel]:
+    """Find the pitch a Resend email ID belongs to (unique index lookup)."""
+    return db.query(PitchModel).filter(PitchModel.resend_email_id == resend_email_id).first()
+
 # ============ TRACKING PIXEL CRUD ============
 
 def get_pitch_by_tracking_id(db: Session, tracking_pixel_id: str):
     pitch = db.query(PitchModel).filter(PitchModel.tracking_pixel_id == tracking_pixel_id).first()
     return pitch
     
-def record_pitch_opened(db: Session, pitch_id: int):
-    pitch = db.query(PitchModel).filter(PitchModel.id == pitch_id).first()
-    if pitch and not pitch.opened_at:
-        pitch.opened_at = datetime.now(timezone.utc)
+def record_pitch_opens_bulk(
+    db: Session,
+    opens: Dict[str, datetime],
+    opens_by_pitch_id: Optional[Dict[int, datetime]] = None
+) -> List[str]:
+    """Record many tracking pixel opens with batched UPDATEs.
+    
+    Used by the tracking pixel write-behind buffer. Runs
+    UPDATE pitches ... FROM (VALUES ...) WHERE opened_at IS NULL — once keyed
+    by primary key for signed tracking IDs, once keyed by tracking_pixel_id
+    for legacy UUID pixels — so pixels that were already opened (or don't
+    exist) are ignored by the database without any extra lookups. The
+    rollup is updated in the same transaction.
+    
+    Args:
+        db: Database session
+        opens: {legacy tracking_pixel_id: first time the pixel was hit}
+        opens_by_pitch_id: {pitch_id: first hit time} for verified signed IDs
+    
+    Returns:
+        list of tracking pixel IDs whose pitches were newly marked as opened
+    """
+    returning = (PitchModel.id, PitchModel.tracking_pixel_id, PitchModel.brand_id,
+                 PitchModel.mode, PitchModel.sent_at, PitchModel.opened_at)
+    opened = []
+    
+    if opens_by_pitch_id:
+        batch = sa_values(
+            column("pitch_id", Integer),
+            column("opened_at", TIMESTAMP),
+            name="pixel_opens_by_id"
+        ).data([(pitch_id, _naive_utc(opened_at)) for pitch_id, opened_at in opens_by_pitch_id.items()])
+        
+        stmt = (
+            update(PitchModel)
+            .where(PitchModel.id == batch.c.pitch_id, PitchModel.opened_at.is_(None))
+            .values(opened_at=batch.c.opened_at)
+            .returning(*returning)
+            .execution_options(synchronize_session=False)
+        )
+        opened += db.execute(stmt).all()
+    
+    if opens:
+        batch = sa_values(
+            column("tracking_pixel_id", String),
+            column("opened_at", TIMESTAMP),
+            name="pixel_opens"
+        ).data([(pixel_id, _naive_utc(opened_at)) for pixel_id, opened_at in opens.items()])
+        
+        stmt = (
+            update(PitchModel)
+            .where(
+                PitchModel.tracking_pixel_id == batch.c.tracking_pixel_id,
+                PitchModel.opened_at.is_(None)
+            )
+            .values(opened_at=batch.c.opened_at)
+            .returning(*returning)
+            .execution_options(synchronize_session=False)
+        )
+        opened += db.execute(stmt).all()
+    
+    if not opened:
         db.commit()
-        db.refresh(pitch)
+        return []
+    
+    record_rollup_events(db, "opened", [(row, row.opened_at) for row in opened])
+    db.commit()
+    return [row.tracking_pixel_id for row in opened]
+
+
+def get_opened_tracking_ids(db: Session, tracking_pixel_ids: List[str]) -> set:
+    """Return which of the given tracking pixel IDs belong to already-opened pitches."""
+    if not tracking_pixel_ids:
+        return set()
+    rows = db.query(PitchModel.tracking_pixel_id).filter(
+        PitchModel.tracking_pixel_id.in_(tracking_pixel_ids),
+        PitchModel.opened_at.isnot(None)
+    ).all()
+    return {row.tracking_pixel_id for row in rows}
+
+
+def get_recently_opened_tracking_ids(db: Session, limit: int = 10000) -> List[str]:
+    """Tracking pixel IDs of the most recently opened pitches (newest first).
+    
+    Used to warm the in-memory "already opened" cache on startup. Reads only
+    the tracking_pixel_id column, walking the opened_at index.
+    """
+    rows = db.query(PitchModel.tracking_pixel_id).filter(
+        PitchModel.opened_at.isnot(None),
+        PitchModel.tracking_pixel_id.isnot(None)
+    ).order_by(PitchModel.opened_at.desc()).limit(limit).all()
+    return [row.tracking_pixel_id for row in rows]
+
+def record_pitch_opened(
+    db: Session,
+    pitch_id: int,
+    occurred_at: Optional[datetime] = None,
+    commit: bool = True
+):
+    pitch = db.get(PitchModel, pitch_id)
+    if pitch and not pitch.opened_at:
+        pitch.opened_at = occurred_at or datetime.now(timezone.utc)
+        record_rollup_event(db, pitch, "opened", pitch.opened_at)
+        _save(db, pitch, commit)
     return pitch
 
 
 # ============ BRAND DISCOVERY CRUD ============
 
-def generate_and_create_pitch(db: Session, brand_id: int, creator_profile_id: int) -> PitchModel:
+def _pitch_brand_data(brand: BrandModel) -> dict:
+    """The brand fields a pitch is generated from."""
+    return {
+        "name": brand.name,
+        "website": brand.website,
+        "category": brand.category,
+        "notes": brand.notes,
+        "instagram": brand.instagram
+    }
+
+
+def _pitch_profile_data(profile: ProfileModel) -> dict:
+    """The creator profile fields a pitch is generated from."""
+    return {
+        "name": profile.name,
+        "bio": profile.bio,
+        "niches": profile.niches,
+        "interests": profile.interests,
+        "content_style": profile.content_style,
+        "unique_angle": profile.unique_angle,
+        "top_performing_content": profile.top_performing_content,
+        "tiktok_url": profile.tiktok_url,
+        "portfolio_url": profile.portfolio_url,
+        "sender_email": profile.sender_email,
+        "follower_count": profile.follower_count,
+        "avg_views": profile.avg_views,
+        "engagement_rate": float(profile.engagement_rate) if profile.engagement_rate else None
+    }
+
+
+def generate_and_create_pitch(
+    db: Session, brand_id: int, creator_profile_id: int, force_regenerate: bool = False
+) -> PitchModel:
     """Generate a pitch using AI and save it to database.
     
     This is a reusable function called by:
@@ -354,38 +690,22 @@ def generate_and_create_pitch(db: Session, brand_id: int, creator_profile_id: in
     
     It does three things:
     1. Fetches brand + profile data from the database
-    2. Calls Gemini to generate a personalized pitch
+    2. Calls Gemini to generate a personalized pitch (or reuses a cached
+       generation for identical inputs, unless force_regenerate is set)
     3. Saves the pitch to the database as a draft
     """
+    # Local import: the pitch cache service imports this module
+    from app.services.pitch_cache import generate_pitch_cached
+    
     # Fetch the brand and profile from the database
     brand = get_brand(db, brand_id)
     profile = get_profile(db)
     
-    # Generate pitch using Gemini AI
-    gemini = GeminiProvider()
-    ai_response = gemini.generate_pitch(
-        brand_data={
-            "name": brand.name,
-            "website": brand.website,
-            "category": brand.category,
-            "notes": brand.notes,
-            "instagram": brand.instagram
-        },
-        profile_data={
-            "name": profile.name,
-            "bio": profile.bio,
-            "niches": profile.niches,
-            "interests": profile.interests,
-            "content_style": profile.content_style,
-            "unique_angle": profile.unique_angle,
-            "top_performing_content": profile.top_performing_content,
-            "tiktok_url": profile.tiktok_url,
-            "portfolio_url": profile.portfolio_url,
-            "sender_email": profile.sender_email,
-            "follower_count": profile.follower_count,
-            "avg_views": profile.avg_views,
-            "engagement_rate": float(profile.engagement_rate) if profile.engagement_rate else None
-        }
+    # Generate pitch using the shared AI provider (through the pitch cache)
+    ai_response = generate_pitch_cached(
+        brand_data=_pitch_brand_data(brand),
+        profile_data=_pitch_profile_data(profile),
+        force_regenerate=force_regenerate
     )
     
     # Create a PitchCreate schema object (same as what the /pitches/generate endpoint does)
@@ -402,7 +722,87 @@ def generate_and_create_pitch(db: Session, brand_id: int, creator_profile_id: in
     return new_pitch
 
 
-def send_pitch_email(db: Session, pitch_id: int) -> PitchModel:
+def save_generated_pitches(
+    db: Session,
+    brand_ids: List[int],
+    generated: Dict[int, dict],
+    creator_profile_id: int,
+    mode: str = "manual",
+    auto_approved: bool = False,
+) -> List[dict]:
+    """Save batch-generated pitches as drafts, one result item per requested brand.
+    
+    Args:
+        brand_ids: The brands asked for, in order
+        generated: brand_id → {pitch, status, error} from generate_pitches_batch_cached
+            (brands missing from it weren't found)
+    
+    Returns:
+        [{brand_id, status, pitch, error}, ...] — pitch is the saved PitchModel,
+        or None (status "failed") if generation or saving failed
+    """
+    results = []
+    for brand_id in brand_ids:
+        outcome = generated.get(brand_id)
+        item = {"brand_id": brand_id, "status": "failed", "pitch": None, "error": None}
+        if outcome is None:
+            item["error"] = "Brand not found"
+        elif outcome["pitch"] is None:
+            item["error"] = outcome["error"]
+        else:
+            try:
+                item["pitch"] = create_pitch(db, PitchCreate(
+                    brand_id=brand_id,
+                    subject=outcome["pitch"]["subject"],
+                    body=outcome["pitch"]["body"],
+                    mode=mode,
+                    auto_approved=auto_approved,
+                ), creator_profile_id)
+                item["status"] = outcome["status"]
+            except Exception as e:
+                db.rollback()
+                item["error"] = str(e)
+        results.append(item)
+    return results
+
+
+def generate_and_create_pitches(
+    db: Session,
+    brand_ids: List[int],
+    creator_profile_id: int,
+    mode: str = "manual",
+    auto_approved: bool = False,
+    force_regenerate: bool = False,
+) -> dict:
+    """Generate pitches for several brands with batched AI calls and save them as drafts.
+    
+    Used by the autopilot run: the creator profile is sent once per batch
+    of brands instead of once per brand, and brands the batch answer got
+    wrong fall back to single generation (see generate_pitches_batch_cached).
+    
+    Returns:
+        {"results": [{brand_id, status, pitch, error}, ...] in brand_ids order,
+         "ai_calls": int} — pitch is the saved PitchModel, or None if it failed
+    """
+    # Local import: the pitch cache service imports this module
+    from app.services.pitch_cache import generate_pitches_batch_cached
+    
+    brands = get_brands_by_ids(db, brand_ids)
+    profile = get_profile(db)
+    found_ids = [brand_id for brand_id in brand_ids if brand_id in brands]
+    
+    generated = generate_pitches_batch_cached(
+        [_pitch_brand_data(brands[brand_id]) for brand_id in found_ids],
+        _pitch_profile_data(profile),
+        force_regenerate=force_regenerate,
+    )
+    results = save_generated_pitches(
+        db, brand_ids, dict(zip(found_ids, generated["results"])), creator_profile_id, mode, auto_approved
+    )
+    return {"results": results, "ai_calls": generated["ai_calls"]}
+
+
+def send_pitch_email(db: Session, pitch_id: int, idempotency_key: Optional[str] = None) -> PitchModel:
     """Send a pitch email and update its status.
     
     This is a reusable function called by:
@@ -416,6 +816,8 @@ def send_pitch_email(db: Session, pitch_id: int) -> PitchModel:
     4. Updates the pitch status to "sent" with the tracking pixel ID
     
     It reuses the same email helper functions that the /pitches/{id}/send endpoint uses.
+    Pass an idempotency_key when the send may be a retry of one that
+    already went out (the autopilot work queue does).
     """
     from app.services.email import send_email_via_resend, generate_tracking_pixel_id, embed_tracking_pixel
     
@@ -426,7 +828,7 @@ def send_pitch_email(db: Session, pitch_id: int) -> PitchModel:
     
     # Generate tracking pixel ID and embed it in the HTML body
     # Uses the SAME functions as the /pitches/{id}/send endpoint
-    tracking_pixel_id = generate_tracking_pixel_id()
+    tracking_pixel_id = generate_tracking_pixel_id(pitch.id)
     body_with_pixel = embed_tracking_pixel(
         body=pitch.body,
         tracking_pixel_id=tracking_pixel_id,
@@ -434,15 +836,16 @@ def send_pitch_email(db: Session, pitch_id: int) -> PitchModel:
     )
     
     # Send the email via Resend
-    send_email_via_resend(
+    resend_email_id = send_email_via_resend(
         to_email=brand.email,
         subject=pitch.subject,
         body_html=body_with_pixel,
-        reply_to=profile.sender_email
+        reply_to=profile.sender_email,
+        idempotency_key=idempotency_key
     )
     
     # Update pitch status using the existing function
-    updated_pitch = update_pitch_after_send(db, pitch_id, tracking_pixel_id)
+    updated_pitch = update_pitch_after_send(db, pitch_id, tracking_pixel_id, resend_email_id)
     
     # Update the brand's status to "pitched"
     update_brand_status(db, brand.id, "pitched")
@@ -450,34 +853,131 @@ def send_pitch_email(db: Session, pitch_id: int) -> PitchModel:
     return updated_pitch
 
 
+# ============ PITCH GENERATION CACHE CRUD ============
+
+def get_pitch_cache_entry(db: Session, cache_key: str, max_age_seconds: int) -> Optional[PitchGenerationCacheModel]:
+    """Look up a cached generation, ignoring entries older than max_age_seconds."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+    return db.query(PitchGenerationCacheModel).filter(
+        PitchGenerationCacheModel.cache_key == cache_key,
+        PitchGenerationCacheModel.created_at >= cutoff
+    ).first()
+
+
+def touch_pitch_cache_entries(db: Session, hits_by_id: Dict[int, int]) -> None:
+    """Record buffered cache hits in one UPDATE (drives LRU eviction).
+    
+    Args:
+        hits_by_id: {entry id: hits since the last flush}
+    """
+    if not hits_by_id:
+        return
+    batch = sa_values(
+        column("entry_id", Integer),
+        column("hits", Integer),
+        name="pitch_cache_hits"
+    ).data(list(hits_by_id.items()))
+    
+    db.execute(
+        update(PitchGenerationCacheModel)
+        .where(PitchGenerationCacheModel.id == batch.c.entry_id)
+        .values(last_used_at=func.now(), hits=PitchGenerationCacheModel.hits + batch.c.hits)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def save_pitch_cache_entry(
+    db: Session, cache_key: str, model: str, prompt_version: str, pitch: Dict[str, str]
+) -> int:
+    """Insert or overwrite the cached generation for a key.
+    
+    Returns:
+        The entry's id
+    """
+    stmt = pg_insert(PitchGenerationCacheModel).values(
+        cache_key=cache_key,
+        model=model,
+        prompt_version=prompt_version,
+        subject=pitch["subject"],
+        body=pitch["body"],
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["cache_key"],
+        set_={
+            "subject": stmt.excluded.subject,
+            "body": stmt.excluded.body,
+            "hits": 0,
+            "created_at": func.now(),
+            "last_used_at": func.now(),
+        }
+    ).returning(PitchGenerationCacheModel.id)
+    entry_id = db.execute(stmt).scalar_one()
+    db.commit()
+    return entry_id
+
+
+def evict_pitch_cache(db: Session, max_age_seconds: int, max_entries: int) -> int:
+    """Delete expired entries, then the least recently used beyond max_entries.
+    
+    Returns:
+        Number of entries deleted
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+    expired = db.query(PitchGenerationCacheModel).filter(
+        PitchGenerationCacheModel.created_at < cutoff
+    ).delete(synchronize_session=False)
+    
+    keep = select(PitchGenerationCacheModel.id).order_by(
+        PitchGenerationCacheModel.last_used_at.desc()
+    ).limit(max_entries)
+    overflow = db.query(PitchGenerationCacheModel).filter(
+        PitchGenerationCacheModel.id.not_in(keep)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return expired + overflow
+
+
 # ============ WEBHOOK EVENT CRUD ============
 
-def record_pitch_clicked(db: Session, pitch_id: int):
+def record_pitch_clicked(
+    db: Session,
+    pitch_id: int,
+    occurred_at: Optional[datetime] = None,
+    commit: bool = True
+):
     """Record that a link in the pitch email was clicked."""
-    pitch = db.query(PitchModel).filter(PitchModel.id == pitch_id).first()
+    pitch = db.get(PitchModel, pitch_id)
     if pitch and not pitch.clicked_at:
-        pitch.clicked_at = datetime.now(timezone.utc)
-        db.commit()
-        db.refresh(pitch)
+        pitch.clicked_at = occurred_at or datetime.now(timezone.utc)
+        record_rollup_event(db, pitch, "clicked", pitch.clicked_at)
+        _save(db, pitch, commit)
     return pitch
 
 
-def record_pitch_bounced(db: Session, pitch_id: int):
+def record_pitch_bounced(
+    db: Session,
+    pitch_id: int,
+    occurred_at: Optional[datetime] = None,
+    commit: bool = True
+):
     """Record that the pitch email bounced."""
-    pitch = db.query(PitchModel).filter(PitchModel.id == pitch_id).first()
+    pitch = db.get(PitchModel, pitch_id)
     if pitch:
+        if pitch.status != "bounced":
+            record_rollup_event(db, pitch, "bounced", occurred_at or datetime.now(timezone.utc))
         pitch.status = "bounced"
-        db.commit()
-        db.refresh(pitch)
+        _save(db, pitch, commit)
     return pitch
 
 
 def record_pitch_replied(db: Session, pitch_id: int):
     """Record that the brand replied to the pitch."""
-    pitch = db.query(PitchModel).filter(PitchModel.id == pitch_id).first()
+    pitch = db.get(PitchModel, pitch_id)
     if pitch and not pitch.replied_at:
         pitch.replied_at = datetime.now(timezone.utc)
         pitch.status = "replied"
+        record_rollup_event(db, pitch, "replied", pitch.replied_at)
         db.commit()
         db.refresh(pitch)
         # Also update the brand status
@@ -485,63 +985,564 @@ def record_pitch_replied(db: Session, pitch_id: int):
     return pitch
 
 
+def get_pitches_by_resend_email_ids(db: Session, resend_email_ids: List[str]) -> Dict[str, PitchModel]:
+    """Resolve many Resend email IDs to pitches with one IN query."""
+    if not resend_email_ids:
+        return {}
+    pitches = db.query(PitchModel).filter(PitchModel.resend_email_id.in_(resend_email_ids)).all()
+    return {p.resend_email_id: p for p in pitches}
+
+
+def get_legacy_pitches_by_recipients(db: Session, emails: List[str]) -> Dict[str, PitchModel]:
+    """Resolve recipient emails to their brand's most recent active legacy pitch.
+    
+    Fallback for pitches sent before the Resend email ID was stored: only
+    pitches WITHOUT a resend_email_id are considered. Two IN queries total,
+    regardless of how many emails are passed.
+    
+    Returns:
+        dict: {recipient email: PitchModel} for every email that matched
+    """
+    if not emails:
+        return {}
+    brands = db.query(BrandModel.id, BrandModel.email).filter(BrandModel.email.in_(emails)).all()
+    email_by_brand = {b.id: b.email for b in brands}
+    if not email_by_brand:
+        return {}
+    
+    pitches = db.query(PitchModel).filter(
+        PitchModel.brand_id.in_(email_by_brand.keys()),
+        PitchModel.resend_email_id.is_(None),
+        PitchModel.status.in_(["sent", "opened", "clicked"])
+    ).order_by(PitchModel.sent_at.desc()).all()
+    
+    # Newest first — keep the first pitch seen per brand
+    result = {}
+    for pitch in pitches:
+        result.setdefault(email_by_brand[pitch.brand_id], pitch)
+    return result
+
+
+# ============ WEBHOOK INBOX CRUD ============
+
+def enqueue_webhook_event(
+    db: Session, svix_id: Optional[str], event_type: str, payload: dict
+) -> Optional[int]:
+    """Append a raw webhook event to the inbox for background processing.
+    
+    The insert is keyed on the Svix delivery ID (unique index), so a
+    retried delivery is a no-op — INSERT ... ON CONFLICT DO NOTHING.
+    Events without an svix-id are always queued.
+    
+    Returns:
+        The new inbox event ID, or None if this delivery was already received
+    """
+    stmt = pg_insert(WebhookEventModel).values(
+        svix_id=svix_id or None,
+        event_type=event_type,
+        payload=payload,
+        status="pending",
+        attempts=0,
+    ).on_conflict_do_nothing(index_elements=["svix_id"]).returning(WebhookEventModel.id)
+    
+    event_id = db.execute(stmt).scalar()
+    db.commit()
+    return event_id
+
+
+def claim_pending_webhook_events(db: Session, limit: int = 200) -> List[WebhookEventModel]:
+    """Lock the oldest pending inbox events for processing.
+    
+    Uses SELECT ... FOR UPDATE SKIP LOCKED, so several workers can drain
+    the inbox in parallel without ever processing the same event twice.
+    The locks are held until the caller commits or rolls back.
+    """
+    return db.query(WebhookEventModel).filter(
+        WebhookEventModel.status == "pending"
+    ).order_by(WebhookEventModel.id).limit(limit).with_for_update(skip_locked=True).all()
+
+
+def claim_webhook_event(db: Session, event_id: int) -> Optional[WebhookEventModel]:
+    """Lock ONE pending inbox event by ID (None if already handled or locked elsewhere)."""
+    return db.query(WebhookEventModel).filter(
+        WebhookEventModel.id == event_id,
+        WebhookEventModel.status == "pending"
+    ).with_for_update(skip_locked=True).first()
+
+
+def purge_webhook_events(db: Session, older_than_days: int, limit: int) -> int:
+    """Delete up to `limit` applied or skipped inbox events processed more than older_than_days ago.
+    
+    Failed events are kept for inspection and replay. Rows another
+    worker has locked are skipped, so concurrent purges never wait.
+    
+    Returns:
+        Number of events deleted
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    purgeable = (
+        select(WebhookEventModel.id)
+        .where(
+            WebhookEventModel.status.in_(("processed", "skipped")),
+            WebhookEventModel.processed_at < cutoff,
+        )
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .cte("purgeable")
+        .prefix_with("MATERIALIZED")  # evaluated once (see claim_autopilot_work_items)
+    )
+    deleted = db.query(WebhookEventModel).filter(
+        WebhookEventModel.id.in_(select(purgeable.c.id))
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def get_webhook_queue_stats(db: Session) -> dict:
+    """Inbox depth and lag (age of the oldest pending event)."""
+    row = db.query(
+        func.count(WebhookEventModel.id).label("depth"),
+        func.min(WebhookEventModel.received_at).label("oldest")
+    ).filter(WebhookEventModel.status == "pending").one()
+    
+    lag_seconds = None
+    if row.oldest:
+        lag_seconds = round((datetime.utcnow() - row.oldest).total_seconds(), 1)
+    
+    failed = db.query(func.count(WebhookEventModel.id)).filter(
+        WebhookEventModel.status == "failed"
+    ).scalar()
+    return {"depth": row.depth, "lag_seconds": lag_seconds, "failed": failed}
+
+
 # ============ ANALYTICS CRUD ============
 
+ROLLUP_EVENTS = ("sent", "opened", "clicked", "replied", "bounced")
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """Strip tzinfo so values compare with PostgreSQL TIMESTAMP (naive UTC) columns."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def record_rollup_event(db: Session, pitch: PitchModel, event: str, occurred_at: datetime) -> None:
+    """Add one pitch lifecycle event to the daily analytics rollup.
+    
+    Does NOT write anything yet — events are buffered on the session and
+    written right before it commits (see _flush_pending_rollup_events —
+    registered on SessionLocal, see the module docstring), so
+    the rollup is committed together with the pitch change and a batch of
+    events costs one upsert per event type instead of one per event.
+    
+    Args:
+        db: Database session
+        pitch: The pitch the event happened to
+        event: One of ROLLUP_EVENTS ("sent", "opened", "clicked", "replied", "bounced")
+        occurred_at: When the event happened (decides which day it counts for)
+    """
+    if event not in ROLLUP_EVENTS:
+        raise ValueError(f"Unknown rollup event '{event}'")
+    db.info.setdefault("rollup_pending", {}).setdefault(event, []).append((pitch, occurred_at))
+
+
+def record_rollup_events(db: Session, event: str, occurrences: List[tuple]) -> None:
+    """Add many events of the same type to the daily analytics rollup at once.
+    
+    Brand categories are resolved with one IN query, events are summed per
+    (day, category, mode) in Python, and the totals are written with a single
+    multi-row INSERT ... ON CONFLICT DO UPDATE — so the increment is atomic
+    even with several workers writing. Does NOT commit.
+    
+    Args:
+        db: Database session
+        event: One of ROLLUP_EVENTS
+        occurrences: List of (pitch, occurred_at) tuples. `pitch` can be a
+            PitchModel or any row with brand_id, mode and sent_at attributes.
+    """
+    if event not in ROLLUP_EVENTS:
+        raise ValueError(f"Unknown rollup event '{event}'")
+    if not occurrences:
+        return
+    
+    brand_ids = {pitch.brand_id for pitch, _ in occurrences}
+    categories = dict(
+        db.query(BrandModel.id, BrandModel.category).filter(BrandModel.id.in_(brand_ids)).all()
+    )
+    
+    # Sum everything per rollup row first — one VALUES row per conflict key
+    totals: Dict[tuple, dict] = {}
+    for pitch, occurred_at in occurrences:
+        occurred_at = _naive_utc(occurred_at)
+        key = (occurred_at.date(), categories.get(pitch.brand_id) or "uncategorized", pitch.mode or "manual")
+        row = totals.setdefault(key, {
+            "day": key[0], "category": key[1], "mode": key[2],
+            event: 0, "open_hours_total": 0.0, "open_hours_count": 0,
+        })
+        row[event] += 1
+        
+        # Opens also feed the average open time
+        if event == "opened" and pitch.sent_at:
+            open_hours = (occurred_at - _naive_utc(pitch.sent_at)).total_seconds() / 3600
+            if open_hours > 0:
+                row["open_hours_total"] += open_hours
+                row["open_hours_count"] += 1
+    
+    rollup = AnalyticsDailyRollupModel.__table__.c
+    stmt = pg_insert(AnalyticsDailyRollupModel).values(list(totals.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day", "category", "mode"],
+        set_={
+            event: rollup[event] + stmt.excluded[event],
+            "open_hours_total": rollup.open_hours_total + stmt.excluded.open_hours_total,
+            "open_hours_count": rollup.open_hours_count + stmt.excluded.open_hours_count,
+            "updated_at": func.now(),
+        }
+    )
+    db.execute(stmt)
+    
+    # Cached analytics are dropped once this transaction commits
+    db.info["analytics_dirty"] = True
+
+
+def rebuild_analytics_rollup(db: Session) -> int:
+    """Regenerate the whole daily rollup from the raw pitches + brands tables.
+    
+    Used after deploying the rollup for the first time, or if the rollup is
+    ever suspected to be out of sync. Runs in a single transaction, so
+    readers see either the old rollup or the new one, never a half-built one.
+    
+    Bounces have no timestamp of their own, so they are attributed to the
+    day the pitch row was last updated.
+    
+    Returns:
+        int: Number of rollup rows written
+    """
+    rollup = AnalyticsDailyRollupModel.__table__.c
+    category = func.coalesce(BrandModel.category, "uncategorized")
+    mode = func.coalesce(PitchModel.mode, "manual")
+    
+    event_sources = {
+        "sent": (PitchModel.sent_at, PitchModel.sent_at.isnot(None)),
+        "opened": (PitchModel.opened_at, PitchModel.opened_at.isnot(None)),
+        "clicked": (PitchModel.clicked_at, PitchModel.clicked_at.isnot(None)),
+        "replied": (PitchModel.replied_at, PitchModel.replied_at.isnot(None)),
+        "bounced": (PitchModel.updated_at, PitchModel.status == "bounced"),
+    }
+    open_hours = func.extract("epoch", PitchModel.opened_at - PitchModel.sent_at) / 3600
+    positive_open = PitchModel.opened_at > PitchModel.sent_at
+    
+    db.query(AnalyticsDailyRollupModel).delete(synchronize_session=False)
+    
+    for event, (occurred_at, condition) in event_sources.items():
+        day = func.date(occurred_at)
+        columns = [day.label("day"), category.label("category"), mode.label("mode"),
+                   func.count(PitchModel.id).label(event)]
+        names = ["day", "category", "mode", event]
+        
+        if event == "opened":
+            columns += [
+                func.coalesce(func.sum(open_hours).filter(positive_open), 0).label("open_hours_total"),
+                func.count(PitchModel.id).filter(positive_open).label("open_hours_count"),
+            ]
+            names += ["open_hours_total", "open_hours_count"]
+        
+        source = select(*columns).select_from(PitchModel).join(
+            BrandModel, BrandModel.id == PitchModel.brand_id
+        ).where(condition).group_by(day, category, mode)
+        
+        stmt = pg_insert(AnalyticsDailyRollupModel).from_select(names, source)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["day", "category", "mode"],
+            set_={name: rollup[name] + stmt.excluded[name] for name in names[3:]}
+        )
+        db.execute(stmt)
+    
+    db.info["analytics_dirty"] = True
+    db.commit()
+    return db.query(func.count(AnalyticsDailyRollupModel.id)).scalar()
+
+
+def rebuild_analytics_counters(db: Session) -> Dict[str, int]:
+    """Recount analytics_counters from the brands and pitches tables.
+    
+    The table is locked against the commit hook's upserts while counting,
+    so a change committed meanwhile is applied on top of the new totals
+    instead of being counted twice or lost.
+    
+    Returns:
+        The new counters, by name
+    """
+    db.execute(text("LOCK TABLE analytics_counters IN EXCLUSIVE MODE"))
+    status = func.coalesce(PitchModel.status, "draft")
+    counters = {
+        f"pitches:{pitch_status}": count
+        for pitch_status, count in db.query(status, func.count(PitchModel.id)).group_by(status)
+    }
+    counters["brands"] = db.query(func.count(BrandModel.id)).scalar()
+    
+    db.query(AnalyticsCounterModel).delete(synchronize_session=False)
+    db.execute(pg_insert(AnalyticsCounterModel).values([
+        {"name": name, "value": value} for name, value in sorted(counters.items())
+    ]))
+    db.info["analytics_dirty"] = True
+    db.commit()
+    return counters
+
+
 def get_analytics_overview(db: Session) -> dict:
     """Compute aggregate pitch stats from the database.
     
     Pure SQL queries — zero AI tokens used.
+    
+    Nothing here scans brands or pitches: totals and the status breakdown
+    are read from analytics_counters (a few rows, kept current on every
+    commit), and rates, weekly/monthly sends and the average open time
+    from the daily rollup (a few rows per day).
     """
     from datetime import timedelta
     
-    pitches = db.query(PitchModel).all()
-    brands = db.query(BrandModel).all()
-    
     # Use naive datetime to match PostgreSQL TIMESTAMP (no timezone info)
     now = datetime.utcnow()
-    week_ago = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
-    
-    # Status breakdown
-    status_counts = {"draft": 0, "sent": 0, "opened": 0, "clicked": 0, "replied": 0, "bounced": 0}
-    for p in pitches:
-        status = p.status or "draft"
-        if status in status_counts:
-            status_counts[status] += 1
-    
-    # Rates
-    sent_count = sum(1 for p in pitches if p.sent_at is not None)
-    opened_count = sum(1 for p in pitches if p.opened_at is not None)
-    replied_count = sum(1 for p in pitches if p.replied_at is not None)
+    week_ago = (now - timedelta(days=7)).date()
+    month_ago = (now - timedelta(days=30)).date()
     
-    open_rate = (opened_count / sent_count * 100) if sent_count > 0 else 0.0
-    reply_rate = (replied_count / sent_count * 100) if sent_count > 0 else 0.0
+    counters = dict(db.query(AnalyticsCounterModel.name, AnalyticsCounterModel.value).all())
+    statuses = ["draft", "sent", "opened", "clicked", "replied", "bounced"]
+    status_counts = {s: int(counters.get(f"pitches:{s}", 0)) for s in statuses}
+    total_pitches = int(sum(value for name, value in counters.items() if name.startswith("pitches:")))
+    total_brands = int(counters.get("brands", 0))
     
-    # Time-based
-    pitches_this_week = sum(1 for p in pitches if p.sent_at and p.sent_at >= week_ago)
-    pitches_this_month = sum(1 for p in pitches if p.sent_at and p.sent_at >= month_ago)
+    rollup = AnalyticsDailyRollupModel
+    totals = db.query(
+        func.coalesce(func.sum(rollup.sent), 0).label("sent"),
+        func.coalesce(func.sum(rollup.opened), 0).label("opened"),
+        func.coalesce(func.sum(rollup.replied), 0).label("replied"),
+        func.coalesce(func.sum(rollup.sent).filter(rollup.day >= week_ago), 0).label("this_week"),
+        func.coalesce(func.sum(rollup.sent).filter(rollup.day >= month_ago), 0).label("this_month"),
+        func.sum(rollup.open_hours_total).label("open_hours_total"),
+        func.sum(rollup.open_hours_count).label("open_hours_count"),
+    ).one()
     
-    # Average open time
-    open_times = []
-    for p in pitches:
-        if p.sent_at and p.opened_at:
-            delta = (p.opened_at - p.sent_at).total_seconds() / 3600
-            if delta > 0:
-                open_times.append(delta)
-    avg_open_time = sum(open_times) / len(open_times) if open_times else None
+    sent_count = totals.sent
+    open_rate = (totals.opened / sent_count * 100) if sent_count > 0 else 0.0
+    reply_rate = (totals.replied / sent_count * 100) if sent_count > 0 else 0.0
+    avg_open_time = (
+        totals.open_hours_total / totals.open_hours_count
+        if totals.open_hours_count else None
+    )
     
     return {
-        "total_brands": len(brands),
-        "total_pitches": len(pitches),
+        "total_brands": total_brands,
+        "total_pitches": total_pitches,
         "status_breakdown": status_counts,
         "open_rate": round(open_rate, 1),
         "reply_rate": round(reply_rate, 1),
-        "pitches_this_week": pitches_this_week,
-        "pitches_this_month": pitches_this_month,
+        "pitches_this_week": int(totals.this_week),
+        "pitches_this_month": int(totals.this_month),
         "avg_open_time_hours": round(avg_open_time, 1) if avg_open_time else None,
     }
 
 
+TIMESERIES_BUCKETS = ("day", "week")
+
+# Timeseries results, keyed by query parameters. Cleared whenever a pitch
+# event is committed (see _invalidate_analytics_cache), so the TTL only
+# bounds staleness for writes made by OTHER workers.
+analytics_cache = TTLCache(ttl_seconds=60, max_entries=256)
+
+
+def _pitch_counter(status: Optional[str]) -> str:
+    return f"pitches:{status or 'draft'}"
+
+
+def _committed_status(session: Session, pitch: PitchModel) -> Optional[str]:
+    """A pitch's status as the database has it (before this flush)."""
+    history = inspect(pitch).attrs.status.history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    # Never loaded in this session — the row still holds the old value
+    return session.execute(select(PitchModel.status).where(PitchModel.id == pitch.id)).scalar()
+
+
+def _cascaded_pitch_counts(session: Session, column, owner_id: int) -> list:
+    """Pitches the database will delete along with their brand/profile (ON DELETE CASCADE)."""
+    status = func.coalesce(PitchModel.status, "draft")
+    return session.query(status, func.count(PitchModel.id)).filter(column == owner_id).group_by(status).all()
+
+
+@listens_for(SessionLocal, "before_flush")
+def _track_counter_changes(session: Session, flush_context, instances) -> None:
+    """Turn brand/pitch inserts, deletes and status changes into analytics_counters deltas."""
+    deltas = session.info.setdefault("counter_deltas", {})
+
+    def add(name: str, amount: int) -> None:
+        deltas[name] = deltas.get(name, 0) + amount
+
+    for instance in session.new:
+        if isinstance(instance, PitchModel):
+            add(_pitch_counter(instance.status), 1)
+        elif isinstance(instance, BrandModel):
+            add("brands", 1)
+
+    for instance in session.dirty:
+        if isinstance(instance, PitchModel) and inspect(instance).attrs.status.history.added:
+            old = _committed_status(session, instance)
+            if _pitch_counter(old) != _pitch_counter(instance.status):
+                add(_pitch_counter(old), -1)
+                add(_pitch_counter(instance.status), 1)
+
+    for instance in session.deleted:
+        if isinstance(instance, PitchModel):
+            add(_pitch_counter(_committed_status(session, instance)), -1)
+        elif isinstance(instance, BrandModel):
+            add("brands", -1)
+            for pitch_status, count in _cascaded_pitch_counts(session, PitchModel.brand_id, instance.id):
+                add(_pitch_counter(pitch_status), -count)
+        elif isinstance(instance, ProfileModel):
+            for pitch_status, count in _cascaded_pitch_counts(session, PitchModel.creator_profile_id, instance.id):
+                add(_pitch_counter(pitch_status), -count)
+
+
+def _write_counter_deltas(session: Session, deltas: Dict[str, int]) -> None:
+    """Apply counter deltas with one upsert (rows in name order, so concurrent commits can't deadlock)."""
+    rows = [{"name": name, "value": value} for name, value in sorted(deltas.items()) if value]
+    if not rows:
+        return
+    stmt = pg_insert(AnalyticsCounterModel).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"value": AnalyticsCounterModel.value + stmt.excluded.value, "updated_at": func.now()}
+    )
+    session.execute(stmt)
+    session.info["analytics_dirty"] = True
+
+
+@listens_for(SessionLocal, "before_commit")
+def _flush_pending_rollup_events(session: Session) -> None:
+    """Write buffered rollup events and counter deltas, inside the committing transaction."""
+    # Flush first, so before_flush has seen every change being committed
+    session.flush()
+    pending = session.info.pop("rollup_pending", None)
+    for event, occurrences in (pending or {}).items():
+        record_rollup_events(session, event, occurrences)
+    _write_counter_deltas(session, session.info.pop("counter_deltas", {}))
+
+
+@listens_for(SessionLocal, "after_commit")
+def _invalidate_analytics_cache(session: Session) -> None:
+    """Drop cached analytics once a pitch event write is actually committed."""
+    if session.info.pop("analytics_dirty", False):
+        analytics_cache.clear()
+
+
+@listens_for(SessionLocal, "after_rollback")
+def _discard_analytics_dirty_flag(session: Session) -> None:
+    session.info.pop("analytics_dirty", None)
+    session.info.pop("rollup_pending", None)
+    session.info.pop("counter_deltas", None)
+
+
+def get_analytics_timeseries(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    bucket: str = "day",
+    category: Optional[str] = None,
+    mode: Optional[str] = None
+) -> List[dict]:
+    """Event counts and median open latency per day or week between two dates.
+    
+    Counts come from the daily rollup; the median hours from send to open
+    is computed by PostgreSQL (percentile_cont) over pitches opened in the
+    range, using the opened_at index. Both are grouped with date_trunc, so
+    cost depends on the length of the range — not on total pitch history.
+    Buckets without any events are filled with zeros so charts get a
+    continuous series.
+    
+    Results are cached in-process per parameter set (see analytics_cache).
+    
+    Args:
+        db: Database session
+        date_from: First day to include
+        date_to: Last day to include
+        bucket: "day" or "week" (weeks start on Monday)
+        category: Optional brand category filter
+        mode: Optional pitch mode filter ("manual" or "autopilot")
+    
+    Returns:
+        list of dicts: [{bucket_start, sent, opened, clicked, replied, bounced,
+        median_open_hours}, ...]
+    """
+    from datetime import timedelta
+    
+    if bucket not in TIMESERIES_BUCKETS:
+        raise ValueError(f"Unknown bucket '{bucket}'. Use one of: {', '.join(TIMESERIES_BUCKETS)}")
+    
+    cache_key = ("timeseries", date_from, date_to, bucket, category, mode)
+    cached = analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Step 1: Event counts per bucket from the rollup
+    rollup = AnalyticsDailyRollupModel
+    rollup_bucket = cast(func.date_trunc(bucket, cast(rollup.day, TIMESTAMP)), Date)
+    counts_query = db.query(
+        rollup_bucket.label("bucket_start"),
+        *[func.sum(getattr(rollup, event)).label(event) for event in ROLLUP_EVENTS]
+    ).filter(rollup.day >= date_from, rollup.day <= date_to)
+    
+    if category:
+        counts_query = counts_query.filter(rollup.category == category)
+    if mode:
+        counts_query = counts_query.filter(rollup.mode == mode)
+    
+    counts = {row.bucket_start: row for row in counts_query.group_by(rollup_bucket)}
+    
+    # Step 2: Median open latency per bucket, bucketed by the open day
+    # (same attribution the rollup uses for "opened")
+    open_bucket = cast(func.date_trunc(bucket, PitchModel.opened_at), Date)
+    open_hours = func.extract("epoch", PitchModel.opened_at - PitchModel.sent_at) / 3600
+    latency_query = db.query(
+        open_bucket.label("bucket_start"),
+        func.percentile_cont(0.5).within_group(open_hours).label("median_open_hours")
+    ).filter(
+        PitchModel.opened_at >= date_from,
+        PitchModel.opened_at < date_to + timedelta(days=1),
+        PitchModel.opened_at > PitchModel.sent_at
+    )
+    
+    if category:
+        latency_query = latency_query.join(
+            BrandModel, BrandModel.id == PitchModel.brand_id
+        ).filter(func.coalesce(BrandModel.category, "uncategorized") == category)
+    if mode:
+        latency_query = latency_query.filter(func.coalesce(PitchModel.mode, "manual") == mode)
+    
+    medians = {row.bucket_start: row.median_open_hours for row in latency_query.group_by(open_bucket)}
+    
+    # Step 3: Walk every bucket in the range so gaps come back as zeros
+    step = timedelta(days=7 if bucket == "week" else 1)
+    current = date_from - timedelta(days=date_from.weekday()) if bucket == "week" else date_from
+    
+    points = []
+    while current <= date_to:
+        row = counts.get(current)
+        median = medians.get(current)
+        point = {"bucket_start": current}
+        for event in ROLLUP_EVENTS:
+            point[event] = int(getattr(row, event) or 0) if row else 0
+        point["median_open_hours"] = round(float(median), 2) if median is not None else None
+        points.append(point)
+        current += step
+    
+    analytics_cache.set(cache_key, points)
+    return points
+
+
 def get_brand_analytics(db: Session, brand_id: int) -> Optional[dict]:
     """Get all pitch history for a specific brand."""
     brand = get_brand(db, brand_id)
@@ -573,6 +1574,84 @@ def get_brand_analytics(db: Session, brand_id: int) -> Optional[dict]:
     }
 
 
+# ============ AI USAGE CRUD ============
+
+AI_USAGE_FIELDS = (
+    "calls", "retries", "errors", "prompt_tokens", "candidate_tokens", "total_tokens", "latency_ms"
+)
+
+
+def record_ai_usage(db: Session, usage: Dict[tuple, Dict[str, int]]) -> None:
+    """Add buffered counts to their (day, call type) rows, in one upsert.
+    
+    Args:
+        usage: (usage_date, call_type) → counts (see AI_USAGE_FIELDS)
+    """
+    if not usage:
+        return
+    columns = AIUsageDailyModel.__table__.c
+    stmt = pg_insert(AIUsageDailyModel).values([
+        {
+            "usage_date": usage_date,
+            "call_type": call_type,
+            **{field: counts.get(field, 0) for field in AI_USAGE_FIELDS},
+        }
+        for (usage_date, call_type), counts in usage.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_ai_usage_daily_usage_date_call_type",
+        set_={
+            **{field: columns[field] + stmt.excluded[field] for field in AI_USAGE_FIELDS},
+            "updated_at": func.now(),
+        }
+    )
+    db.execute(stmt)
+    db.commit()
+
+
+def get_ai_usage(db: Session, date_from: date, date_to: date) -> List[AIUsageDailyModel]:
+    """AI usage rows for a date range (inclusive), oldest first."""
+    return db.query(AIUsageDailyModel).filter(
+        AIUsageDailyModel.usage_date >= date_from,
+        AIUsageDailyModel.usage_date <= date_to
+    ).order_by(AIUsageDailyModel.usage_date, AIUsageDailyModel.call_type).all()
+
+
+def _summarize_ai_usage(rows: List[AIUsageDailyModel]) -> dict:
+    totals = {field: sum(getattr(row, field) for row in rows) for field in AI_USAGE_FIELDS}
+    attempts = totals["calls"] + totals["retries"]
+    latency_ms = totals.pop("latency_ms")
+    totals["avg_latency_ms"] = round(latency_ms / attempts, 1) if attempts else None
+    return totals
+
+
+def get_ai_usage_report(db: Session, date_from: date, date_to: date, call_type: Optional[str] = None) -> dict:
+    """AI usage for a date range: per day + call type, per call type, and overall.
+    
+    Returns:
+        {date_from, date_to, days: [...], by_call_type: [...], totals: {...}}
+        (see schemas.AIUsageReport)
+    """
+    rows = get_ai_usage(db, date_from, date_to)
+    if call_type:
+        rows = [row for row in rows if row.call_type == call_type]
+    
+    call_types = sorted({row.call_type for row in rows})
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "days": [
+            {"usage_date": row.usage_date, "call_type": row.call_type, **_summarize_ai_usage([row])}
+            for row in rows
+        ],
+        "by_call_type": [
+            {"call_type": name, **_summarize_ai_usage([row for row in rows if row.call_type == name])}
+            for name in call_types
+        ],
+        "totals": _summarize_ai_usage(rows),
+    }
+
+
 # ============ AUTOPILOT CRUD ============
 
 def get_autopilot_config(db: Session) -> Optional[AutopilotConfigModel]:
@@ -599,7 +1678,7 @@ def create_autopilot_config(db: Session, config_data: dict) -> AutopilotConfigMo
     return new_config
 
 
-def update_autopilot_config(db: Session, update_data: dict) -> Optional[AutopilotConfigModel]:
+def update_autopilot_config(db: Session, update_data: dict, commit: bool = True) -> Optional[AutopilotConfigModel]:
     """Update the autopilot config."""
     config = get_autopilot_config(db)
     if not config:
@@ -609,13 +1688,10 @@ def update_autopilot_config(db: Session, update_data: dict) -> Optional[Autopilo
         if value is not None:
             setattr(config, key, value)
     
-    db.commit()
-    db.refresh(config)
+    _save(db, config, commit)
     return config
 
 
-from datetime import date
-
 def upsert_autopilot_log(db: Session, log_data: dict) -> 'AutopilotLogModel':
     """Update today's autopilot run log entry or create a new one."""
     run_date = log_data.get("run_date", date.today())
@@ -629,13 +1705,16 @@ def upsert_autopilot_log(db: Session, log_data: dict) -> 'AutopilotLogModel':
         existing_log.pitches_generated += log_data.get("pitches_generated", 0)
         existing_log.pitches_sent += log_data.get("pitches_sent", 0)
         existing_log.tokens_used_estimate += log_data.get("tokens_used_estimate", 0)
+        for field in ("ai_calls", "ai_retries", "prompt_tokens", "candidate_tokens", "tokens_used"):
+            setattr(existing_log, field, (getattr(existing_log, field) or 0) + log_data.get(field, 0))
         
-        # Append new errors to existing ones
-        new_errors = log_data.get("errors", [])
-        if new_errors:
-            current_errors = list(existing_log.errors) if existing_log.errors else []
-            current_errors.extend(new_errors)
-            existing_log.errors = current_errors
+        # Append new errors (and skip decisions) to existing ones
+        for field in ("errors", "skipped"):
+            new_entries = log_data.get(field, [])
+            if new_entries:
+                current_entries = list(getattr(existing_log, field) or [])
+                current_entries.extend(new_entries)
+                setattr(existing_log, field, current_entries)
             
         db.commit()
         db.refresh(existing_log)
@@ -669,11 +1748,261 @@ def get_latest_autopilot_log(db: Session) -> Optional['AutopilotLogModel']:
     ).first()
 
 
-def is_brand_blacklisted(db: Session, email: str) -> bool:
-    """Check if a brand's email domain is on the blacklist."""
+def get_blacklisted_domains(db: Session) -> set:
+    """The blacklisted email domains, lowercased (load once, check many)."""
     config = get_autopilot_config(db)
     if not config or not config.blacklisted_domains:
-        return False
-    
+        return set()
+    return {d.lower() for d in config.blacklisted_domains}
+
+
+def is_brand_blacklisted(db: Session, email: str) -> bool:
+    """Check if a brand's email domain is on the blacklist."""
     domain = email.split("@")[-1].lower() if "@" in email else ""
-    return domain in [d.lower() for d in config.blacklisted_domains]
\ No newline at end of file
+    return domain in get_blacklisted_domains(db)
+
+
+# ============ AUTOPILOT WORK QUEUE CRUD ============
+#
+# Accepted autopilot candidates, one row each: pooled until a run draws
+# them, then stepped through pending → created → generated → sent (see
+# AutopilotWorkItem).
+
+# Rows a run still has work to do on
+_UNFINISHED_WORK = or_(
+    AutopilotWorkItemModel.status.in_(("pending", "created")),
+    and_(AutopilotWorkItemModel.status == "generated", AutopilotWorkItemModel.auto_send.is_(True)),
+)
+
+
+def work_item_to_dict(item: AutopilotWorkItemModel) -> dict:
+    """Plain copy of a work item, safe to hand to another thread/session."""
+    return {
+        "id": item.id,
+        "brand_name": item.brand_name,
+        "email": item.email,
+        "category": item.category,
+        "confidence": item.confidence,
+        "niche": item.niche,
+        "auto_send": bool(item.auto_send),
+        "status": item.status,
+        "brand_id": item.brand_id,
+        "pitch_id": item.pitch_id,
+        "attempts": item.attempts or 0,
+    }
+
+
+def get_queued_emails(db: Session, emails: List[str]) -> set:
+    """Which of these emails are already pooled or queued (lowercased; failed rows don't count)."""
+    candidates = {email.lower() for email in emails if email}
+    if not candidates:
+        return set()
+    rows = db.query(AutopilotWorkItemModel.email).filter(
+        func.lower(AutopilotWorkItemModel.email).in_(candidates),
+        AutopilotWorkItemModel.status != "failed"
+    ).all()
+    return {email.lower() for (email,) in rows}
+
+
+def add_to_autopilot_pool(db: Session, candidates: List[dict]) -> int:
+    """Pool accepted candidates (each with a "niche" tag) for later runs to draw.
+    
+    An email already pooled or queued is left alone, unless its earlier
+    attempt failed for good — then it goes back into the pool.
+    
+    Returns:
+        Number of rows added or re-pooled
+    """
+    if not candidates:
+        return 0
+    stmt = pg_insert(AutopilotWorkItemModel).values([
+        {
+            "brand_name": candidate.get("name", "Unknown"),
+            "email": candidate["email"],
+            "category": candidate.get("category", ""),
+            "confidence": candidate.get("confidence"),
+            "niche": candidate.get("niche"),
+            "status": "pooled",
+            "attempts": 0,
+        }
+        for candidate in candidates
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["email"],
+        set_={
+            "brand_name": stmt.excluded.brand_name,
+            "category": stmt.excluded.category,
+            "confidence": stmt.excluded.confidence,
+            "niche": stmt.excluded.niche,
+            "status": "pooled",
+            "brand_id": None,
+            "pitch_id": None,
+            "attempts": 0,
+            "last_error": None,
+            "claimed_by": None,
+            "claimed_at": None,
+            "discovered_at": func.now(),
+        },
+        where=AutopilotWorkItemModel.status == "failed",
+    )
+    result = db.execute(stmt)
+    db.commit()
+    return result.rowcount
+
+
+def _drawable_pool(niches: List[str], max_age_days: int):
+    """Filter for pooled rows tagged with one of `niches` and not yet stale."""
+    return and_(
+        AutopilotWorkItemModel.status == "pooled",
+        AutopilotWorkItemModel.niche.in_([niche.lower() for niche in niches]),
+        AutopilotWorkItemModel.discovered_at >= datetime.now(timezone.utc) - timedelta(days=max_age_days),
+    )
+
+
+def count_autopilot_pool(db: Session, niches: List[str], max_age_days: int) -> int:
+    """How many pooled candidates a run for these niches could still draw."""
+    return db.query(func.count(AutopilotWorkItemModel.id)).filter(
+        _drawable_pool(niches, max_age_days)
+    ).scalar() or 0
+
+
+def draw_autopilot_pool(db: Session, niches: List[str], limit: int, auto_send: bool,
+                        worker_id: str, max_age_days: int) -> List[dict]:
+    """Move up to `limit` pooled candidates (oldest first) into the work queue, claimed by this run.
+    
+    Same FOR UPDATE SKIP LOCKED claim as claim_autopilot_work_items, so
+    parallel runs never draw the same candidate.
+    
+    Returns:
+        The drawn items as dicts (see work_item_to_dict)
+    """
+    if limit <= 0 or not niches:
+        return []
+    drawable = (
+        select(AutopilotWorkItemModel.id)
+        .where(_drawable_pool(niches, max_age_days))
+        .order_by(AutopilotWorkItemModel.discovered_at, AutopilotWorkItemModel.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .cte("drawable")
+        .prefix_with("MATERIALIZED")  # evaluated once (see claim_autopilot_work_items)
+    )
+    items = db.scalars(
+        update(AutopilotWorkItemModel)
+        .where(AutopilotWorkItemModel.id.in_(select(drawable.c.id)))
+        .values(status="pending", auto_send=auto_send, claimed_by=worker_id, claimed_at=datetime.now(timezone.utc))
+        .returning(AutopilotWorkItemModel),
+        execution_options={"synchronize_session": False},
+    ).all()
+    drawn = sorted((work_item_to_dict(item) for item in items), key=lambda item: item["id"])
+    db.commit()
+    return drawn
+
+
+def expire_autopilot_pool(db: Session, max_age_days: int) -> int:
+    """Drop pooled candidates older than max_age_days. Returns how many were dropped."""
+    deleted = db.query(AutopilotWorkItemModel).filter(
+        AutopilotWorkItemModel.status == "pooled",
+        AutopilotWorkItemModel.discovered_at < datetime.now(timezone.utc) - timedelta(days=max_age_days)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def delete_autopilot_work_items(db: Session, item_ids: List[int]) -> None:
+    """Remove work items (e.g. pooled candidates that no longer pass the pre-filter)."""
+    if not item_ids:
+        return
+    db.query(AutopilotWorkItemModel).filter(
+        AutopilotWorkItemModel.id.in_(item_ids)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def claim_autopilot_work_items(db: Session, limit: int, worker_id: str, lease_seconds: int) -> List[dict]:
+    """Claim up to `limit` unfinished work items, oldest first.
+    
+    FOR UPDATE SKIP LOCKED lets parallel runs claim at the same time
+    without waiting on (or taking) each other's rows, and the claim is a
+    lease: rows whose claimed_at is older than lease_seconds — their run
+    died — can be claimed again.
+    
+    Returns:
+        The claimed items as dicts (see work_item_to_dict)
+    """
+    if limit <= 0:
+        return []
+    now = datetime.now(timezone.utc)
+    claimable = (
+        select(AutopilotWorkItemModel.id)
+        .where(_UNFINISHED_WORK)
+        .where(or_(
+            AutopilotWorkItemModel.claimed_at.is_(None),
+            AutopilotWorkItemModel.claimed_at < now - timedelta(seconds=lease_seconds),
+        ))
+        .order_by(AutopilotWorkItemModel.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        # MATERIALIZED: as a plain IN (subquery) the planner may rescan it per
+        # row, and each rescan skips the rows it just locked — claiming them all
+        .cte("claimable")
+        .prefix_with("MATERIALIZED")
+    )
+    items = db.scalars(
+        update(AutopilotWorkItemModel)
+        .where(AutopilotWorkItemModel.id.in_(select(claimable.c.id)))
+        .values(claimed_by=worker_id, claimed_at=now)
+        .returning(AutopilotWorkItemModel),
+        execution_options={"synchronize_session": False},
+    ).all()
+    claimed = sorted((work_item_to_dict(item) for item in items), key=lambda item: item["id"])
+    db.commit()
+    return claimed
+
+
+def advance_autopilot_work_item(db: Session, item_id: int, status: str, release: bool = False, **fields) -> None:
+    """Record a finished step (renewing the lease, or releasing the row when it's done)."""
+    values = dict(fields, status=status, attempts=0, last_error=None)
+    if release:
+        values.update(claimed_by=None, claimed_at=None)
+    else:
+        values["claimed_at"] = datetime.now(timezone.utc)
+    db.execute(
+        update(AutopilotWorkItemModel)
+        .where(AutopilotWorkItemModel.id == item_id)
+        .values(**values)
+    )
+    db.commit()
+
+
+def fail_autopilot_work_item(db: Session, item_id: int, error: str, max_attempts: int) -> None:
+    """Release a work item after a failed step; it becomes "failed" after max_attempts tries."""
+    item = db.query(AutopilotWorkItemModel).filter(AutopilotWorkItemModel.id == item_id).first()
+    if not item:
+        return
+    item.attempts = (item.attempts or 0) + 1
+    item.last_error = error
+    item.claimed_by = None
+    item.claimed_at = None
+    if item.attempts >= max_attempts:
+        item.status = "failed"
+    db.commit()
+
+
+def count_autopilot_work_items(db: Session) -> Dict[str, int]:
+    """Work items per status."""
+    rows = db.query(
+        AutopilotWorkItemModel.status, func.count(AutopilotWorkItemModel.id)
+    ).group_by(AutopilotWorkItemModel.status).all()
+    return {status: count for status, count in rows}
+
+
+def get_autopilot_pitch_ids(db: Session, brand_ids: List[int]) -> Dict[int, int]:
+    """Latest autopilot pitch per brand — lets a resumed run reuse a pitch its predecessor saved."""
+    if not brand_ids:
+        return {}
+    rows = db.query(PitchModel.brand_id, func.max(PitchModel.id)).filter(
+        PitchModel.brand_id.in_(brand_ids),
+        PitchModel.mode == "autopilot"
+    ).group_by(PitchModel.brand_id).all()
+    return {brand_id: pitch_id for brand_id, pitch_id in rows}
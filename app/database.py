@@ -6,6 +6,15 @@ from app.config import settings
 #create engine - connects to Postgresql
 engine = create_engine(settings.database_url)
 
+#Advisory locks (app/services/locks.py) are held on their own small pool,
+#so waiting for or holding one never takes a connection from requests
+lock_engine = create_engine(
+    settings.database_url,
+    pool_size=settings.lock_pool_size,
+    max_overflow=0,
+    pool_timeout=settings.lock_pool_timeout_seconds,
+)
+
 #create database Sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -3,14 +3,35 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.routers import brands, profile, pitches, tracking, discovery, analytics, webhooks, autopilot
 from app.services.scheduler import start_scheduler, stop_scheduler
+from app.services.tracking import open_buffer, warm_opened_pixels
+from app.services.webhook_events import webhook_consumer
+from app.services.discovery import stop_background_refreshes
+from app.services.ai_provider import close_ai_provider, close_async_ai_provider
+from app.services.ai_usage import usage_buffer
+from app.services.pitch_cache import flush_pitch_cache_touches
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Start the background autopilot scheduler
+    # Startup: Warm the opened-pixel cache, start the tracking pixel open
+    # flusher, the AI usage flusher, the webhook inbox consumer and the
+    # background autopilot scheduler
+    # (only the worker elected scheduler leader actually runs it)
+    warm_opened_pixels()
+    open_buffer.start()
+    usage_buffer.start()
+    webhook_consumer.start()
     start_scheduler()
     yield
-    # Shutdown: Stop the scheduler safely
+    # Shutdown: Stop the scheduler safely, finish the current webhook batch,
+    # flush any buffered pixel opens, AI usage and pitch cache hits, then close the AI providers' clients
     stop_scheduler()
+    stop_background_refreshes()
+    webhook_consumer.stop()
+    open_buffer.stop()
+    usage_buffer.stop()
+    flush_pitch_cache_touches()
+    close_ai_provider()
+    await close_async_ai_provider()
 
 # create FastAPI app
 app = FastAPI(
@@ -1,11 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, TIMESTAMP, JSON, ARRAY, Numeric, ForeignKey, Date
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, TIMESTAMP, JSON, ARRAY, Numeric, ForeignKey, Date, Float, UniqueConstraint, Index
 from app.database import Base
 from datetime import datetime
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
 
 class Brand(Base):
     __tablename__ = "brands"
+    __table_args__ = (
+        # Pre-filters match discovered emails case-insensitively
+        Index("ix_brands_email_lower", text("lower(email)")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
@@ -60,12 +64,13 @@ class Pitch(Base):
         'creator_profile.id', ondelete='CASCADE'), nullable=False)
     subject = Column(String(255), nullable=False)
     body = Column(Text, nullable=False)
-    status = Column(String(50), default='draft')
+    status = Column(String(50), default='draft', index=True)
     mode = Column(String(50), default='manual')
     auto_approved = Column(Boolean, default=False)
     tracking_pixel_id = Column(String(255), unique=True)
+    resend_email_id = Column(String(255), unique=True, index=True)  # Resend's ID for the sent email (webhook lookups)
     sent_at = Column(TIMESTAMP)
-    opened_at = Column(TIMESTAMP)
+    opened_at = Column(TIMESTAMP, index=True)
     clicked_at = Column(TIMESTAMP)
     replied_at = Column(TIMESTAMP)
     reply_notes = Column(Text)
@@ -109,6 +114,207 @@ class AutopilotLog(Base):
     pitches_generated = Column(Integer, default=0)
     pitches_sent = Column(Integer, default=0)
     errors = Column(JSON, server_default='[]')
-    tokens_used_estimate = Column(Integer, default=0)
+    skipped = Column(JSON, server_default='[]')  # [{brand, email, reason, detail}] from the pre-filter
+    tokens_used_estimate = Column(Integer, default=0)  # legacy guess; now mirrors tokens_used
+    # Real usage from the model's usage metadata (see app.services.ai_usage)
+    ai_calls = Column(Integer, default=0)
+    ai_retries = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    candidate_tokens = Column(Integer, default=0)
+    tokens_used = Column(Integer, default=0)
     created_at = Column(TIMESTAMP, server_default=func.now())
 
+
+
+class AutopilotWorkItem(Base):
+    """One accepted autopilot candidate and how far it has got.
+    
+    Surplus candidates from a discovery call wait as "pooled" (tagged with
+    their niche) until a run draws them. Drawn rows move pending →
+    created (brand saved) → generated (pitch saved) → sent, or to failed
+    after AUTOPILOT_WORK_MAX_ATTEMPTS errors. Runs claim
+    unfinished rows with SELECT ... FOR UPDATE SKIP LOCKED plus a lease
+    (claimed_at), so a run that dies mid-cycle is picked up by the next
+    one and parallel workers never take the same row.
+    """
+    __tablename__ = "autopilot_work_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    brand_name = Column(String(255), nullable=False)
+    email = Column(String(255), nullable=False, unique=True)
+    category = Column(String(100))
+    confidence = Column(String(20))
+    niche = Column(String(100))  # configured niche the candidate was discovered for (lowercase)
+    auto_send = Column(Boolean, default=False)  # config.auto_send when drawn from the pool
+    status = Column(String(20), nullable=False, default='pending', index=True)
+    brand_id = Column(Integer, ForeignKey('brands.id', ondelete='SET NULL'))
+    pitch_id = Column(Integer, ForeignKey('pitches.id', ondelete='SET NULL'))
+    attempts = Column(Integer, default=0)  # failed tries at the current step
+    last_error = Column(Text)
+    claimed_by = Column(String(255))  # host:pid of the run working on it
+    claimed_at = Column(TIMESTAMP)  # lease start; expired leases can be reclaimed
+    discovered_at = Column(TIMESTAMP, server_default=func.now())
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(
+        TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+
+class AnalyticsDailyRollup(Base):
+    """One row per (day, category, mode) with pitch lifecycle event counts.
+    
+    Maintained incrementally by the pitch event CRUD functions (send, open,
+    click, bounce, reply) so analytics reads only scan the requested date
+    range instead of the whole pitches table.
+    
+    Rebuild from raw tables with: python -m app.tasks.rebuild_analytics_rollup
+    """
+    __tablename__ = "analytics_daily_rollup"
+    __table_args__ = (
+        UniqueConstraint("day", "category", "mode", name="uq_analytics_daily_rollup_day_category_mode"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    category = Column(String(100), nullable=False, default='uncategorized')
+    mode = Column(String(50), nullable=False, default='manual')
+    sent = Column(Integer, nullable=False, default=0)
+    opened = Column(Integer, nullable=False, default=0)
+    clicked = Column(Integer, nullable=False, default=0)
+    replied = Column(Integer, nullable=False, default=0)
+    bounced = Column(Integer, nullable=False, default=0)
+    # Sum + count of hours from send to open, for the average open time
+    open_hours_total = Column(Float, nullable=False, default=0)
+    open_hours_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(
+        TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+
+class AnalyticsCounter(Base):
+    """Running totals for the analytics overview: "brands" and "pitches:<status>".
+    
+    Kept up to date by a flush/commit hook on SessionLocal (see the crud
+    module docstring), so the overview reads a handful of rows instead of
+    counting the brands and pitches tables.
+    
+    Rebuild from raw tables with: python -m app.tasks.rebuild_analytics_rollup
+    """
+    __tablename__ = "analytics_counters"
+
+    name = Column(String(60), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(
+        TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+
+class WebhookEvent(Base):
+    """Durable inbox of raw Resend webhook events.
+    
+    POST /webhooks/resend only verifies and appends here, then returns 202.
+    A background consumer applies pending events in batches
+    (see app.services.webhook_events), and deletes applied/skipped rows
+    after WEBHOOK_RETENTION_DAYS.
+    """
+    __tablename__ = "webhook_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    svix_id = Column(String(255), unique=True, index=True)  # Svix delivery ID — retries reuse it
+    event_type = Column(String(100))
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), default='pending', index=True)  # pending → processed / skipped / failed
+    attempts = Column(Integer, default=0)
+    pitch_id = Column(Integer)  # resolved pitch, for auditing
+    error = Column(Text)
+    received_at = Column(TIMESTAMP, server_default=func.now())
+    processed_at = Column(TIMESTAMP)
+
+
+class BrandDiscoveryCache(Base):
+    """Cached AI discovery results, one row per normalized brand key.
+    
+    Keys come from crud.normalize_brand_key(), so "CeraVe", "cerave" and
+    "Cera-Ve" share one row and a cache hit is a unique-index probe.
+    """
+    __tablename__ = "brand_discovery_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    brand_key = Column(String(255), nullable=False, unique=True, index=True)
+    brand_name = Column(String(255), nullable=False)  # display name as discovered
+    discovery_data = Column(JSON, nullable=False)  # full BrandDiscoveryResponse payload
+    discovered_at = Column(TIMESTAMP, server_default=func.now())
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(
+        TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+
+class DiscoverySearchLease(Base):
+    """A worker's claim on searching one brand key (see app.services.discovery).
+    
+    While searching_until is in the future, other workers wait for the
+    cache instead of repeating the search-grounded Gemini call. Deleted
+    when the search ends; a holder that dies leaves a lease that simply
+    runs out.
+    """
+    __tablename__ = "discovery_search_leases"
+
+    brand_key = Column(String(255), primary_key=True)  # crud.normalize_brand_key()
+    holder = Column(String(64), nullable=False)  # random token of the claiming search
+    searching_until = Column(TIMESTAMP, nullable=False)
+
+
+class AIRateBucket(Base):
+    """Shared token bucket for AI provider calls (see app.services.rate_limiter).
+    
+    One row per provider. Every uvicorn worker and the cron task take from
+    the same row, so together they stay within the configured RPM/TPM.
+    """
+    __tablename__ = "ai_rate_buckets"
+
+    name = Column(String(50), primary_key=True)  # provider, e.g. "gemini"
+    requests = Column(Float, nullable=False, default=0)  # requests available right now
+    tokens = Column(Float, nullable=False, default=0)  # model tokens available (negative = debt from a big response)
+    updated_at = Column(TIMESTAMP, server_default=func.now())  # last refill
+
+
+class PitchGenerationCache(Base):
+    """Generated pitches, keyed by a hash of everything that shaped them.
+    
+    The key covers the normalized brand and profile dicts, the model and
+    the prompt version (see app.services.pitch_cache), so any change to
+    those produces a new entry instead of a stale hit.
+    """
+    __tablename__ = "pitch_generation_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), nullable=False, unique=True, index=True)  # sha256 hex digest
+    model = Column(String(100))
+    prompt_version = Column(String(20))
+    subject = Column(Text, nullable=False)
+    body = Column(Text, nullable=False)
+    hits = Column(Integer, default=0)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    last_used_at = Column(TIMESTAMP, server_default=func.now(), index=True)  # LRU eviction order
+
+
+class AIUsageDaily(Base):
+    """AI provider usage per (day, call type), from the responses' usage metadata.
+    
+    Every provider attempt — including rate-limited retries — is added by
+    app.services.ai_usage, so this shows where the quota actually goes.
+    """
+    __tablename__ = "ai_usage_daily"
+    __table_args__ = (
+        UniqueConstraint("usage_date", "call_type", name="uq_ai_usage_daily_usage_date_call_type"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    usage_date = Column(Date, nullable=False)  # UTC
+    call_type = Column(String(50), nullable=False)  # pitch_generation, brand_discovery, contact_search, ...
+    calls = Column(Integer, nullable=False, default=0)  # first attempts
+    retries = Column(Integer, nullable=False, default=0)  # repeat attempts after a rate limit
+    errors = Column(Integer, nullable=False, default=0)  # attempts that raised
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    candidate_tokens = Column(BigInteger, nullable=False, default=0)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
+    latency_ms = Column(BigInteger, nullable=False, default=0)  # summed over attempts
+    updated_at = Column(
+        TIMESTAMP, server_default=func.now(), onupdate=func.now())
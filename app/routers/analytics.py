@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+from typing import Optional
 from app.database import get_db
 from app import crud
-from app.schemas import AnalyticsOverview, BrandAnalytics
+from app.schemas import AnalyticsOverview, AnalyticsTimeseries, BrandAnalytics, AIUsageReport
 
 router = APIRouter()
 
@@ -19,6 +21,62 @@ def get_analytics_overview(db: Session = Depends(get_db)):
     return crud.get_analytics_overview(db)
 
 
+@router.get("/timeseries", response_model=AnalyticsTimeseries)
+def get_analytics_timeseries(
+    bucket: str = Query("day", pattern="^(day|week)$"),
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    category: Optional[str] = None,
+    mode: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Get sends, opens, clicks, replies, bounces and median open latency
+    per day or week for a date range.
+    
+    Counts come from the daily rollup table and the median is computed
+    in PostgreSQL, so cost depends on the range length, not on total pitch
+    history. Results are cached briefly in-process and dropped as soon as
+    a new pitch event is recorded. Defaults to the last 30 days (UTC).
+    """
+    date_to = date_to or datetime.utcnow().date()
+    date_from = date_from or (date_to - timedelta(days=29))
+    
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must be on or before 'to'")
+    if (date_to - date_from).days > 366:
+        raise HTTPException(status_code=400, detail="Date range cannot exceed 366 days")
+    
+    points = crud.get_analytics_timeseries(db, date_from, date_to, bucket, category, mode)
+    return {"bucket": bucket, "date_from": date_from, "date_to": date_to, "points": points}
+
+
+@router.get("/ai-usage", response_model=AIUsageReport)
+def get_ai_usage(
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    call_type: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Get AI token usage per day and per call type for a date range.
+    
+    Counts come from the model's own usage metadata for every provider
+    attempt (pitch generation, autopilot discovery, brand contact
+    searches — retries included), so this shows where the quota goes.
+    Defaults to the last 30 days (UTC).
+    """
+    date_to = date_to or datetime.utcnow().date()
+    date_from = date_from or (date_to - timedelta(days=29))
+    
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must be on or before 'to'")
+    if (date_to - date_from).days > 366:
+        raise HTTPException(status_code=400, detail="Date range cannot exceed 366 days")
+    
+    return crud.get_ai_usage_report(db, date_from, date_to, call_type)
+
+
 @router.get("/brands/{brand_id}", response_model=BrandAnalytics)
 def get_brand_analytics(brand_id: int, db: Session = Depends(get_db)):
     """
@@ -6,6 +6,7 @@ Endpoints:
 - POST /autopilot/pause     — Pause autopilot
 - POST /autopilot/resume    — Resume autopilot
 - GET  /autopilot/history   — List past autopilot run logs
+- GET  /autopilot/queue     — Count autopilot work items per status
 - POST /autopilot/blacklist — Add a domain to the blacklist
 - POST /autopilot/run       — Manually trigger one autopilot cycle (for testing)
 """
@@ -49,7 +50,7 @@ def get_autopilot_status(db: Session = Depends(get_db)):
     """
     Get current autopilot status: config + last run info.
     """
-    from app.services.scheduler import scheduler
+    from app.services.scheduler import scheduler_leader
     config = crud.get_autopilot_config(db)
     last_run = crud.get_latest_autopilot_log(db)
     
@@ -57,7 +58,8 @@ def get_autopilot_status(db: Session = Depends(get_db)):
         "config": config,
         "last_run": last_run,
         "is_configured": config is not None,
-        "scheduler_running": scheduler.running
+        # Only the elected worker runs the scheduler — ask Postgres whether any does
+        "scheduler_running": scheduler_leader.leader_exists()
     }
 
 
@@ -99,6 +101,18 @@ def get_autopilot_history(
     return crud.get_autopilot_logs(db, limit=limit)
 
 
+@router.get("/queue")
+def get_autopilot_queue(db: Session = Depends(get_db)):
+    """
+    Count the durable work queue's items per status.
+    
+    pending/created items (and generated ones waiting to be auto-sent)
+    are picked up by the next run first; "pooled" candidates are drawn
+    next, and discovery only runs when too few are pooled.
+    """
+    return crud.count_autopilot_work_items(db)
+
+
 @router.post("/blacklist", response_model=AutopilotConfigResponse)
 def blacklist_domain(request: BlacklistRequest, db: Session = Depends(get_db)):
     """
@@ -148,7 +162,7 @@ def trigger_autopilot_run(db: Session = Depends(get_db)):
     Manually trigger one autopilot cycle (for testing).
     
     This runs the full autopilot pipeline synchronously:
-    1. Discover brands via AI (1 Gemini call)
+    1. Resume unfinished work items, then discover brands via AI (1 Gemini call) if needed
     2. De-duplicate and filter
     3. Generate pitches for new brands
     4. Send if auto_send is enabled
@@ -2,10 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app import crud
 from app.database import get_db
-from app.services.gemini import GeminiProvider
+from app.services import discovery
 from app.schemas import (
     BrandDiscoveryRequest,
     BrandDiscoveryResponse,
+    BrandDiscoveryBatchRequest,
+    BrandDiscoveryBatchResponse,
     DiscoveryPitchRequest,
     DiscoveryPitchResponse
 )
@@ -14,54 +16,44 @@ router = APIRouter()
 
 
 @router.post("/search", response_model=BrandDiscoveryResponse)
-def search_brand(request: BrandDiscoveryRequest, db: Session = Depends(get_db)):
+async def search_brand(request: BrandDiscoveryRequest, db: Session = Depends(get_db)):
     """
     Step 1 of brand discovery: Search for a brand using AI with web search grounding.
     
-    Cache-first strategy:
-    1. Check if this brand was already discovered (saved in database)
-    2. If cached → return instantly from database (no API call, no tokens used)
-    3. If not cached → call Gemini API → save results to database → return
+    Cache-first strategy (stale-while-revalidate, see app.services.discovery):
+    1. Fresh cache entry → return instantly (no API call, no tokens used)
+    2. Stale entry → return instantly, refresh it in the background
+    3. Expired entry or not cached → call Gemini API → save results → return
     
-    This saves API tokens by only searching each brand once.
+    This saves API tokens by only searching each brand once per refresh window.
+    Async: a search waiting on Gemini doesn't tie up a worker thread.
     """
-    # Step 1: Check the cache first
-    cached_data = crud.get_discovered_brand_cache(db, request.brand_name)
-    
-    if cached_data:
-        return cached_data
-    
-    # Step 2: Cache miss — call Gemini API with web search
     try:
-        gemini = GeminiProvider()
-        result = gemini.discover_brand_contacts(request.brand_name)
+        return await discovery.search_brand_async(db, request.brand_name)
     except Exception as e:
         raise HTTPException(
             status_code=502,
             detail=f"AI search failed for '{request.brand_name}': {str(e)}"
         )
+
+
+@router.post("/search/batch", response_model=BrandDiscoveryBatchResponse)
+async def search_brands_batch(request: BrandDiscoveryBatchRequest, db: Session = Depends(get_db)):
+    """
+    Search up to 200 brands in one request.
     
-    # Step 3: Validate and sanitize the result before saving/returning
-    # so Pydantic validation doesn't blow up
-    result.setdefault("brand_name", request.brand_name)
-    result.setdefault("contacts", [])
-    
-    # Sanitize each contact — make sure all required fields exist
-    cleaned_contacts = []
-    for contact in result.get("contacts", []):
-        if isinstance(contact, dict) and contact.get("email"):
-            cleaned_contacts.append({
-                "email": contact["email"],
-                "type": contact.get("type", "general"),
-                "confidence": contact.get("confidence", "low"),
-                "source": contact.get("source", "AI discovery")
-            })
-    result["contacts"] = cleaned_contacts
-    
-    # Step 4: Save to database so next search is instant
-    crud.cache_discovered_brand(db, result)
-    
-    return result
+    Cached brands are answered straight from the discovery cache; the rest
+    are researched several brands per AI call and cached individually, so
+    later single searches for them are instant too. Each name gets its own
+    result — one failed brand doesn't fail the batch.
+    """
+    return await discovery.search_brands_batch_async(db, request.brand_names)
+
+
+@router.get("/stats")
+def discovery_cache_stats():
+    """Discovery cache counters for this worker (fresh/stale/expired hits, misses, refreshes)."""
+    return discovery.discovery_stats()
 
 
 @router.post("/pitch", response_model=DiscoveryPitchResponse)
@@ -124,7 +116,9 @@ def pitch_selected_contacts(
                 })
             
             # 3. Generate a personalized AI pitch using Gemini
-            pitch = crud.generate_and_create_pitch(db, brand.id, profile.id)
+            pitch = crud.generate_and_create_pitch(
+                db, brand.id, profile.id, force_regenerate=request.force_regenerate
+            )
             
             # 4. Send the pitch email immediately via Resend
             sent_pitch = crud.send_pitch_email(db, pitch.id)
@@ -1,18 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from app.database import get_db
-from app.schemas import Pitch, PitchCreate
+from app.schemas import Pitch, PitchCreate, PitchBatchGenerateRequest, PitchBatchGenerateResponse
 from app.models import Brand as BrandModel, Profile as ProfileModel
 from app import crud
 from app.config import settings
 from app.services.email import generate_tracking_pixel_id, embed_tracking_pixel, send_email_via_resend
-from app.services.gemini import GeminiProvider
+from app.services.pitch_cache import (
+    generate_pitch_cached_async,
+    generate_pitches_batch_cached_async,
+    pitch_cache_stats,
+)
 
 router = APIRouter(prefix="/pitches", tags=["pitches"])
 
-ai_provider = GeminiProvider()
-
 
 def brand_to_dict(brand: BrandModel) -> dict:
     return {
@@ -42,15 +45,8 @@ def profile_to_dict(profile: ProfileModel) -> dict:
     }
 
 
-@router.post("/generate", response_model=Pitch, status_code=201)
-def generate_pitch(
-    request: dict,
-    db: Session = Depends(get_db)
-):
-    brand_id = request.get("brand_id")
-    if not brand_id:
-        raise HTTPException(status_code=400, detail="brand_id is required")
-    
+def _load_pitch_inputs(db: Session, brand_id: int):
+    """Brand + profile dicts for a pitch, plus the profile id (raises 404s)."""
     brand = crud.get_brand(db, brand_id)
     if not brand:
         raise HTTPException(status_code=404, detail="Brand not found")
@@ -59,10 +55,26 @@ def generate_pitch(
     if not profile:
         raise HTTPException(status_code=404, detail="Creator profile not found")
     
-    brand_data = brand_to_dict(brand)
-    profile_data = profile_to_dict(profile)
+    return brand_to_dict(brand), profile_to_dict(profile), profile.id
+
+
+@router.post("/generate", response_model=Pitch, status_code=201)
+async def generate_pitch(
+    request: dict,
+    db: Session = Depends(get_db)
+):
+    # Async so a worker can keep many generations waiting on Gemini at once;
+    # the (sync) database work runs on the threadpool. Identical brand/profile
+    # inputs reuse a cached generation unless "force_regenerate" is true.
+    brand_id = request.get("brand_id")
+    if not brand_id:
+        raise HTTPException(status_code=400, detail="brand_id is required")
     
-    ai_response = ai_provider.generate_pitch(brand_data, profile_data)
+    brand_data, profile_data, profile_id = await run_in_threadpool(_load_pitch_inputs, db, brand_id)
+    
+    ai_response = await generate_pitch_cached_async(
+        brand_data, profile_data, force_regenerate=bool(request.get("force_regenerate", False))
+    )
     
     pitch_create = PitchCreate(
         brand_id=brand_id,
@@ -71,11 +83,53 @@ def generate_pitch(
         mode="manual"
     )
     
-    new_pitch = crud.create_pitch(db, pitch_create, profile.id)
+    new_pitch = await run_in_threadpool(crud.create_pitch, db, pitch_create, profile_id)
     
     return new_pitch
 
 
+def _load_batch_inputs(db: Session, brand_ids: List[int]):
+    """Brands found (by id, in request order), plus the profile dict and id (404 without a profile)."""
+    profile = crud.get_profile(db)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Creator profile not found")
+    
+    brands = crud.get_brands_by_ids(db, brand_ids)
+    found = {brand_id: brand_to_dict(brands[brand_id]) for brand_id in brand_ids if brand_id in brands}
+    return found, profile_to_dict(profile), profile.id
+
+
+@router.post("/generate/batch", response_model=PitchBatchGenerateResponse, status_code=201)
+async def generate_pitches_batch(
+    request: PitchBatchGenerateRequest,
+    db: Session = Depends(get_db)
+):
+    """Generate draft pitches for several brands at once.
+    
+    Cached pitches are reused; the rest are generated several brands per
+    Gemini call (the creator profile is sent once per call), and brands a
+    batch answer misses are retried one at a time. One failing brand
+    doesn't fail the others — check each item's status.
+    """
+    brand_ids = list(dict.fromkeys(request.brand_ids))  # de-duplicate, keep order
+    found, profile_data, profile_id = await run_in_threadpool(_load_batch_inputs, db, brand_ids)
+    
+    generated = await generate_pitches_batch_cached_async(
+        list(found.values()), profile_data, force_regenerate=request.force_regenerate
+    )
+    
+    items = await run_in_threadpool(
+        crud.save_generated_pitches, db, brand_ids, dict(zip(found, generated["results"])), profile_id
+    )
+    return {"results": items, "ai_calls": generated["ai_calls"]}
+
+
+@router.get("/cache/stats")
+def get_pitch_cache_stats():
+    """Pitch generation cache counters for this worker (memory/DB hits, misses, evictions)."""
+    return pitch_cache_stats()
+
+
 @router.get("/", response_model=List[Pitch])
 def list_pitches(
     skip: int = 0,
@@ -112,14 +166,14 @@ def send_pitch(pitch_id: int, db: Session = Depends(get_db)):
     if not creator:
         raise HTTPException(status_code=404, detail="creator not found")
     
-    pixel_tag = generate_tracking_pixel_id()
+    pixel_tag = generate_tracking_pixel_id(pitch.id)
     html_body_with_pixel = embed_tracking_pixel(
         body = pitch.body,
         tracking_pixel_id = pixel_tag,
         base_url = settings.api_base_url
     )
     try:
-        send_email_via_resend(
+        resend_email_id = send_email_via_resend(
             to_email = brand.email,
             subject = pitch.subject,
             body_html = html_body_with_pixel,
@@ -135,6 +189,7 @@ def send_pitch(pitch_id: int, db: Session = Depends(get_db)):
         db=db,
         pitch_id=pitch_id,
         tracking_pixel_id=pixel_tag,
+        resend_email_id=resend_email_id,
     )
 
     # Update the brand's status to "pitched"
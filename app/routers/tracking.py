@@ -1,8 +1,6 @@
-from fastapi import APIRouter, Depends, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Response
 import base64
-from app.database import get_db
-from app import crud
+from app.services.tracking import record_pixel_hit, tracking_stats
 
 router = APIRouter()
 
@@ -11,11 +9,16 @@ TRANSPARENT_PNG = base64.b64decode(
 )
 
 @router.get("/pixel/{tracking_pixel_id}.png")
-def track_pixel_open(tracking_pixel_id: str, db: Session = Depends(get_db)):
-    pitch = crud.get_pitch_by_tracking_id(db, tracking_pixel_id)
+def track_pixel_open(tracking_pixel_id: str):
+    # Already-opened pixels are answered from memory; new opens are buffered
+    # and flushed to the database in batches — no DB round-trip either way
+    record_pixel_hit(tracking_pixel_id)
 
-    if pitch and not pitch.opened_at:
-        crud.record_pitch_opened(db, pitch.id)
-    
     return Response(content=TRANSPARENT_PNG, media_type="image/png")
 
+
+@router.get("/stats")
+def get_tracking_stats():
+    """Open buffer + opened-pixel cache counters (per worker), for sizing."""
+    return tracking_stats()
+
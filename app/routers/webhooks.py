@@ -4,18 +4,23 @@ Resend sends POST requests to this endpoint when email events occur
 (delivered, opened, clicked, bounced, complained).
 
 We use these events to automatically update pitch and brand statuses,
-so the dashboard stays in sync without manual checking.
+so the dashboard stays in sync without manual checking. Events are queued
+in the `webhook_events` inbox and applied in batches by a background
+consumer (see app.services.webhook_events).
 
 Webhook events docs: https://resend.com/docs/dashboard/webhooks/introduction
 """
 import hashlib
 import hmac
+import json
 import logging
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app import crud
 from app.config import settings
+from app.services.webhook_events import webhook_consumer, seen_svix_ids
 
 logger = logging.getLogger(__name__)
 
@@ -40,22 +45,14 @@ def _verify_resend_signature(request_body: bytes, signature: str, secret: str) -
         return False
 
 
-def _find_pitch_by_email_id(db: Session, resend_email_id: str):
-    """Look up a pitch by the Resend email ID stored in tracking metadata.
-    
-    For now, we fall back to matching by the 'to' email address
-    since we don't currently store the Resend email ID on the pitch.
-    Returns None if not found.
-    """
-    # Future enhancement: store resend_email_id on the Pitch model
-    # for direct lookup. For now, this is a placeholder.
-    return None
-
-
-@router.post("/resend")
+@router.post("/resend", status_code=202)
 async def resend_webhook(request: Request, db: Session = Depends(get_db)):
     """
-    Handle incoming Resend webhook events.
+    Accept an incoming Resend webhook event.
+    
+    The event is only verified and appended to the webhook inbox here —
+    the background consumer (app.services.webhook_events) applies it to
+    the pitch in a batch, so Resend gets a fast 202 even during bursts.
     
     Supported event types:
     - email.delivered → confirms delivery
@@ -74,73 +71,37 @@ async def resend_webhook(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(status_code=401, detail="Invalid webhook signature")
     
     try:
-        payload = await request.json()
+        payload = json.loads(body)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid JSON payload")
     
-    event_type = payload.get("type", "")
-    data = payload.get("data", {})
-    
-    # Extract the recipient email to find the matching pitch
-    to_email = ""
-    if isinstance(data.get("to"), list) and data["to"]:
-        to_email = data["to"][0]
-    elif isinstance(data.get("to"), str):
-        to_email = data["to"]
-    
-    if not to_email:
-        logger.warning(f"Webhook event '{event_type}' has no recipient email, skipping")
-        return {"status": "skipped", "reason": "no recipient email"}
-    
-    # Find the brand by email, then find their most recent sent pitch
-    brand = crud.get_brand_by_email(db, to_email)
-    if not brand:
-        logger.info(f"Webhook: no brand found for email '{to_email}', skipping")
-        return {"status": "skipped", "reason": "brand not found"}
-    
-    # Get the most recent sent pitch for this brand
-    from app.models import Pitch as PitchModel
-    pitch = db.query(PitchModel).filter(
-        PitchModel.brand_id == brand.id,
-        PitchModel.status.in_(["sent", "opened", "clicked"])
-    ).order_by(PitchModel.sent_at.desc()).first()
-    
-    if not pitch:
-        logger.info(f"Webhook: no active pitch found for brand '{brand.name}', skipping")
-        return {"status": "skipped", "reason": "no active pitch"}
-    
-    # Handle events
-    if event_type == "email.delivered":
-        logger.info(f"Email delivered to {to_email} (pitch {pitch.id})")
-        # Pitch is already marked as "sent" when we send it — this is just confirmation
-    
-    elif event_type == "email.opened":
-        crud.record_pitch_opened(db, pitch.id)
-        crud.update_brand_status(db, brand.id, "opened")
-        logger.info(f"Email opened by {to_email} (pitch {pitch.id})")
-    
-    elif event_type == "email.clicked":
-        crud.record_pitch_clicked(db, pitch.id)
-        logger.info(f"Link clicked by {to_email} (pitch {pitch.id})")
-    
-    elif event_type == "email.bounced":
-        crud.record_pitch_bounced(db, pitch.id)
-        logger.warning(f"Email bounced for {to_email} (pitch {pitch.id})")
-    
-    elif event_type == "email.complained":
-        crud.record_pitch_bounced(db, pitch.id)  # Treat complaint like bounce
-        # Auto-blacklist the domain
-        domain = to_email.split("@")[-1] if "@" in to_email else ""
-        if domain:
-            config = crud.get_autopilot_config(db)
-            if config and domain not in (config.blacklisted_domains or []):
-                blacklist = list(config.blacklisted_domains or [])
-                blacklist.append(domain)
-                crud.update_autopilot_config(db, {"blacklisted_domains": blacklist})
-        logger.warning(f"Spam complaint from {to_email} — domain blacklisted (pitch {pitch.id})")
-    
-    else:
-        logger.info(f"Unhandled webhook event type: {event_type}")
-        return {"status": "skipped", "reason": f"unhandled event type: {event_type}"}
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
     
-    return {"status": "processed", "event": event_type, "pitch_id": pitch.id}
+    # Svix retries reuse the delivery ID — acknowledge duplicates without
+    # queueing them again, so pitch state is never touched twice
+    svix_id = request.headers.get("svix-id")
+    if svix_id and svix_id in seen_svix_ids:
+        return {"status": "duplicate", "svix_id": svix_id}
+    
+    event_id = await run_in_threadpool(
+        crud.enqueue_webhook_event, db, svix_id, payload.get("type", ""), payload
+    )
+    if svix_id:
+        seen_svix_ids.set(svix_id, True)
+    if event_id is None:
+        logger.info(f"Duplicate webhook delivery {svix_id}, skipping")
+        return {"status": "duplicate", "svix_id": svix_id}
+    
+    webhook_consumer.wake()
+    return {"status": "queued", "event_id": event_id}
+
+
+@router.get("/stats")
+def webhook_stats(db: Session = Depends(get_db)):
+    """Webhook inbox depth/lag plus this worker's consumer and dedup counters."""
+    return {
+        "queue": crud.get_webhook_queue_stats(db),
+        "consumer": webhook_consumer.stats(),
+        "dedup_cache": seen_svix_ids.stats(),
+    }
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict
-from datetime import datetime
+from datetime import datetime, date
 
 # Brand pydantic validation
 
@@ -80,6 +80,7 @@ class Pitch(BaseModel):
     mode: str
     auto_approved: bool
     tracking_pixel_id: Optional[str]
+    resend_email_id: Optional[str] = None
     sent_at: Optional[datetime]
     opened_at: Optional[datetime]
     clicked_at: Optional[datetime]
@@ -92,6 +93,21 @@ class Pitch(BaseModel):
         from_attributes = True
 
 
+class PitchBatchGenerateRequest(BaseModel):
+    brand_ids: List[int] = Field(..., min_length=1, max_length=50)
+    force_regenerate: bool = False
+
+class PitchBatchItem(BaseModel):
+    brand_id: int
+    status: str  # "cached" | "generated" | "failed"
+    pitch: Optional[Pitch] = None
+    error: Optional[str] = None
+
+class PitchBatchGenerateResponse(BaseModel):
+    results: List[PitchBatchItem]
+    ai_calls: int  # multi-brand calls plus single-pitch fallbacks
+
+
 class PitchUpdate(BaseModel):
     subject: Optional[str] = Field(None, min_length=1, max_length=255)
     body: Optional[str] = Field(None, min_length=1)
@@ -142,6 +158,19 @@ class BrandDiscoveryResponse(BaseModel):
     brand_name: str
     contacts: List[DiscoveredContact]
 
+class BrandDiscoveryBatchRequest(BaseModel):
+    brand_names: List[str] = Field(..., min_length=1, max_length=200)
+
+class BrandDiscoveryBatchItem(BaseModel):
+    brand_name: str  # as requested
+    status: str  # "cached" | "discovered" | "failed"
+    result: Optional[BrandDiscoveryResponse] = None
+    error: Optional[str] = None
+
+class BrandDiscoveryBatchResponse(BaseModel):
+    results: List[BrandDiscoveryBatchItem]
+    ai_calls: int  # multi-brand Gemini calls made for the cache misses
+
 class SelectedContact(BaseModel):
     email: str
     type: str
@@ -153,6 +182,7 @@ class DiscoveryPitchRequest(BaseModel):
     category: Optional[str] = None
     description: Optional[str] = None
     selected_contacts: List[SelectedContact]
+    force_regenerate: bool = False  # Skip the pitch cache and generate fresh pitches
 
 class DiscoveryPitchResult(BaseModel):
     email: str
@@ -186,6 +216,44 @@ class AnalyticsOverview(BaseModel):
     pitches_this_month: int
     avg_open_time_hours: Optional[float]  # average hours from sent to opened
 
+class AnalyticsTimeseriesPoint(BaseModel):
+    bucket_start: date  # first day of the bucket (Monday for weekly buckets)
+    sent: int = 0
+    opened: int = 0
+    clicked: int = 0
+    replied: int = 0
+    bounced: int = 0
+    median_open_hours: Optional[float] = None  # median hours from sent to opened
+
+class AnalyticsTimeseries(BaseModel):
+    bucket: str  # "day" or "week"
+    date_from: date
+    date_to: date
+    points: List[AnalyticsTimeseriesPoint]
+
+class AIUsageStats(BaseModel):
+    calls: int = 0  # first attempts
+    retries: int = 0  # repeat attempts after a rate limit
+    errors: int = 0  # attempts that raised
+    prompt_tokens: int = 0
+    candidate_tokens: int = 0
+    total_tokens: int = 0
+    avg_latency_ms: Optional[float] = None  # per attempt
+
+class AIUsageDay(AIUsageStats):
+    usage_date: date
+    call_type: str
+
+class AIUsageCallType(AIUsageStats):
+    call_type: str
+
+class AIUsageReport(BaseModel):
+    date_from: date
+    date_to: date
+    days: List[AIUsageDay]  # one entry per (day, call type) with any calls
+    by_call_type: List[AIUsageCallType]  # totals for the whole range
+    totals: AIUsageStats
+
 class BrandPitchSummary(BaseModel):
     pitch_id: int
     subject: str
@@ -252,7 +320,14 @@ class AutopilotLogResponse(BaseModel):
     pitches_generated: int
     pitches_sent: int
     errors: Optional[List] = []
+    skipped: Optional[List] = []  # why discovered brands weren't pitched
     tokens_used_estimate: int
+    # Real usage from the model's usage metadata
+    ai_calls: int = 0
+    ai_retries: int = 0
+    prompt_tokens: int = 0
+    candidate_tokens: int = 0
+    tokens_used: int = 0
     created_at: datetime
 
     class Config:
@@ -262,7 +337,7 @@ class AutopilotStatus(BaseModel):
     config: Optional[AutopilotConfigResponse]
     last_run: Optional[AutopilotLogResponse]
     is_configured: bool
-    scheduler_running: bool = False  # Whether the background scheduler is active
+    scheduler_running: bool = False  # Whether the background scheduler is active (in any worker)
     next_run_time: Optional[str] = None  # When the next scheduled run will happen
 
 class BlacklistRequest(BaseModel):
@@ -274,4 +349,10 @@ class AutopilotRunResult(BaseModel):
     brands_skipped: int
     pitches_generated: int
     pitches_sent: int
-    errors: List[Dict] = []
\ No newline at end of file
+    resumed: int = 0  # Unfinished work items picked up from earlier runs
+    from_pool: int = 0  # Candidates drawn from the surplus pool of earlier discoveries
+    errors: List[Dict] = []
+    skipped: List[Dict] = []  # {brand, email, reason, detail} per skipped brand
+    steps: Dict[str, Dict] = {}  # sequential pre-pipeline steps (discover, prefilter, pool_draw): received, emitted, elapsed_seconds
+    stages: Dict[str, Dict] = {}  # per pipeline stage: workers, received, emitted, errors, per_second, max_queue_depth
+    duration_seconds: Optional[float] = None
\ No newline at end of file
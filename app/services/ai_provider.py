@@ -1,10 +1,155 @@
+import importlib
+import threading
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from typing import Dict, List, Optional
+from app.config import settings
 
 class AIProvider(ABC):
+    # What generated a pitch — part of the pitch cache key (app.services.pitch_cache).
+    # Bump pitch_prompt_version whenever the pitch prompt changes.
+    model_name: str = ""
+    pitch_prompt_version: str = ""
+    # Most brands one discover_brands() call returns, whatever limit is asked for
+    max_discovered_brands: int = 10
+
     @abstractmethod
     def generate_pitch(self, brand: dict, profile: dict)-> Dict[str, str]:
         pass
     @abstractmethod
     def discover_brands(self, niches: List[str], limit: int = 10) -> List[dict]:
-        pass
\ No newline at end of file
+        pass
+    @abstractmethod
+    def discover_brand_contacts(self, brand_name: str) -> dict:
+        pass
+    @abstractmethod
+    def discover_brand_contacts_batch(self, brand_names: List[str]) -> List[dict]:
+        pass
+    @abstractmethod
+    def generate_pitches_batch(self, brands: List[dict], profile: dict) -> List[Optional[Dict[str, str]]]:
+        pass
+
+    def close(self) -> None:
+        """Release network clients/connection pools. Called on app shutdown."""
+        pass
+
+
+class AsyncAIProvider(ABC):
+    """asyncio counterpart of AIProvider, for `async def` routes.
+
+    Same methods and return shapes, but every call is a coroutine, so a
+    request waiting on the model (or on rate-limit backoff) doesn't hold
+    a threadpool thread.
+    """
+    model_name: str = ""
+    pitch_prompt_version: str = ""
+    max_discovered_brands: int = 10
+
+    @abstractmethod
+    async def generate_pitch(self, brand: dict, profile: dict) -> Dict[str, str]:
+        pass
+    @abstractmethod
+    async def discover_brands(self, niches: List[str], limit: int = 10) -> List[dict]:
+        pass
+    @abstractmethod
+    async def discover_brand_contacts(self, brand_name: str) -> dict:
+        pass
+    @abstractmethod
+    async def discover_brand_contacts_batch(self, brand_names: List[str]) -> List[dict]:
+        pass
+    @abstractmethod
+    async def generate_pitches_batch(self, brands: List[dict], profile: dict) -> List[Optional[Dict[str, str]]]:
+        pass
+
+    async def aclose(self) -> None:
+        """Release network clients/connection pools. Called on app shutdown."""
+        pass
+
+
+# ============ Provider registry ============
+#
+# Providers hold long-lived SDK clients with their own connection pools,
+# so ONE instance per process is shared by every request, background job
+# and thread (the SDK clients are thread-safe). It is created lazily on
+# first use and closed by the FastAPI lifespan hook.
+
+# settings.ai_provider → "module:ClassName" (imported lazily, so the SDKs
+# of providers we don't use are never loaded)
+AI_PROVIDERS = {
+    "gemini": "app.services.gemini:GeminiProvider",
+}
+
+ASYNC_AI_PROVIDERS = {
+    "gemini": "app.services.gemini_async:AsyncGeminiProvider",
+}
+
+_provider: Optional[AIProvider] = None
+_provider_lock = threading.Lock()
+
+# The async provider's client is bound to the event loop it first runs on,
+# so it is only ever created/closed from the (single) server loop.
+_async_provider: Optional[AsyncAIProvider] = None
+
+
+def _load_provider_class(registry: Dict[str, str]):
+    """Import the provider class settings.ai_provider selects from `registry`.
+
+    Raises:
+        ValueError: If settings.ai_provider names an unknown provider
+    """
+    name = (settings.ai_provider or "").strip().lower()
+    if name not in registry:
+        raise ValueError(
+            f"Unknown AI_PROVIDER '{settings.ai_provider}'. "
+            f"Supported: {', '.join(sorted(registry))}"
+        )
+    module_name, class_name = registry[name].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def get_ai_provider() -> AIProvider:
+    """Return the shared provider selected by settings.ai_provider.
+
+    Raises:
+        ValueError: If settings.ai_provider names an unknown provider
+    """
+    global _provider
+
+    if _provider is not None:
+        return _provider
+
+    with _provider_lock:
+        if _provider is None:
+            _provider = _load_provider_class(AI_PROVIDERS)()
+    return _provider
+
+
+def close_ai_provider() -> None:
+    """Close the shared provider (if it was ever created). The next get_ai_provider() makes a new one."""
+    global _provider
+
+    with _provider_lock:
+        provider, _provider = _provider, None
+    if provider is not None:
+        provider.close()
+
+
+def get_async_ai_provider() -> AsyncAIProvider:
+    """Return the shared async provider selected by settings.ai_provider.
+
+    Raises:
+        ValueError: If settings.ai_provider names a provider without an async variant
+    """
+    global _async_provider
+
+    if _async_provider is None:
+        _async_provider = _load_provider_class(ASYNC_AI_PROVIDERS)()
+    return _async_provider
+
+
+async def close_async_ai_provider() -> None:
+    """Close the shared async provider (if it was ever created)."""
+    global _async_provider
+
+    provider, _async_provider = _async_provider, None
+    if provider is not None:
+        await provider.aclose()
@@ -0,0 +1,172 @@
+"""Token accounting from the model's own usage metadata.
+
+Every provider attempt (first tries and rate-limited retries alike) is
+recorded with the prompt, candidate and total token counts Gemini reports
+in `usage_metadata`, plus its latency. Attempts are added to one row per
+(UTC day, call type) in `ai_usage_daily`, so manual generations,
+/discover/search and autopilot runs all show up — see GET /analytics/ai-usage.
+
+Recording an attempt only adds to in-memory counters (no DB round-trip
+on the AI call's path). usage_buffer writes them as one upsert batch
+every AI_USAGE_FLUSH_SECONDS from a background thread (started in the
+app lifespan), at the end of every measure_ai_usage() block — so the
+cron autopilot run is written before the process exits — and on shutdown.
+
+measure_ai_usage() additionally totals the calls made inside a block (in
+the current thread / task, and threads started with a copy of its
+context), which is how each autopilot run logs what it really used.
+
+Recording is best-effort: a failed flush is logged and retried with the
+next one, and never fails an AI call.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+from app.database import SessionLocal
+from app import crud
+
+logger = logging.getLogger(__name__)
+
+# Write buffered counters at least this often
+AI_USAGE_FLUSH_SECONDS = 10.0
+
+# Totals for the enclosing measure_ai_usage() block, if any
+_measurement: ContextVar[Optional[Dict[str, int]]] = ContextVar("ai_usage_measurement", default=None)
+# Worker threads copy the context, so several may add to one block's totals
+_measurement_lock = threading.Lock()
+
+
+def usage_counts(response) -> Dict[str, int]:
+    """Prompt/candidate/total token counts from a response's usage_metadata (0 if missing)."""
+    usage = getattr(response, "usage_metadata", None)
+
+    def count(name: str) -> int:
+        return int(getattr(usage, name, None) or 0) if usage is not None else 0
+
+    return {
+        "prompt_tokens": count("prompt_token_count"),
+        "candidate_tokens": count("candidates_token_count"),
+        "total_tokens": count("total_token_count"),
+    }
+
+
+class UsageBuffer:
+    """In-memory (day, call type) → counters, written to ai_usage_daily in batches."""
+
+    def __init__(self, flush_seconds: float = AI_USAGE_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self._pending: Dict[Tuple[date, str], Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time
+        self._stop = threading.Event()
+        self._thread = None
+        self.flush_errors = 0
+
+    def add(self, call_type: str, counts: Dict[str, int]) -> None:
+        """Add one attempt's counts. Never touches the database."""
+        key = (datetime.now(timezone.utc).date(), call_type)
+        with self._lock:
+            self._merge(key, counts)
+
+    def _merge(self, key: Tuple[date, str], counts: Dict[str, int]) -> None:
+        totals = self._pending.setdefault(key, dict.fromkeys(crud.AI_USAGE_FIELDS, 0))
+        for field in crud.AI_USAGE_FIELDS:
+            totals[field] += counts.get(field, 0)
+
+    def flush(self) -> int:
+        """Write all pending counters in one upsert. Returns how many rows were written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+
+            db = SessionLocal()
+            try:
+                crud.record_ai_usage(db, batch)
+                return len(batch)
+            except Exception as e:
+                db.rollback()
+                self.flush_errors += 1
+                logger.warning(f"Could not record AI usage ({len(batch)} rows): {str(e)}")
+                # Put the counts back so the next flush retries them
+                with self._lock:
+                    for key, counts in batch.items():
+                        self._merge(key, counts)
+                return 0
+            finally:
+                db.close()
+
+    def start(self) -> None:
+        """Start the background flusher thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ai-usage-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flusher and write whatever is still pending."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+
+
+# Global instance
+usage_buffer = UsageBuffer()
+
+
+def record_ai_call(call_type: str, attempt: int, started: float, response=None, failed: bool = False) -> None:
+    """Record one provider attempt (in memory — see usage_buffer).
+
+    Args:
+        call_type: What the call was for (e.g. "pitch_generation")
+        attempt: 0 for the first try, 1+ for retries
+        started: time.perf_counter() taken just before the attempt
+        response: The model response, for its usage metadata (None if it failed)
+        failed: True if the attempt raised
+    """
+    counts = usage_counts(response) if response is not None else {}
+    counts.update({
+        "calls": 0 if attempt else 1,
+        "retries": 1 if attempt else 0,
+        "errors": 1 if failed else 0,
+        "latency_ms": int((time.perf_counter() - started) * 1000),
+    })
+
+    measurement = _measurement.get()
+    if measurement is not None:
+        with _measurement_lock:
+            for field, value in counts.items():
+                measurement[field] = measurement.get(field, 0) + value
+
+    usage_buffer.add(call_type, counts)
+
+
+@contextmanager
+def measure_ai_usage() -> Iterator[Dict[str, int]]:
+    """Total the AI calls made inside the block.
+
+    Usage:
+        with measure_ai_usage() as usage:
+            ...
+        usage["total_tokens"]
+    """
+    totals = dict.fromkeys(crud.AI_USAGE_FIELDS, 0)
+    token = _measurement.set(totals)
+    try:
+        yield totals
+    finally:
+        _measurement.reset(token)
+        # A measured block is a unit of work (an autopilot run) — write its usage now
+        usage_buffer.flush()
@@ -0,0 +1,540 @@
+"""Brand contact discovery with a stale-while-revalidate cache.
+
+Discovering contacts is a search-grounded Gemini call that can take
+10-60 seconds with retries, so results are cached in the
+`brand_discovery_cache` table. Every entry carries `discovered_at`, and
+its age decides how a search is answered:
+
+- fresh   (age <= DISCOVERY_CACHE_FRESH_SECONDS)   → served from the cache
+- stale   (age <= DISCOVERY_CACHE_MAX_AGE_SECONDS) → served from the cache
+  instantly, and a background refresh is scheduled
+- expired (older than that)                        → refreshed while the
+  request waits; the old entry is still served if the refresh fails
+- miss                                             → discovered while the
+  request waits
+
+Every Gemini call goes through a single-flight layer keyed on the
+normalized brand name: concurrent searches for the same brand in this
+worker wait for ONE call and share its result, and a PostgreSQL advisory
+lock does the same across workers — whoever waited on the lock re-reads
+the cache instead of searching again.
+
+search_brands_batch() answers a whole list of names: cached ones from
+one IN query, and the misses packed several brands per Gemini prompt.
+
+search_brand_async() and search_brands_batch_async() are the same policies
+for `async def` routes: Gemini calls go through the async provider and
+database work runs on the threadpool, so a request waiting on Gemini
+doesn't hold a thread or a connection. Instead of the advisory lock,
+the async path claims a short lease row (`discovery_search_leases`);
+other workers poll the cache with asyncio.sleep until the holder's result
+lands there.
+
+Fresh hits, stale hits, expired hits and misses are counted per worker
+(see discovery_stats()).
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app import crud
+from app.config import settings
+from starlette.concurrency import run_in_threadpool
+from app.services.ai_provider import get_ai_provider, get_async_ai_provider
+from app.services.locks import AsyncSingleFlight, SingleFlight, advisory_lock
+
+logger = logging.getLogger(__name__)
+
+# Background refreshes run off the request thread. Two workers is plenty
+# — each refresh is one slow, rate-limited Gemini call.
+DISCOVERY_REFRESH_WORKERS = 2
+
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+
+# Longest a worker waits for another worker's search of the same brand.
+# Discovery retries can take ~60s; past this the search fails instead of
+# repeating the other worker's call.
+DISCOVERY_LOCK_TIMEOUT_SECONDS = 90
+
+# How long an async search's lease blocks other workers (a holder that
+# dies is taken over after this), and how often they re-check the cache
+DISCOVERY_LEASE_SECONDS = 120
+DISCOVERY_LEASE_POLL_SECONDS = 1.0
+
+# One Gemini discovery call in flight per brand key (this worker) — one
+# flight for threads, one for coroutines on the event loop. Across
+# workers, the thread path takes an advisory lock and the async path a lease.
+_discovery_flight = SingleFlight()
+_async_discovery_flight = AsyncSingleFlight()
+
+# Brands packed into one multi-brand discovery prompt, and how many of
+# those prompts a batch search runs at once
+DISCOVERY_BATCH_SIZE = 10
+DISCOVERY_BATCH_CONCURRENCY = 3
+
+# Brand keys with a background refresh queued or running (this worker)
+_refreshing = set()
+_lock = threading.Lock()
+
+_stats = {
+    "fresh_hits": 0,
+    "stale_hits": 0,
+    "expired_hits": 0,
+    "misses": 0,
+    "ai_searches": 0,
+    "batch_ai_calls": 0,
+    "shared_results": 0,
+    "refresh_failures": 0,
+}
+
+
+def _count(name: str) -> None:
+    with _lock:
+        _stats[name] += 1
+
+
+def _clean_result(brand_name: str, result: dict) -> dict:
+    """Validate and sanitize a discovery result so Pydantic validation doesn't blow up."""
+    result.setdefault("brand_name", brand_name)
+    result.setdefault("contacts", [])
+
+    # Sanitize each contact — make sure all required fields exist
+    cleaned_contacts = []
+    for contact in result.get("contacts", []):
+        if isinstance(contact, dict) and contact.get("email"):
+            cleaned_contacts.append({
+                "email": contact["email"],
+                "type": contact.get("type", "general"),
+                "confidence": contact.get("confidence", "low"),
+                "source": contact.get("source", "AI discovery")
+            })
+    result["contacts"] = cleaned_contacts
+    return result
+
+
+def _result_found_while_waiting(db: Session, brand_name: str, waiting_since: datetime) -> Optional[dict]:
+    """Cached data if another worker searched this brand while we waited on its lock."""
+    # expire_all so the query isn't answered from the session's stale identity map
+    db.expire_all()
+    entry = crud.get_discovery_cache_entry(db, brand_name)
+    if entry and entry.discovered_at and entry.discovered_at >= waiting_since:
+        _count("shared_results")
+        return entry.discovery_data
+    return None
+
+
+def _search_and_cache(db: Session, brand_name: str, brand_key: str) -> dict:
+    """Run (or reuse) one discovery for a brand while holding its advisory lock."""
+    waiting_since = datetime.utcnow()
+    with advisory_lock("discovery", brand_key, timeout=DISCOVERY_LOCK_TIMEOUT_SECONDS) as locked:
+        shared = _result_found_while_waiting(db, brand_name, waiting_since)
+        if shared is not None:
+            return shared
+        if not locked:
+            # Searching now would repeat the other worker's still-running call
+            raise Exception(f"Another search for '{brand_name}' is still running — try again shortly")
+
+        result = _clean_result(brand_name, get_ai_provider().discover_brand_contacts(brand_name))
+        crud.cache_discovered_brand(db, result, search_name=brand_name)
+        _count("ai_searches")
+        return result
+
+
+def discover_and_cache(db: Session, brand_name: str) -> dict:
+    """Call Gemini for a brand's contacts and save the result to the cache.
+
+    Only one call per brand is in flight at a time: concurrent callers in
+    this worker wait for it and get the same result, and other workers
+    wait on the advisory lock and then read the cached result.
+
+    Raises:
+        Exception: If the AI search fails, or another worker's search of
+            the brand is still running after DISCOVERY_LOCK_TIMEOUT_SECONDS
+    """
+    brand_key = crud.normalize_brand_key(brand_name) or brand_name
+    return _discovery_flight.do(brand_key, lambda: _search_and_cache(db, brand_name, brand_key))
+
+
+def _release_lease(db: Session, brand_key: str, holder: str) -> None:
+    try:
+        db.rollback()  # the search may have left the session in a failed transaction
+        crud.release_discovery_lease(db, brand_key, holder)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Could not release discovery lease for '{brand_key}' (it will run out): {str(e)}")
+
+
+async def _claim_or_wait(db: Session, brand_name: str, brand_key: str, holder: str) -> Optional[dict]:
+    """Claim the brand's search lease, or wait for the worker holding it.
+
+    Returns:
+        None once this search holds the lease, or the result another
+        worker cached while we waited
+
+    Raises:
+        Exception: If the other worker's search is still running after
+            DISCOVERY_LOCK_TIMEOUT_SECONDS
+    """
+    waiting_since = datetime.utcnow()
+    deadline = time.monotonic() + DISCOVERY_LOCK_TIMEOUT_SECONDS
+    while True:
+        claimed = await run_in_threadpool(
+            crud.claim_discovery_lease, db, brand_key, holder, DISCOVERY_LEASE_SECONDS
+        )
+        # Re-check even after claiming: the previous holder may have just finished
+        shared = await run_in_threadpool(_result_found_while_waiting, db, brand_name, waiting_since)
+        if shared is not None or claimed:
+            return shared
+        if time.monotonic() >= deadline:
+            # Searching now would repeat the other worker's still-running call
+            raise Exception(f"Another search for '{brand_name}' is still running — try again shortly")
+        await asyncio.sleep(DISCOVERY_LEASE_POLL_SECONDS)
+
+
+async def _search_and_cache_async(db: Session, brand_name: str, brand_key: str) -> dict:
+    """_search_and_cache for coroutines: a lease row instead of the advisory
+    lock, Gemini via the async provider, DB work on the threadpool."""
+    holder = uuid.uuid4().hex
+    brand_key = brand_key[:255]
+    shared = await _claim_or_wait(db, brand_name, brand_key, holder)
+    if shared is not None:
+        await run_in_threadpool(_release_lease, db, brand_key, holder)
+        return shared
+
+    try:
+        answer = await get_async_ai_provider().discover_brand_contacts(brand_name)
+        result = _clean_result(brand_name, answer)
+        await run_in_threadpool(crud.cache_discovered_brand, db, result, brand_name)
+    finally:
+        await run_in_threadpool(_release_lease, db, brand_key, holder)
+    _count("ai_searches")
+    return result
+
+
+async def discover_and_cache_async(db: Session, brand_name: str) -> dict:
+    """discover_and_cache for coroutines.
+
+    Concurrent callers in this worker share one call; other workers see
+    the lease, poll the cache and serve this call's result. Nothing holds
+    a connection while Gemini answers, so in-flight async discoveries
+    aren't capped by the pool size.
+
+    Raises:
+        Exception: If the AI search fails, or another worker's search of
+            the brand is still running after DISCOVERY_LOCK_TIMEOUT_SECONDS
+    """
+    brand_key = crud.normalize_brand_key(brand_name) or brand_name
+    return await _async_discovery_flight.do(
+        brand_key, lambda: _search_and_cache_async(db, brand_name, brand_key)
+    )
+
+
+def _refresh(brand_name: str, brand_key: str) -> None:
+    """Background refresh of one stale entry, in its own session."""
+    db = SessionLocal()
+    try:
+        discover_and_cache(db, brand_name)
+        logger.info(f"Discovery cache refreshed for '{brand_name}'")
+    except Exception as e:
+        db.rollback()
+        _count("refresh_failures")
+        logger.warning(f"Background discovery refresh failed for '{brand_name}': {str(e)}")
+    finally:
+        db.close()
+        with _lock:
+            _refreshing.discard(brand_key)
+
+
+def schedule_refresh(brand_name: str) -> bool:
+    """Queue a background refresh unless one is already pending for this brand.
+
+    Returns:
+        True if a refresh was queued
+    """
+    global _refresh_executor
+
+    brand_key = crud.normalize_brand_key(brand_name)
+    with _lock:
+        if not brand_key or brand_key in _refreshing:
+            return False
+        _refreshing.add(brand_key)
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(
+                max_workers=DISCOVERY_REFRESH_WORKERS, thread_name_prefix="discovery-refresh"
+            )
+        _refresh_executor.submit(_refresh, brand_name, brand_key)
+    return True
+
+
+def _age_seconds(discovered_at: Optional[datetime]) -> float:
+    """Age of a cache entry. Entries without a timestamp count as expired."""
+    if not discovered_at:
+        return float("inf")
+    # TIMESTAMP columns come back naive, in UTC
+    return (datetime.utcnow() - discovered_at).total_seconds()
+
+
+def _serve_from_cache(entry, brand_name: str) -> Optional[dict]:
+    """Apply the freshness policy to a cache lookup.
+
+    Returns:
+        The data to serve for fresh and stale entries (stale ones get a
+        background refresh), or None when the caller must search now
+    """
+    if not entry:
+        _count("misses")
+        return None
+
+    age = _age_seconds(entry.discovered_at)
+    if age <= settings.discovery_cache_fresh_seconds:
+        _count("fresh_hits")
+        return entry.discovery_data
+
+    if age <= settings.discovery_cache_max_age_seconds:
+        _count("stale_hits")
+        schedule_refresh(brand_name)
+        return entry.discovery_data
+
+    # Too old to serve without trying to refresh first
+    _count("expired_hits")
+    return None
+
+
+def _serve_expired(db: Session, brand_name: str, stale_data: Optional[dict], error: Exception) -> dict:
+    """Fall back to an expired entry when its refresh failed (re-raise if there is none)."""
+    if stale_data is None:
+        raise error
+    db.rollback()
+    _count("refresh_failures")
+    logger.warning(f"Discovery refresh failed for '{brand_name}', serving expired entry: {str(error)}")
+    return stale_data
+
+
+def search_brand(db: Session, brand_name: str) -> dict:
+    """Find contacts for a brand, cache-first with stale-while-revalidate.
+
+    Args:
+        db: Database session
+        brand_name: Brand name as typed by the user (e.g., "CeraVe")
+
+    Returns:
+        dict in BrandDiscoveryResponse format
+
+    Raises:
+        Exception: If the brand isn't cached and the AI search fails
+    """
+    entry = crud.get_discovery_cache_entry(db, brand_name)
+    cached = _serve_from_cache(entry, brand_name)
+    if cached is not None:
+        return cached
+
+    stale_data = entry.discovery_data if entry else None
+    try:
+        return discover_and_cache(db, brand_name)
+    except Exception as e:
+        return _serve_expired(db, brand_name, stale_data, e)
+
+
+async def search_brand_async(db: Session, brand_name: str) -> dict:
+    """search_brand for `async def` routes.
+
+    Raises:
+        Exception: If the brand isn't cached and the AI search fails
+    """
+    entry = await run_in_threadpool(crud.get_discovery_cache_entry, db, brand_name)
+    cached = _serve_from_cache(entry, brand_name)
+    if cached is not None:
+        return cached
+
+    stale_data = entry.discovery_data if entry else None
+    try:
+        return await discover_and_cache_async(db, brand_name)
+    except Exception as e:
+        return await run_in_threadpool(_serve_expired, db, brand_name, stale_data, e)
+
+
+def _classify(entry) -> Optional[str]:
+    """Freshness of a cache entry: "fresh", "stale", "expired" (or None if missing)."""
+    if not entry:
+        return None
+    age = _age_seconds(entry.discovered_at)
+    if age <= settings.discovery_cache_fresh_seconds:
+        return "fresh"
+    if age <= settings.discovery_cache_max_age_seconds:
+        return "stale"
+    return "expired"
+
+
+def _search_chunk(brand_names: List[str]) -> List[dict]:
+    """One multi-brand Gemini call (runs on a worker thread, no DB access)."""
+    _count("batch_ai_calls")
+    return get_ai_provider().discover_brand_contacts_batch(brand_names)
+
+
+class _BatchPlan:
+    """Bookkeeping for one batch search, keyed by normalized brand name."""
+
+    def __init__(self, brand_names: List[str]):
+        self.requested = [(name, crud.normalize_brand_key(name)) for name in brand_names]
+        self.keys = dict(self.requested)
+        # Per key: the outcome to return, once known
+        self.resolved: Dict[str, dict] = {}
+        self.to_search: Dict[str, str] = {}  # key → first requested spelling
+        self.fallback: Dict[str, dict] = {}  # expired data, served if the refresh fails
+
+    def chunks(self) -> List[List[str]]:
+        """The names still to search, DISCOVERY_BATCH_SIZE per Gemini prompt."""
+        names = list(self.to_search.values())
+        return [names[i:i + DISCOVERY_BATCH_SIZE] for i in range(0, len(names), DISCOVERY_BATCH_SIZE)]
+
+
+def _plan_batch(db: Session, brand_names: List[str]) -> _BatchPlan:
+    """Answer what the cache can (ONE IN query) and collect the names to search."""
+    plan = _BatchPlan(brand_names)
+    entries = crud.get_discovery_cache_entries(db, [key for key in set(plan.keys.values()) if key])
+
+    for name, key in plan.requested:
+        if not key or key in plan.resolved or key in plan.to_search:
+            continue
+        entry = entries.get(key)
+        if entry is None and settings.discovery_fuzzy_match:
+            entry = crud.get_discovery_cache_entry(db, name)
+
+        freshness = _classify(entry)
+        if freshness in ("fresh", "stale"):
+            _count(f"{freshness}_hits")
+            if freshness == "stale":
+                schedule_refresh(name)
+            plan.resolved[key] = {"status": "cached", "result": entry.discovery_data}
+        else:
+            _count("expired_hits" if freshness else "misses")
+            if entry is not None:
+                plan.fallback[key] = entry.discovery_data
+            plan.to_search[key] = name
+    return plan
+
+
+def _store_chunk(db: Session, plan: _BatchPlan, chunk: List[str], answers) -> None:
+    """Write one chunk's answers to the cache (or record why the chunk failed)."""
+    if isinstance(answers, BaseException):
+        logger.warning(f"Batch brand search failed for {len(chunk)} brands: {str(answers)}")
+        for name in chunk:
+            plan.resolved[plan.keys[name]] = {"status": "failed", "error": str(answers)}
+        return
+
+    by_key = {}
+    for answer in answers:
+        by_key.setdefault(crud.normalize_brand_key(answer["brand_name"]), answer)
+    for name in chunk:
+        answer = by_key.get(plan.keys[name])
+        if answer is None:
+            plan.resolved[plan.keys[name]] = {"status": "failed", "error": "Brand missing from AI response"}
+            continue
+        result = _clean_result(name, answer)
+        crud.cache_discovered_brand(db, result, search_name=name)
+        plan.resolved[plan.keys[name]] = {"status": "discovered", "result": result}
+
+
+def _batch_response(plan: _BatchPlan, ai_calls: int) -> dict:
+    """One result per requested name, in request order."""
+    results = []
+    for name, key in plan.requested:
+        outcome = plan.resolved.get(key) or {"status": "failed", "error": "Brand name is empty"}
+        if outcome["status"] == "failed" and key in plan.fallback:
+            outcome = {"status": "cached", "result": plan.fallback[key]}
+        results.append({
+            "brand_name": name,
+            "status": outcome["status"],
+            "result": outcome.get("result"),
+            "error": outcome.get("error"),
+        })
+    return {"results": results, "ai_calls": ai_calls}
+
+
+def search_brands_batch(db: Session, brand_names: List[str]) -> dict:
+    """Find contacts for many brands at once.
+
+    1. Names are deduplicated by normalized key and looked up in the
+       discovery cache with ONE IN query. Fresh and stale entries are
+       served as-is (stale ones get a background refresh, like /search).
+    2. Misses and expired entries are packed DISCOVERY_BATCH_SIZE brands
+       per Gemini prompt, a few prompts in parallel.
+    3. Each brand in the answers is written back to its own cache entry.
+
+    Args:
+        db: Database session
+        brand_names: Brand names as typed by the user
+
+    Returns:
+        dict in BrandDiscoveryBatchResponse format — one result per
+        requested name, in request order
+    """
+    plan = _plan_batch(db, brand_names)
+    chunks = plan.chunks()
+    if chunks:
+        with ThreadPoolExecutor(max_workers=min(DISCOVERY_BATCH_CONCURRENCY, len(chunks))) as pool:
+            futures = [(chunk, pool.submit(_search_chunk, chunk)) for chunk in chunks]
+            for chunk, future in futures:
+                try:
+                    answers = future.result()
+                except Exception as e:
+                    answers = e
+                _store_chunk(db, plan, chunk, answers)
+    return _batch_response(plan, len(chunks))
+
+
+async def search_brands_batch_async(db: Session, brand_names: List[str]) -> dict:
+    """search_brands_batch for `async def` routes — the Gemini prompts are
+    awaited concurrently (at most DISCOVERY_BATCH_CONCURRENCY at a time)
+    instead of occupying pool threads.
+    """
+    plan = await run_in_threadpool(_plan_batch, db, brand_names)
+    chunks = plan.chunks()
+    if chunks:
+        semaphore = asyncio.Semaphore(DISCOVERY_BATCH_CONCURRENCY)
+
+        async def search(chunk: List[str]) -> List[dict]:
+            async with semaphore:
+                _count("batch_ai_calls")
+                return await get_async_ai_provider().discover_brand_contacts_batch(chunk)
+
+        answers = await asyncio.gather(*(search(chunk) for chunk in chunks), return_exceptions=True)
+
+        def store() -> None:
+            # One session, so the writes run one after another on one thread
+            for chunk, chunk_answers in zip(chunks, answers):
+                _store_chunk(db, plan, chunk, chunk_answers)
+
+        await run_in_threadpool(store)
+    return _batch_response(plan, len(chunks))
+
+
+def discovery_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["refreshes_pending"] = len(_refreshing)
+    hits = stats["fresh_hits"] + stats["stale_hits"] + stats["expired_hits"]
+    lookups = hits + stats["misses"]
+    stats["hit_rate"] = round(hits / lookups, 3) if lookups else None
+    stats["coalesced_searches"] = _discovery_flight.coalesced + _async_discovery_flight.coalesced
+    stats["searches_in_flight"] = _discovery_flight.in_flight() + _async_discovery_flight.in_flight()
+    stats["fresh_seconds"] = settings.discovery_cache_fresh_seconds
+    stats["max_age_seconds"] = settings.discovery_cache_max_age_seconds
+    return stats
+
+
+def stop_background_refreshes() -> None:
+    """Drop queued refreshes on shutdown (a running one finishes on its own)."""
+    global _refresh_executor
+
+    with _lock:
+        executor, _refresh_executor = _refresh_executor, None
+        _refreshing.clear()
+    if executor:
+        executor.shutdown(wait=False, cancel_futures=True)
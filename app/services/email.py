@@ -1,13 +1,64 @@
+import base64
+import hashlib
+import hmac
 import uuid
 import resend
+from typing import Optional
 from app.config import settings
 
 #configure Resend
 resend.api_key = settings.resend_api_key
 
-def generate_tracking_pixel_id() -> str:
-    """Generate unique UUID for tracking."""
-    return str(uuid.uuid4())
+# Bytes of the HMAC kept in the token (128 bits → 22 base64url chars)
+TRACKING_SIGNATURE_BYTES = 16
+
+
+def _tracking_signature(pitch_id: int) -> str:
+    digest = hmac.new(
+        settings.secret_key.encode(), f"pixel:{pitch_id}".encode(), hashlib.sha256
+    ).digest()[:TRACKING_SIGNATURE_BYTES]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def generate_tracking_pixel_id(pitch_id: int) -> str:
+    """Generate a signed tracking ID for a pitch: '<pitch_id>.<signature>'.
+
+    The signature is an HMAC of the pitch ID keyed on settings.secret_key,
+    so the pixel endpoint can verify the ID and update the pitch by primary
+    key without looking anything up first. Forged or garbage IDs are
+    rejected without touching the database.
+    """
+    return f"{pitch_id}.{_tracking_signature(pitch_id)}"
+
+
+def is_signed_tracking_pixel_id(tracking_pixel_id: str) -> bool:
+    """Signed IDs contain a '.'; legacy IDs are plain UUIDs (which never do)."""
+    return "." in tracking_pixel_id
+
+
+def verify_tracking_pixel_id(tracking_pixel_id: str) -> Optional[int]:
+    """Return the pitch ID encoded in a signed tracking ID, or None if invalid.
+
+    The ID part must be the canonical form we sign — ASCII digits, no
+    leading zeros — so "007.<sig>" or full-width digits never parse to a
+    pitch whose signature they happen to carry.
+    """
+    pitch_id, _, signature = tracking_pixel_id.partition(".")
+    if not (pitch_id.isascii() and pitch_id.isdigit()) or len(pitch_id) > 18:
+        return None
+    if pitch_id != str(int(pitch_id)) or not signature.isascii():
+        return None
+    if not hmac.compare_digest(signature, _tracking_signature(int(pitch_id))):
+        return None
+    return int(pitch_id)
+
+
+def is_legacy_tracking_pixel_id(tracking_pixel_id: str) -> bool:
+    """Pitches sent before signed IDs existed use random UUID tracking IDs."""
+    try:
+        return str(uuid.UUID(tracking_pixel_id)) == tracking_pixel_id
+    except ValueError:
+        return False
 
 def embed_tracking_pixel(body: str, tracking_pixel_id: str, base_url: str) -> str:
     pixel_url = f"{base_url}/track/pixel/{tracking_pixel_id}.png"
@@ -21,8 +72,18 @@ def send_email_via_resend(
         to_email: str,
         subject: str,
         body_html: str,
-        reply_to: str
-) -> dict:
+        reply_to: str,
+        idempotency_key: Optional[str] = None
+) -> Optional[str]:
+    """Send an email via Resend.
+
+    Args:
+        idempotency_key: Resend sends at most one email per key (within
+            24 hours), so retrying a send that may have gone out is safe
+
+    Returns:
+        The Resend email ID (store it on the pitch so webhooks can find it)
+    """
     try: 
         params = {
             "from": "josh <josh@outreach.rajicloud.me>",
@@ -32,8 +93,9 @@ def send_email_via_resend(
             "reply_to": [reply_to]
         }
 
-        response = resend.Emails.send(params)
-        return response
+        options = {"idempotency_key": idempotency_key} if idempotency_key else None
+        response = resend.Emails.send(params, options)
+        return response.get("id") if isinstance(response, dict) else getattr(response, "id", None)
     
     except Exception as e:
         raise Exception(f"Failed to send emial via Resend: {str(e)}")
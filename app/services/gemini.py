@@ -5,47 +5,47 @@ import json
 import time
 import re
 import logging
-from typing import Dict, List
+from typing import Any, Callable, Dict, List, Optional
 from app.services.ai_provider import AIProvider
+from app.services.rate_limiter import estimate_tokens, gemini_rate_limiter
+from app.services.ai_usage import record_ai_call
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+GEMINI_MODEL = "gemini-2.5-flash"
 
-#Pitch generation
-class GeminiProvider(AIProvider):
-    def __init__(self):
-        """Initialize Gemini provider with API key from settings."""
-        # Configure the OLD SDK for pitch generation (this still works fine)
-        genai_old.configure(api_key=settings.gemini_api_key)
-        self.model = genai_old.GenerativeModel("gemini-2.5-flash")
+# Bump whenever build_pitch_prompt / build_pitches_batch_prompt change, so
+# cached pitches from the old prompts are no longer served (see
+# app.services.pitch_cache)
+PITCH_PROMPT_VERSION = "1"
 
-        # Create the NEW SDK client for brand discovery (supports search grounding)
-        self.discovery_client = genai.Client(api_key=settings.gemini_api_key)
+# Expected answer sizes, for the rate limiter's up-front token estimate
+# (corrected with the real usage once each response is in)
+PITCH_OUTPUT_TOKENS = 800
+DISCOVERY_OUTPUT_TOKENS = 1000
 
-    def generate_pitch(self, brand_data: dict, profile_data: dict) -> Dict[str, str]:
-        """
-        Generate a personalized pitch using Gemini.
+# Brands asked for per discover_brands() call, at most — keeps the answer complete
+MAX_DISCOVERED_BRANDS = 10
 
-        Args:
-            brand_data: Dictionary with brand info (name, website, category, etc.)
-            profile_data: Dictionary with creator info (name, niches, bio, etc.)
 
-        Returns:
-            Dictionary with 'subject' and 'body' keys
-        """
-        # Build the prompt
-        prompt = f"""
-You are {profile_data.get('name', 'a content creator')} writing a pitch email directly to a brand. Write in FIRST PERSON - you are the creator, not a manager or agent.
+# ============ Prompts + response parsing ============
+# Shared by GeminiProvider and AsyncGeminiProvider (app.services.gemini_async),
+# so both send exactly the same prompts and read the answers the same way.
 
-BRAND INFORMATION:
+def _pitch_brand_block(brand_data: dict) -> str:
+    return f"""BRAND INFORMATION:
 - Name: {brand_data.get('name', 'Unknown')}
 - Website: {brand_data.get('website', 'Not provided')}
 - Category: {brand_data.get('category', 'Not provided')}
 - Instagram: {brand_data.get('instagram', 'Not provided')}
 - Notes: {brand_data.get('notes', 'Not provided')}
 
-YOUR CREATOR PROFILE:
+"""
+
+
+def _pitch_profile_block(profile_data: dict) -> str:
+    return f"""YOUR CREATOR PROFILE:
 - Name: {profile_data.get('name', 'Unknown')}
 - Email: {profile_data.get('sender_email', 'Not provided')}
 - Niches: {', '.join(profile_data.get('niches', []))}
@@ -60,7 +60,11 @@ YOUR CREATOR PROFILE:
 - Average Views: {profile_data.get('avg_views', 0)}
 - Engagement Rate: {profile_data.get('engagement_rate', 0)}%
 
-INSTRUCTIONS:
+"""
+
+
+def _pitch_instructions(profile_data: dict) -> str:
+    return f"""INSTRUCTIONS:
 Write a concise, professional pitch email FROM the creator's perspective (first person - "I'm...", "My content...", "I'd love...").
 
 SUBJECT LINE:
@@ -88,96 +92,64 @@ FOOTER/SIGNATURE:
 - Format Portfolio: <a href="{profile_data.get('portfolio_url')}">View Portfolio</a>
 - DO NOT INCLUDE EMAIL ADDRESS - the email is already in the FROM field
 
-Return ONLY valid JSON in this exact format:
-{{
+"""
+
+
+def build_pitch_prompt(brand_data: dict, profile_data: dict) -> str:
+    """Prompt for one personalized pitch email (answer: JSON subject + body)."""
+    intro = f"""
+You are {profile_data.get('name', 'a content creator')} writing a pitch email directly to a brand. Write in FIRST PERSON - you are the creator, not a manager or agent.
+
+"""
+    answer_format = """Return ONLY valid JSON in this exact format:
+{
   "subject": "Your subject line here",
   "body": "<p>Your HTML email body here</p>"
-}}
+}
 """
+    return (
+        intro
+        + _pitch_brand_block(brand_data)
+        + _pitch_profile_block(profile_data)
+        + _pitch_instructions(profile_data)
+        + answer_format
+    )
+
+
+def build_pitches_batch_prompt(brands_data: List[dict], profile_data: dict) -> str:
+    """Prompt for one pitch per brand in a single call — the creator profile
+    and instructions are sent once instead of once per brand.
+    
+    Brands are numbered from 1; the answer echoes each number as "index".
+    """
+    intro = f"""
+You are {profile_data.get('name', 'a content creator')} writing pitch emails directly to {len(brands_data)} brands — one separate email per brand. Write in FIRST PERSON - you are the creator, not a manager or agent.
 
-        # Call Gemini API with JSON output
-        # Retry up to 4 times for rate limits — autopilot runs in the background
-        # so we can afford to wait longer than interactive requests.
-        max_retries = 4
-        for attempt in range(max_retries):
-            try:
-                response = self.model.generate_content(
-                    prompt,
-                    generation_config=genai_old.GenerationConfig(
-                        response_mime_type="application/json"
-                    )
-                )
-                break  # Success — exit the retry loop
-            except Exception as e:
-                error_str = str(e).lower()
-                # Only retry on rate limit errors (429 / RESOURCE_EXHAUSTED)
-                if "429" in error_str or "resource_exhausted" in error_str or "rate" in error_str:
-                    if attempt == max_retries - 1:
-                        raise Exception(
-                            "Gemini rate limit reached. "
-                            "You've made too many AI requests recently. "
-                            "Wait 1-2 minutes and try again."
-                        )
-                    
-                    # Try to extract the wait time from the error message
-                    match = re.search(r'retry\s*(?:in|after)\s*(\d+\.?\d*)', error_str)
-                    if match:
-                        wait_time = float(match.group(1)) + 1  # Add 1s buffer
-                    else:
-                        wait_time = 15 * (attempt + 1)  # Escalating: 15s, 30s, 45s
-
-                    # Cap at 60s — autopilot can wait, but not forever
-                    if wait_time > 60:
-                        raise Exception(
-                            "Gemini rate limit reached. "
-                            "You've made too many AI requests recently. "
-                            "Wait 1-2 minutes and try again."
-                        )
-
-                    logger.warning(
-                        f"Rate limited on pitch generation (attempt {attempt + 1}/{max_retries}). "
-                        f"Waiting {wait_time:.1f}s before retry..."
-                    )
-                    time.sleep(wait_time)
-                else:
-                    raise  # Non-rate-limit error — don't retry, raise immediately
-
-        # Parse JSON response
-        pitch = json.loads(response.text)
-
-        return pitch
+"""
+    brands = "".join(
+        f"[BRAND {index}]\n" + _pitch_brand_block(brand_data)
+        for index, brand_data in enumerate(brands_data, start=1)
+    )
+    answer_format = """Write every email specifically for its brand — do not reuse paragraphs or collaboration ideas between brands.
+
+Return ONLY valid JSON in this exact format, with one entry per brand above:
+{
+  "pitches": [
+    {
+      "index": 1,
+      "subject": "Your subject line here",
+      "body": "<p>Your HTML email body here</p>"
+    }
+  ]
+}
+"""
+    return intro + brands + _pitch_profile_block(profile_data) + _pitch_instructions(profile_data) + answer_format
 
-    def discover_brands(self, niches: List[str], limit: int = 5) -> List[dict]:
-        """
-        Discover multiple brands in a SINGLE Gemini call (token-efficient).
-        
-        Instead of calling the API once per brand (expensive), this sends ONE
-        prompt asking for N brands matching the given niches, complete with
-        contact emails. This is the core autopilot discovery method.
-        
-        Token efficiency:
-        - Single prompt, single response (vs N calls for N brands)
-        - Lean prompt — only asks for name + email + category
-        - Low temperature for factual accuracy
-        - No unnecessary metadata (website, description, etc.)
-        
-        Args:
-            niches: List of niche keywords (e.g., ["skincare", "wellness"])
-            limit: Maximum brands to discover (default 5, max 10)
 
-        Returns:
-            List of dicts: [{name, email, category, confidence}, ...]
-        """
-        limit = min(limit, 10)  # Cap at 10 to keep response manageable
-        
-        google_search_tool = types.Tool(
-            google_search=types.GoogleSearch()
-        )
-        
-        niches_str = ", ".join(niches)
-        
-        # Lean prompt — request ONLY what we need (name + email + category)
-        prompt = f"""You are a brand outreach researcher. Find {limit} real brands in the following niches 
+def build_brands_prompt(niches: List[str], limit: int) -> str:
+    """Lean batch discovery prompt — request ONLY what we need (name + email + category)."""
+    niches_str = ", ".join(niches)
+    return f"""You are a brand outreach researcher. Find {limit} real brands in the following niches 
 that actively work with content creators and influencers: {niches_str}
 
 For each brand, find their REAL partnership or PR contact email address.
@@ -204,116 +176,53 @@ Return ONLY valid JSON, no other text:
 If you cannot find {limit} brands with verified emails, return fewer. Quality over quantity.
 """
 
-        max_retries = 3
-        raw_text = None
-        
-        for attempt in range(max_retries):
-            try:
-                response = self.discovery_client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=prompt,
-                    config=types.GenerateContentConfig(
-                        tools=[google_search_tool],
-                        temperature=0.1  # Very low temp for factual discovery
-                    )
-                )
-                
-                if hasattr(response, 'text') and response.text:
-                    raw_text = response.text
-                elif hasattr(response, 'candidates') and response.candidates:
-                    raw_text = response.candidates[0].content.parts[0].text
-                else:
-                    raise Exception(f"Unexpected response structure: {response}")
-                
-                break
-                
-            except Exception as e:
-                error_str = str(e).lower()
-                if "429" in error_str or "resource_exhausted" in error_str or "rate" in error_str:
-                    if attempt == max_retries - 1:
-                        raise Exception(
-                            "Gemini rate limit reached during brand discovery. "
-                            "Wait 1-2 minutes and try again."
-                        )
-                    
-                    match = re.search(r'retry\s*(?:in|after)\s*(\d+\.?\d*)', error_str)
-                    wait_time = float(match.group(1)) + 1 if match else 15 * (attempt + 1)
-                    
-                    if wait_time > 60:
-                        raise Exception(
-                            "Gemini rate limit reached. Wait 1-2 minutes and try again."
-                        )
-                    
-                    logger.warning(
-                        f"Rate limited on batch discovery (attempt {attempt + 1}/{max_retries}). "
-                        f"Waiting {wait_time:.1f}s..."
-                    )
-                    time.sleep(wait_time)
-                else:
-                    raise
-        
-        # Parse response
-        try:
-            cleaned = raw_text.strip()
-            if cleaned.startswith("```json"):
-                cleaned = cleaned[7:]
-            if cleaned.startswith("```"):
-                cleaned = cleaned[3:]
-            if cleaned.endswith("```"):
-                cleaned = cleaned[:-3]
-            cleaned = cleaned.strip()
-            
-            result = json.loads(cleaned)
-            brands = result.get("brands", [])
-            
-            # Validate each brand has required fields
-            valid_brands = []
-            for b in brands:
-                if isinstance(b, dict) and b.get("name") and b.get("email") and "@" in b.get("email", ""):
-                    valid_brands.append({
-                        "name": b["name"],
-                        "email": b["email"],
-                        "category": b.get("category", niches[0] if niches else "general"),
-                        "confidence": b.get("confidence", "medium"),
-                    })
-            
-            return valid_brands
-            
-        except json.JSONDecodeError as e:
-            raise Exception(
-                f"Failed to parse batch discovery response. "
-                f"Response: {raw_text[:200]}... Error: {str(e)}"
-            )
-    
-    def discover_brand_contacts(self, brand_name: str) -> dict:
-        """
-        Use Gemini with Google Search grounding to find real partnership/PR
-        contact emails for a brand. Only fetches emails — nothing else.
 
-        How it works:
-        1. We create a Google Search grounding tool so Gemini can search the web in real-time
-        2. We send a focused prompt asking ONLY for contact emails
-        3. Gemini searches the web, finds real emails, and returns structured JSON
-        4. We parse and return the JSON with just the discovered contacts
+def build_contacts_batch_prompt(brand_names: List[str]) -> str:
+    """Contact-email research prompt for several brands at once."""
+    brands_str = "\n".join(f"- {name}" for name in brand_names)
+    return f"""You are a brand outreach researcher. Find real contact email addresses
+that a content creator can use to pitch collaborations for EACH of these brands:
+{brands_str}
 
-        Args:
-            brand_name: The name of the brand to research (e.g., "CeraVe", "The Ordinary")
+For each brand, search for PR / press, partnership, influencer program, marketing
+or (only if nothing more specific exists) general contact emails.
 
-        Returns:
-            dict with keys: brand_name, contacts (list of email dicts)
-        """
+RULES:
+1. Only include emails you actually found on their website, social media, or press pages.
+2. Do NOT make up, guess, or construct email addresses.
+3. Emails ONLY — no websites, social links or other metadata.
+4. Classify each email's type as one of: "pr", "partnerships", "marketing", "general", "influencer"
+5. Rate your confidence as "high", "medium", or "low".
+6. Return one entry per brand, using the brand name EXACTLY as listed above.
 
-        # Step 1: Create the Google Search grounding tool
-        # This gives Gemini the ability to search Google in real-time
-        # Without this, Gemini can only use its training data (which may be outdated)
-        google_search_tool = types.Tool(
-            google_search=types.GoogleSearch()
-        )
+Return ONLY valid JSON, no other text:
+{{
+    "brands": [
+        {{
+            "brand_name": "Brand Name",
+            "contacts": [
+                {{
+                    "email": "press@example.com",
+                    "type": "pr",
+                    "confidence": "high",
+                    "source": "Found on their website contact page"
+                }}
+            ]
+        }}
+    ]
+}}
+
+If you cannot find any real emails for a brand, return it with an empty contacts list.
+"""
 
-        # Step 2: Build the focused email-only research prompt
-        # We keep this narrow on purpose — we only need emails, not full brand metadata.
-        # Asking for less = fewer tokens burned, faster response.
-        prompt = f"""
+
+def build_contacts_prompt(brand_name: str) -> str:
+    """Focused email-only research prompt for one brand.
+
+    We keep this narrow on purpose — we only need emails, not full brand metadata.
+    Asking for less = fewer tokens burned, faster response.
+    """
+    return f"""
 You are a brand outreach researcher. Your ONLY job is to find real contact email addresses
 for the brand "{brand_name}" that a content creator can use to pitch collaborations.
 
@@ -347,83 +256,376 @@ Return ONLY valid JSON in this exact format, no other text:
 If you cannot find any real contact emails, return an empty contacts list.
 """
 
-        # Step 3: Send the request to Gemini using the NEW SDK
-        # We use self.discovery_client (initialized in __init__) with search grounding
-        # Discovery gets 3 retries (heavier operation, user expects it to take a moment)
-        max_retries = 3
-        raw_text = None
 
+def total_tokens(response) -> Optional[int]:
+    """Tokens a response was billed for (prompt + answer), if the SDK reported it."""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) if usage else None
+
+
+def strip_code_fences(raw_text: str) -> str:
+    """Remove the ```json ... ``` fences Gemini sometimes wraps JSON answers in."""
+    cleaned = raw_text.strip()
+    if cleaned.startswith("```json"):
+        cleaned = cleaned[7:]
+    if cleaned.startswith("```"):
+        cleaned = cleaned[3:]
+    if cleaned.endswith("```"):
+        cleaned = cleaned[:-3]
+    return cleaned.strip()
+
+
+def parse_brands_response(raw_text: str, niches: List[str]) -> List[dict]:
+    """Parse a batch discovery answer into [{name, email, category, confidence}, ...]."""
+    try:
+        result = json.loads(strip_code_fences(raw_text))
+    except json.JSONDecodeError as e:
+        raise Exception(
+            f"Failed to parse batch discovery response. "
+            f"Response: {raw_text[:200]}... Error: {str(e)}"
+        )
+    
+    # Validate each brand has required fields
+    valid_brands = []
+    for b in result.get("brands", []):
+        if isinstance(b, dict) and b.get("name") and b.get("email") and "@" in b.get("email", ""):
+            valid_brands.append({
+                "name": b["name"],
+                "email": b["email"],
+                "category": b.get("category", niches[0] if niches else "general"),
+                "confidence": b.get("confidence", "medium"),
+            })
+    
+    return valid_brands
+
+
+def parse_contacts_batch_response(raw_text: str) -> List[dict]:
+    """Parse a multi-brand contact answer into [{brand_name, contacts}, ...]."""
+    try:
+        result = json.loads(strip_code_fences(raw_text))
+    except json.JSONDecodeError as e:
+        raise Exception(
+            f"Failed to parse batch brand search response. "
+            f"Response: {raw_text[:200]}... Error: {str(e)}"
+        )
+    
+    return [
+        {
+            "brand_name": str(entry.get("brand_name", "")),
+            "contacts": entry.get("contacts") if isinstance(entry.get("contacts"), list) else [],
+        }
+        for entry in result.get("brands", [])
+        if isinstance(entry, dict) and entry.get("brand_name")
+    ]
+
+
+def parse_contacts_response(raw_text: str) -> dict:
+    """Parse a single-brand contact answer into {brand_name, contacts}."""
+    try:
+        cleaned_text = strip_code_fences(raw_text)
+        return json.loads(cleaned_text)
+    except json.JSONDecodeError as e:
+        raise Exception(f"Failed to parse Gemini response as JSON. Response was: {cleaned_text[:200]}... Error: {str(e)}")
+    except Exception as e:
+        raise Exception(f"Failed to discover brand contacts: {str(e)}")
+
+
+def parse_pitches_batch_response(raw_text: str, count: int) -> List[Optional[Dict[str, str]]]:
+    """Parse a multi-brand pitch answer into one entry per brand, in prompt order.
+
+    Each entry is {subject, body}, or None if the model left that brand out
+    or answered it with an empty/malformed pitch (callers regenerate those
+    one at a time).
+    """
+    try:
+        result = json.loads(strip_code_fences(raw_text))
+    except json.JSONDecodeError as e:
+        raise Exception(
+            f"Failed to parse batch pitch response. "
+            f"Response: {raw_text[:200]}... Error: {str(e)}"
+        )
+
+    pitches: List[Optional[Dict[str, str]]] = [None] * count
+    entries = result.get("pitches", []) if isinstance(result, dict) else []
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get("index")) - 1
+        except (TypeError, ValueError):
+            continue
+        subject, body = entry.get("subject"), entry.get("body")
+        if not (0 <= index < count) or pitches[index] is not None:
+            continue  # Unknown brand number, or a duplicate — keep the first
+        if not (isinstance(subject, str) and isinstance(body, str)):
+            continue
+        subject, body = subject.strip(), body.strip()
+        # Subjects must fit the pitches table (255 chars)
+        if subject and body and len(subject) <= 255:
+            pitches[index] = {"subject": subject, "body": body}
+
+    return pitches
+
+
+# ============ Retries + rate-limit backoff ============
+# Shared by GeminiProvider._generate and AsyncGeminiProvider._generate
+# (app.services.gemini_async) — only the sleeping differs.
+
+# Longest rate-limit wait we accept before giving up on a call
+MAX_RETRY_WAIT_SECONDS = 60
+
+RATE_LIMIT_MESSAGE = (
+    "Gemini rate limit reached. "
+    "You've made too many AI requests recently. "
+    "Wait 1-2 minutes and try again."
+)
+
+
+def is_rate_limited(error_str: str) -> bool:
+    """Whether a (lowercased) error message is a 429 / RESOURCE_EXHAUSTED."""
+    return "429" in error_str or "resource_exhausted" in error_str or "rate" in error_str
+
+
+def retry_wait_seconds(error_str: str, attempt: int) -> float:
+    """How long to back off: Gemini's own "retry in Ns" hint, else 15s, 30s, 45s..."""
+    match = re.search(r'retry\s*(?:in|after)\s*(\d+\.?\d*)', error_str)
+    return float(match.group(1)) + 1 if match else 15 * (attempt + 1)
+
+
+def response_text(response) -> str:
+    """Pull the text out of a generate_content response (either SDK)."""
+    if hasattr(response, 'text') and response.text:
+        return response.text
+    if hasattr(response, 'candidates') and response.candidates:
+        return response.candidates[0].content.parts[0].text
+    raise Exception(f"Unexpected response structure: {response}")
+
+
+#Pitch generation
+class GeminiProvider(AIProvider):
+    model_name = GEMINI_MODEL
+    pitch_prompt_version = PITCH_PROMPT_VERSION
+    max_discovered_brands = MAX_DISCOVERED_BRANDS
+
+    def __init__(self):
+        """Initialize Gemini provider with API key from settings."""
+        # Configure the OLD SDK for pitch generation (this still works fine)
+        genai_old.configure(api_key=settings.gemini_api_key)
+        self.model = genai_old.GenerativeModel(GEMINI_MODEL)
+
+        # Create the NEW SDK client for brand discovery (supports search grounding)
+        self.discovery_client = genai.Client(api_key=settings.gemini_api_key)
+
+    def close(self) -> None:
+        """Close the discovery client's HTTP connection pool."""
+        self.discovery_client.close()
+
+    def _json_request(self, prompt: str) -> Callable[[], Any]:
+        """A JSON-output request on the old SDK (pitch generation)."""
+        return lambda: self.model.generate_content(
+            prompt,
+            generation_config=genai_old.GenerationConfig(response_mime_type="application/json")
+        )
+
+    def _search_request(self, prompt: str, temperature: float) -> Callable[[], Any]:
+        """A Google Search grounded request on the new SDK (discovery)."""
+        # Without the search tool Gemini only has its (possibly outdated) training data
+        return lambda: self.discovery_client.models.generate_content(
+            model=GEMINI_MODEL,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                tools=[types.Tool(google_search=types.GoogleSearch())],
+                temperature=temperature
+            )
+        )
+
+    def _generate(self, request: Callable[[], Any], prompt: str, max_retries: int,
+                  operation: str, output_tokens: int, call_type: str) -> str:
+        """
+        Run one generate_content call, retrying rate-limit errors with backoff.
+
+        Args:
+            request: Sends the request (see _json_request / _search_request)
+            prompt: The full prompt text, for the rate limiter's estimate
+            max_retries: Total attempts before giving up
+            operation: Label for log messages (e.g. "pitch generation")
+            output_tokens: Expected answer size, for the rate limiter's estimate
+            call_type: Usage accounting bucket (see app.services.ai_usage)
+
+        Returns:
+            The raw response text
+        """
+        estimated_tokens = estimate_tokens(prompt, output_tokens)
         for attempt in range(max_retries):
+            # Wait for room in the shared RPM/TPM bucket (every worker + cron)
+            gemini_rate_limiter.acquire(estimated_tokens)
+            attempt_started = time.perf_counter()
             try:
-                response = self.discovery_client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=prompt,
-                    config=types.GenerateContentConfig(
-                        tools=[google_search_tool],
-                        temperature=0.2  # Low temperature = more factual, less creative
-                    )
-                )
-                
-                # Step 4: Extract the text from response
-                if hasattr(response, 'text') and response.text:
-                    raw_text = response.text
-                elif hasattr(response, 'candidates') and response.candidates:
-                    raw_text = response.candidates[0].content.parts[0].text
-                else:
-                    raise Exception(f"Unexpected response structure: {response}")
-                
-                break  # Success — exit the retry loop
-
+                response = request()
+                gemini_rate_limiter.settle(estimated_tokens, total_tokens(response))
+                raw_text = response_text(response)
+                record_ai_call(call_type, attempt, attempt_started, response)
+                return raw_text
             except Exception as e:
+                record_ai_call(call_type, attempt, attempt_started, failed=True)
                 error_str = str(e).lower()
                 # Only retry on rate limit errors (429 / RESOURCE_EXHAUSTED)
-                if "429" in error_str or "resource_exhausted" in error_str or "rate" in error_str:
-                    if attempt == max_retries - 1:
-                        raise Exception(
-                            "Gemini rate limit reached. "
-                            "You've made too many AI requests recently. "
-                            "Wait 1-2 minutes and try again."
-                        )
-
-                    match = re.search(r'retry\s*(?:in|after)\s*(\d+\.?\d*)', error_str)
-                    if match:
-                        wait_time = float(match.group(1)) + 1
-                    else:
-                        wait_time = 15 * (attempt + 1)  # Fallback: 15s, 30s, 45s
-
-                    # If Gemini wants us to wait more than 60s, fail fast
-                    if wait_time > 60:
-                        raise Exception(
-                            "Gemini rate limit reached. "
-                            "You've made too many AI requests recently. "
-                            "Wait 1-2 minutes and try again."
-                        )
-
-                    logger.warning(
-                        f"Rate limited on brand discovery (attempt {attempt + 1}/{max_retries}). "
-                        f"Waiting {wait_time:.1f}s before retry..."
-                    )
-                    time.sleep(wait_time)
-                else:
+                if not is_rate_limited(error_str):
                     raise  # Non-rate-limit error — don't retry
+                if attempt == max_retries - 1:
+                    raise Exception(RATE_LIMIT_MESSAGE)
 
-        # Step 5: Clean up markdown code blocks and parse JSON
-        try:
-            cleaned_text = raw_text.strip()
-            if cleaned_text.startswith("```json"):
-                cleaned_text = cleaned_text[7:]
-            if cleaned_text.startswith("```"):
-                cleaned_text = cleaned_text[3:]
-            if cleaned_text.endswith("```"):
-                cleaned_text = cleaned_text[:-3]
-            cleaned_text = cleaned_text.strip()
-            
-            # Step 6: Parse JSON
-            result = json.loads(cleaned_text)
-            return result
-            
-        except json.JSONDecodeError as e:
-            raise Exception(f"Failed to parse Gemini response as JSON. Response was: {cleaned_text[:200]}... Error: {str(e)}")
-        except Exception as e:
-            raise Exception(f"Failed to discover brand contacts: {str(e)}")
-    
\ No newline at end of file
+                # If Gemini wants us to wait more than 60s, fail fast
+                wait_time = retry_wait_seconds(error_str, attempt)
+                if wait_time > MAX_RETRY_WAIT_SECONDS:
+                    raise Exception(RATE_LIMIT_MESSAGE)
+
+                logger.warning(
+                    f"Rate limited on {operation} (attempt {attempt + 1}/{max_retries}). "
+                    f"Waiting {wait_time:.1f}s before retry..."
+                )
+                time.sleep(wait_time)
+
+    def generate_pitch(self, brand_data: dict, profile_data: dict) -> Dict[str, str]:
+        """
+        Generate a personalized pitch using Gemini.
+
+        Args:
+            brand_data: Dictionary with brand info (name, website, category, etc.)
+            profile_data: Dictionary with creator info (name, niches, bio, etc.)
+
+        Returns:
+            Dictionary with 'subject' and 'body' keys
+        """
+        prompt = build_pitch_prompt(brand_data, profile_data)
+        # Retry up to 4 times for rate limits — autopilot runs in the background
+        # so we can afford to wait longer than interactive requests.
+        raw_text = self._generate(
+            self._json_request(prompt),
+            prompt,
+            max_retries=4,
+            operation="pitch generation",
+            output_tokens=PITCH_OUTPUT_TOKENS,
+            call_type="pitch_generation",
+        )
+        return json.loads(raw_text)
+
+    def generate_pitches_batch(self, brands_data: List[dict], profile_data: dict) -> List[Optional[Dict[str, str]]]:
+        """
+        Generate pitches for SEVERAL brands in a single Gemini call.
+
+        The creator profile and writing instructions are sent once for the
+        whole list instead of once per brand, and N pitches cost one request
+        against the RPM quota. Keep the list short (PITCH_BATCH_SIZE in
+        app.services.pitch_cache) so the answer stays complete.
+
+        Args:
+            brands_data: Brand dicts (name, website, category, etc.)
+            profile_data: Dictionary with creator info (name, niches, bio, etc.)
+
+        Returns:
+            One entry per brand, in the same order: {subject, body}, or None
+            if that brand's pitch was missing or invalid in the answer.
+        """
+        if not brands_data:
+            return []
+
+        prompt = build_pitches_batch_prompt(brands_data, profile_data)
+        raw_text = self._generate(
+            self._json_request(prompt),
+            prompt,
+            max_retries=4,
+            operation="batch pitch generation",
+            output_tokens=PITCH_OUTPUT_TOKENS * len(brands_data),
+            call_type="pitch_generation_batch",
+        )
+        return parse_pitches_batch_response(raw_text, len(brands_data))
+
+    def discover_brands(self, niches: List[str], limit: int = 5) -> List[dict]:
+        """
+        Discover multiple brands in a SINGLE Gemini call (token-efficient).
+        
+        Instead of calling the API once per brand (expensive), this sends ONE
+        prompt asking for N brands matching the given niches, complete with
+        contact emails. This is the core autopilot discovery method.
+        
+        Token efficiency:
+        - Single prompt, single response (vs N calls for N brands)
+        - Lean prompt — only asks for name + email + category
+        - Low temperature for factual accuracy
+        - No unnecessary metadata (website, description, etc.)
+        
+        Args:
+            niches: List of niche keywords (e.g., ["skincare", "wellness"])
+            limit: Maximum brands to discover (default 5, max 10)
+
+        Returns:
+            List of dicts: [{name, email, category, confidence}, ...]
+        """
+        limit = min(limit, MAX_DISCOVERED_BRANDS)  # Keep the response manageable
+        prompt = build_brands_prompt(niches, limit)
+        raw_text = self._generate(
+            self._search_request(prompt, temperature=0.1),  # Very low temp for factual discovery
+            prompt,
+            max_retries=3,
+            operation="batch discovery",
+            output_tokens=DISCOVERY_OUTPUT_TOKENS,
+            call_type="brand_discovery",
+        )
+        return parse_brands_response(raw_text, niches)
+    
+    def discover_brand_contacts_batch(self, brand_names: List[str]) -> List[dict]:
+        """
+        Find contact emails for SEVERAL brands in a single search-grounded call.
+        
+        Same idea as discover_brands(): one prompt, one response, instead of
+        one slow rate-limited call per brand. Used by /discover/search/batch
+        for cache misses — keep the list short (10 or fewer) so the response
+        stays complete and parseable.
+        
+        Args:
+            brand_names: Brand names to research (e.g., ["CeraVe", "The Ordinary"])
+
+        Returns:
+            List of dicts: [{brand_name, contacts}, ...] — may be in any order
+            and may skip brands, so callers match entries back by name.
+        """
+        prompt = build_contacts_batch_prompt(brand_names)
+        raw_text = self._generate(
+            self._search_request(prompt, temperature=0.2),
+            prompt,
+            max_retries=3,
+            operation="batch brand search",
+            output_tokens=DISCOVERY_OUTPUT_TOKENS * 2,
+            call_type="contact_search_batch",
+        )
+        return parse_contacts_batch_response(raw_text)
+
+    def discover_brand_contacts(self, brand_name: str) -> dict:
+        """
+        Use Gemini with Google Search grounding to find real partnership/PR
+        contact emails for a brand. Only fetches emails — nothing else.
+
+        How it works:
+        1. We create a Google Search grounding tool so Gemini can search the web in real-time
+        2. We send a focused prompt asking ONLY for contact emails
+        3. Gemini searches the web, finds real emails, and returns structured JSON
+        4. We parse and return the JSON with just the discovered contacts
+
+        Args:
+            brand_name: The name of the brand to research (e.g., "CeraVe", "The Ordinary")
+
+        Returns:
+            dict with keys: brand_name, contacts (list of email dicts)
+        """
+        prompt = build_contacts_prompt(brand_name)
+        # Discovery gets 3 retries (heavier operation, user expects it to take a moment)
+        raw_text = self._generate(
+            self._search_request(prompt, temperature=0.2),  # Low temperature = more factual, less creative
+            prompt,
+            max_retries=3,
+            operation="brand discovery",
+            output_tokens=DISCOVERY_OUTPUT_TOKENS,
+            call_type="contact_search",
+        )
+        return parse_contacts_response(raw_text)
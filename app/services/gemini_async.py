@@ -0,0 +1,227 @@
+"""Native asyncio Gemini provider.
+
+Same prompts, models and response parsing as GeminiProvider
+(app.services.gemini), but every call goes through the google-genai async
+client (client.aio) and rate-limit backoff uses asyncio.sleep — so a
+waiting request parks a coroutine instead of blocking a threadpool
+thread, and one worker can keep hundreds of generations in flight.
+
+Used by the async routes (/pitches/generate, /discover/search,
+/discover/search/batch). Background jobs (autopilot, discovery refreshes)
+keep using the sync provider from get_ai_provider().
+"""
+import asyncio
+import json
+import time
+import logging
+from typing import Dict, List, Optional
+from google import genai
+from google.genai import types
+from starlette.concurrency import run_in_threadpool
+from app.services.ai_provider import AsyncAIProvider
+from app.services.rate_limiter import estimate_tokens, gemini_rate_limiter
+from app.services.ai_usage import record_ai_call
+from app.services.gemini import (
+    GEMINI_MODEL,
+    MAX_DISCOVERED_BRANDS,
+    MAX_RETRY_WAIT_SECONDS,
+    PITCH_PROMPT_VERSION,
+    RATE_LIMIT_MESSAGE,
+    PITCH_OUTPUT_TOKENS,
+    DISCOVERY_OUTPUT_TOKENS,
+    build_pitch_prompt,
+    build_pitches_batch_prompt,
+    build_brands_prompt,
+    build_contacts_batch_prompt,
+    build_contacts_prompt,
+    is_rate_limited,
+    parse_brands_response,
+    parse_contacts_batch_response,
+    parse_contacts_response,
+    parse_pitches_batch_response,
+    response_text,
+    retry_wait_seconds,
+    total_tokens,
+)
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class AsyncGeminiProvider(AsyncAIProvider):
+    model_name = GEMINI_MODEL
+    pitch_prompt_version = PITCH_PROMPT_VERSION
+    max_discovered_brands = MAX_DISCOVERED_BRANDS
+
+    def __init__(self):
+        """Initialize the google-genai client; all calls use its async (aio) side."""
+        self.client = genai.Client(api_key=settings.gemini_api_key)
+
+    async def aclose(self) -> None:
+        """Close the async client's HTTP connection pool."""
+        await self.client.aio.aclose()
+
+    async def _generate(self, prompt: str, config: types.GenerateContentConfig,
+                        max_retries: int, operation: str, output_tokens: int, call_type: str) -> str:
+        """
+        Run one generate_content call, retrying rate-limit errors with asyncio.sleep.
+
+        Args:
+            prompt: The full prompt text
+            config: Generation config (JSON output, search grounding, temperature)
+            max_retries: Total attempts before giving up
+            operation: Label for log messages (e.g. "pitch generation")
+            output_tokens: Expected answer size, for the rate limiter's estimate
+            call_type: Usage accounting bucket (see app.services.ai_usage)
+
+        Returns:
+            The raw response text
+        """
+        estimated_tokens = estimate_tokens(prompt, output_tokens)
+        for attempt in range(max_retries):
+            # Wait (without blocking the loop) for room in the shared RPM/TPM bucket
+            await gemini_rate_limiter.acquire_async(estimated_tokens)
+            attempt_started = time.perf_counter()
+            try:
+                response = await self.client.aio.models.generate_content(
+                    model=GEMINI_MODEL,
+                    contents=prompt,
+                    config=config
+                )
+                await run_in_threadpool(gemini_rate_limiter.settle, estimated_tokens, total_tokens(response))
+                raw_text = response_text(response)
+                record_ai_call(call_type, attempt, attempt_started, response)
+                return raw_text
+            except Exception as e:
+                record_ai_call(call_type, attempt, attempt_started, None, True)
+                error_str = str(e).lower()
+                # Only retry on rate limit errors (429 / RESOURCE_EXHAUSTED)
+                if not is_rate_limited(error_str):
+                    raise  # Non-rate-limit error — don't retry
+                if attempt == max_retries - 1:
+                    raise Exception(RATE_LIMIT_MESSAGE)
+
+                # If Gemini wants us to wait more than 60s, fail fast
+                wait_time = retry_wait_seconds(error_str, attempt)
+                if wait_time > MAX_RETRY_WAIT_SECONDS:
+                    raise Exception(RATE_LIMIT_MESSAGE)
+
+                logger.warning(
+                    f"Rate limited on {operation} (attempt {attempt + 1}/{max_retries}). "
+                    f"Waiting {wait_time:.1f}s before retry..."
+                )
+                await asyncio.sleep(wait_time)
+
+    async def generate_pitch(self, brand_data: dict, profile_data: dict) -> Dict[str, str]:
+        """
+        Generate a personalized pitch using Gemini.
+
+        Args:
+            brand_data: Dictionary with brand info (name, website, category, etc.)
+            profile_data: Dictionary with creator info (name, niches, bio, etc.)
+
+        Returns:
+            Dictionary with 'subject' and 'body' keys
+        """
+        raw_text = await self._generate(
+            build_pitch_prompt(brand_data, profile_data),
+            types.GenerateContentConfig(response_mime_type="application/json"),
+            max_retries=4,
+            operation="pitch generation",
+            call_type="pitch_generation",
+            output_tokens=PITCH_OUTPUT_TOKENS,
+        )
+        return json.loads(raw_text)
+
+    async def generate_pitches_batch(self, brands_data: List[dict], profile_data: dict) -> List[Optional[Dict[str, str]]]:
+        """
+        Generate pitches for SEVERAL brands in a single Gemini call.
+
+        Args:
+            brands_data: Brand dicts (name, website, category, etc.)
+            profile_data: Dictionary with creator info (name, niches, bio, etc.)
+
+        Returns:
+            One entry per brand, in order: {subject, body}, or None if missing/invalid
+        """
+        if not brands_data:
+            return []
+        raw_text = await self._generate(
+            build_pitches_batch_prompt(brands_data, profile_data),
+            types.GenerateContentConfig(response_mime_type="application/json"),
+            max_retries=4,
+            operation="batch pitch generation",
+            call_type="pitch_generation_batch",
+            output_tokens=PITCH_OUTPUT_TOKENS * len(brands_data),
+        )
+        return parse_pitches_batch_response(raw_text, len(brands_data))
+
+    async def discover_brands(self, niches: List[str], limit: int = 5) -> List[dict]:
+        """
+        Discover multiple brands in a SINGLE search-grounded Gemini call.
+
+        Args:
+            niches: List of niche keywords (e.g., ["skincare", "wellness"])
+            limit: Maximum brands to discover (default 5, max 10)
+
+        Returns:
+            List of dicts: [{name, email, category, confidence}, ...]
+        """
+        limit = min(limit, MAX_DISCOVERED_BRANDS)  # Keep the response manageable
+        raw_text = await self._generate(
+            build_brands_prompt(niches, limit),
+            types.GenerateContentConfig(
+                tools=[types.Tool(google_search=types.GoogleSearch())],
+                temperature=0.1
+            ),
+            max_retries=3,
+            operation="batch discovery",
+            call_type="brand_discovery",
+            output_tokens=DISCOVERY_OUTPUT_TOKENS,
+        )
+        return parse_brands_response(raw_text, niches)
+
+    async def discover_brand_contacts_batch(self, brand_names: List[str]) -> List[dict]:
+        """
+        Find contact emails for SEVERAL brands in a single search-grounded call.
+
+        Args:
+            brand_names: Brand names to research (callers keep this to ~10)
+
+        Returns:
+            List of dicts: [{brand_name, contacts: [...]}, ...]
+        """
+        raw_text = await self._generate(
+            build_contacts_batch_prompt(brand_names),
+            types.GenerateContentConfig(
+                tools=[types.Tool(google_search=types.GoogleSearch())],
+                temperature=0.2
+            ),
+            max_retries=3,
+            operation="batch brand search",
+            call_type="contact_search_batch",
+            output_tokens=DISCOVERY_OUTPUT_TOKENS * 2,
+        )
+        return parse_contacts_batch_response(raw_text)
+
+    async def discover_brand_contacts(self, brand_name: str) -> dict:
+        """
+        Find real partnership/PR contact emails for one brand via search grounding.
+
+        Args:
+            brand_name: The name of the brand to research (e.g., "CeraVe", "The Ordinary")
+
+        Returns:
+            dict with keys: brand_name, contacts (list of email dicts)
+        """
+        raw_text = await self._generate(
+            build_contacts_prompt(brand_name),
+            types.GenerateContentConfig(
+                tools=[types.Tool(google_search=types.GoogleSearch())],
+                temperature=0.2
+            ),
+            max_retries=3,
+            operation="brand discovery",
+            call_type="contact_search",
+            output_tokens=DISCOVERY_OUTPUT_TOKENS,
+        )
+        return parse_contacts_response(raw_text)
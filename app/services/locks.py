@@ -0,0 +1,321 @@
+"""Coordination helpers for work that must only run once at a time.
+
+Two layers, usually combined:
+
+1. SingleFlight — in-process. The first caller for a key runs the work;
+   concurrent callers for the same key wait and get the same result (or
+   the same exception) instead of repeating it. AsyncSingleFlight is the
+   same for coroutines on the event loop.
+2. advisory_lock — cross-process. A PostgreSQL session-level advisory
+   lock, so only one uvicorn worker / dyno does the work for a key at a
+   time. Taken on a dedicated connection from its own small pool, so it
+   never interferes with the caller's transaction or starves requests.
+
+LeaderElection builds on the same advisory locks for long-lived
+singletons (the background autopilot scheduler): one process holds the
+lock for as long as it lives, the others poll and take over when it dies.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional
+from sqlalchemy import text
+from app.database import lock_engine
+
+logger = logging.getLogger(__name__)
+
+# How often to retry pg_try_advisory_lock while waiting
+ADVISORY_LOCK_POLL_SECONDS = 0.25
+
+
+def advisory_lock_id(namespace: str, key: str) -> int:
+    """Map a (namespace, key) pair to a signed 64-bit advisory lock ID."""
+    digest = hashlib.blake2b(f"{namespace}:{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+@contextmanager
+def advisory_lock(namespace: str, key: str, timeout: float = 60.0) -> Iterator[bool]:
+    """Hold a PostgreSQL advisory lock for (namespace, key) while the block runs.
+
+    Waits up to `timeout` seconds. Yields True if the lock was acquired,
+    False if the wait timed out (or the lock couldn't be taken). A caller
+    that gets False must not just do the work anyway — it would pay the
+    wait and still duplicate the holder's work; read what the holder
+    produced, or fail.
+
+    The lock lives on a connection from the small dedicated lock pool
+    (app.database.lock_engine), never the request pool.
+
+    Usage:
+        with advisory_lock("discovery", brand_key) as locked:
+            ...
+    """
+    lock_id = advisory_lock_id(namespace, key)
+    deadline = time.monotonic() + timeout
+    acquired = False
+
+    connection = None
+    try:
+        try:
+            connection = lock_engine.connect()
+            while True:
+                acquired = connection.execute(
+                    text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id}
+                ).scalar()
+                # Don't sit in an open transaction while waiting/holding
+                connection.commit()
+                if acquired or time.monotonic() >= deadline:
+                    break
+                time.sleep(ADVISORY_LOCK_POLL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Advisory lock {namespace}:{key} unavailable: {str(e)}")
+
+        if not acquired:
+            logger.warning(f"Did not get advisory lock {namespace}:{key}")
+        yield acquired
+    finally:
+        if acquired:
+            try:
+                connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+                connection.commit()
+            except Exception as e:
+                # Closing the connection below releases it anyway
+                logger.warning(f"Could not release advisory lock {namespace}:{key}: {str(e)}")
+        if connection is not None:
+            connection.close()
+
+
+class LeaderElection:
+    """Elect one process (across uvicorn workers / dynos) to run a singleton job.
+
+    Leadership is a session-level advisory lock held on a dedicated
+    connection for as long as this process is leader. Postgres releases it
+    when the leader exits, crashes or loses its connection, and the next
+    follower to poll takes over — no lease to expire, no stale rows.
+
+    A background thread polls every `poll_seconds`: followers try to take
+    the lock (on a short-lived connection), the leader checks (pg_locks)
+    that its session still holds it and steps down (on_demoted) if not.
+
+    Usage:
+        election = LeaderElection("scheduler", "autopilot", on_elected=start, on_demoted=stop)
+        election.start()
+        ...
+        election.stop()
+    """
+
+    def __init__(self, namespace: str, key: str, on_elected: Callable[[], None],
+                 on_demoted: Callable[[], None], poll_seconds: float = 30.0):
+        self.name = f"{namespace}:{key}"
+        self.lock_id = advisory_lock_id(namespace, key)
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.poll_seconds = poll_seconds
+        self.is_leader = False
+        self._connection = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start campaigning in the background (no-op if already running)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"leader-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Stop campaigning; a leader calls on_demoted and releases the lock."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _held_query(self, own_session: bool):
+        # pg_locks shows a bigint advisory key as classid (high half) + objid (low half)
+        key = self.lock_id & 0xFFFFFFFFFFFFFFFF
+        sql = (
+            "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'advisory' "
+            "AND classid::bigint = :high AND objid::bigint = :low AND objsubid = 1 AND granted"
+        )
+        if own_session:
+            sql += " AND pid = pg_backend_pid()"
+        return text(sql + ")"), {"high": key >> 32, "low": key & 0xFFFFFFFF}
+
+    def leader_exists(self) -> bool:
+        """Whether any process (this one or another) currently holds leadership."""
+        try:
+            with lock_engine.connect() as connection:
+                return bool(connection.execute(*self._held_query(own_session=False)).scalar())
+        except Exception as e:
+            logger.warning(f"Leader election {self.name}: could not check for a leader: {str(e)}")
+            return self.is_leader
+
+    # All state below is only touched from the election thread
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self.is_leader:
+                if self._try_acquire():
+                    self._elect()
+            elif not self._still_held():
+                logger.warning(f"Leader election {self.name}: lost the lock, stepping down")
+                self._demote()
+            self._stop.wait(self.poll_seconds)
+        if self.is_leader:
+            self._demote()
+
+    def _try_acquire(self) -> bool:
+        connection = None
+        try:
+            connection = lock_engine.connect()
+            acquired = connection.execute(
+                text("SELECT pg_try_advisory_lock(:id)"), {"id": self.lock_id}
+            ).scalar()
+            # Don't sit in an open transaction while holding the lock
+            connection.commit()
+        except Exception as e:
+            logger.warning(f"Leader election {self.name}: lock unavailable: {str(e)}")
+            acquired = False
+        if acquired:
+            self._connection = connection
+        elif connection is not None:
+            connection.close()
+        return bool(acquired)
+
+    def _still_held(self) -> bool:
+        # Ask for the lock by backend pid, not just "SELECT 1": a connection
+        # that dropped and silently reconnected no longer holds it
+        try:
+            held = self._connection.execute(*self._held_query(own_session=True)).scalar()
+            self._connection.commit()
+            return bool(held)
+        except Exception:
+            return False
+
+    def _elect(self) -> None:
+        self.is_leader = True
+        logger.info(f"Leader election {self.name}: this process (pid {os.getpid()}) is the leader")
+        try:
+            self.on_elected()
+        except Exception as e:
+            logger.error(f"Leader election {self.name}: on_elected failed: {str(e)}")
+
+    def _demote(self) -> None:
+        self.is_leader = False
+        try:
+            self.on_demoted()
+        except Exception as e:
+            logger.error(f"Leader election {self.name}: on_demoted failed: {str(e)}")
+        try:
+            self._connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": self.lock_id})
+            self._connection.commit()
+        except Exception:
+            pass  # Closing the connection below releases it anyway
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn() unless a call for `key` is already in flight; share its outcome.
+
+        Raises:
+            Whatever fn() raised — every waiting caller gets the same exception
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines: concurrent awaits for the same key share one execution.
+
+    Only use it from one event loop (the server's).
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn() unless a call for `key` is already in flight; share its outcome.
+
+        Raises:
+            Whatever fn() raised — every waiting caller gets the same exception
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: a waiter that gets cancelled must not cancel the shared call
+            return await asyncio.shield(future)
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        self.executed += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it retrieved so asyncio doesn't warn when nobody was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,211 @@
+"""Small threaded stage pipeline (used by the autopilot run).
+
+Stages are connected by bounded queues: each stage has its own worker
+threads, an optional per-minute rate limit and an inbox of at most
+`queue_size` items, so a fast stage blocks (backpressure) instead of
+piling up work for a slow one, and every stage works at the same time
+as the others.
+
+Usage:
+    send = Stage("send", handle_send, workers=2, per_minute=60)
+    generate = Stage("generate", handle_generate, workers=2, batch_size=5, downstream=send)
+    run_pipeline([generate, send], items)
+
+A handler is called as handler(db, item, emit) — or with a list of up
+to batch_size items for batched stages — where `db` is the worker's own
+Session (Sessions aren't thread-safe) and emit(x) passes x to the next
+stage. A handler that raises only loses its item(s): the session is
+rolled back, on_error(db, item, error) is called, and the worker
+carries on.
+"""
+import contextvars
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's input (one per worker)
+_DONE = object()
+
+# How long a batched stage waits for more items before working on a partial batch
+BATCH_LINGER_SECONDS = 0.5
+
+
+class Pacer:
+    """Spaces calls evenly at `per_minute` across threads (0 = no limit)."""
+
+    def __init__(self, per_minute: int = 0):
+        self.interval = 60 / per_minute if per_minute > 0 else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> float:
+        """Block until the next slot. Returns seconds waited."""
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class Stage:
+    """One pipeline stage: an inbox queue plus its worker threads."""
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable,
+        workers: int = 1,
+        per_minute: int = 0,
+        queue_size: int = 20,
+        batch_size: int = 1,
+        downstream: Optional["Stage"] = None,
+        on_error: Optional[Callable[[Any, Any, Exception], None]] = None,
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = max(workers, 1)
+        self.per_minute = per_minute
+        self.batch_size = max(batch_size, 1)
+        self.downstream = downstream
+        self.on_error = on_error
+        self.inbox: queue.Queue = queue.Queue(maxsize=max(queue_size, 1))
+        self._pacer = Pacer(per_minute)
+        self._lock = threading.Lock()
+        self._running = self.workers
+        self._threads: List[threading.Thread] = []
+        self._started = 0.0
+        self._finished = 0.0
+        self._stats = {"received": 0, "emitted": 0, "errors": 0, "busy_seconds": 0.0, "max_queue_depth": 0}
+
+    # ---- feeding ----
+
+    def _note_depth(self) -> None:
+        depth = self.inbox.qsize()
+        with self._lock:
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], depth)
+
+    def put(self, item: Any) -> None:
+        """Queue an item for this stage (blocks while the inbox is full)."""
+        self.inbox.put(item)
+        self._note_depth()
+
+    def close(self) -> None:
+        """No more input: each worker finishes what's queued, then exits."""
+        for _ in range(self.workers):
+            self.inbox.put(_DONE)
+
+    def emit(self, item: Any) -> None:
+        with self._lock:
+            self._stats["emitted"] += 1
+        if self.downstream is not None:
+            self.downstream.put(item)
+
+    # ---- workers ----
+
+    def _next_items(self) -> Optional[list]:
+        """The next item (or batch). None once this worker's _DONE arrives with nothing pending."""
+        first = self.inbox.get()
+        if first is _DONE:
+            return None
+        items = [first]
+        deadline = time.monotonic() + BATCH_LINGER_SECONDS
+        while len(items) < self.batch_size:
+            try:
+                item = self.inbox.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _DONE:
+                self.inbox.put(_DONE)  # leave it for the next _next_items() call
+                break
+            items.append(item)
+        return items
+
+    def _work(self) -> None:
+        db = SessionLocal()
+        try:
+            while True:
+                items = self._next_items()
+                if items is None:
+                    break
+                with self._lock:
+                    self._stats["received"] += len(items)
+                self._pacer.wait()
+                started = time.perf_counter()
+                payload = items if self.batch_size > 1 else items[0]
+                try:
+                    self.handler(db, payload, self.emit)
+                except Exception as e:
+                    db.rollback()
+                    with self._lock:
+                        self._stats["errors"] += 1
+                    logger.error(f"Pipeline stage '{self.name}' failed: {str(e)}")
+                    if self.on_error is not None:
+                        self.on_error(db, payload, e)
+                finally:
+                    with self._lock:
+                        self._stats["busy_seconds"] += time.perf_counter() - started
+        finally:
+            db.close()
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+            if last:
+                self._finished = time.perf_counter()
+                if self.downstream is not None:
+                    self.downstream.close()
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        for number in range(self.workers):
+            # Copy the context so ContextVars (e.g. measure_ai_usage) reach the workers
+            context = contextvars.copy_context()
+            thread = threading.Thread(
+                target=context.run, args=(self._work,), name=f"{self.name}-{number}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        elapsed = (self._finished or time.perf_counter()) - self._started if self._started else 0.0
+        stats.update({
+            "workers": self.workers,
+            "per_minute": self.per_minute,
+            "busy_seconds": round(stats["busy_seconds"], 3),
+            "elapsed_seconds": round(elapsed, 3),
+            "per_second": round(stats["received"] / elapsed, 3) if elapsed > 0 else None,
+        })
+        return stats
+
+
+def run_pipeline(stages: List[Stage], items: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+    """Start every stage, feed `items` to the first one, and wait for all of them to drain.
+
+    Returns:
+        Per-stage stats, keyed by stage name
+    """
+    for stage in stages:
+        stage.start()
+    try:
+        for item in items:
+            stages[0].put(item)
+    finally:
+        stages[0].close()
+        for stage in stages:
+            stage.join()
+    return {stage.name: stage.stats() for stage in stages}
@@ -0,0 +1,432 @@
+"""Content-addressed cache for generated pitches.
+
+A pitch is a pure function of the brand dict, the creator profile dict,
+the model and the pitch prompt — so identical inputs don't need a second
+Gemini call. Regenerating a draft for the same brand, or re-running
+/discover/pitch after a failed send, is answered from the cache.
+
+The key is a SHA-256 of the normalized inputs (whitespace collapsed,
+empty fields dropped, keys sorted) plus the provider's model_name and
+pitch_prompt_version. Entries live in the `pitch_generation_cache` table,
+shared by every worker, with an in-process LRU in front of it:
+
+- entries older than PITCH_CACHE_TTL_SECONDS are never served
+- hits (memory and database alike) are counted in memory and written in
+  one UPDATE at most every PITCH_CACHE_TOUCH_FLUSH_SECONDS, before each
+  eviction, at the end of a batch and on shutdown
+- every PITCH_CACHE_EVICT_EVERY writes, expired rows and the least
+  recently used rows beyond PITCH_CACHE_MAX_ENTRIES are deleted
+- force_regenerate=True skips the lookup and overwrites the entry
+
+The cache is best-effort: if the table can't be read or written, the
+pitch is generated as usual. Set PITCH_CACHE_ENABLED=false to turn it off.
+
+generate_pitches_batch_cached() does the same for a list of brands, and
+generates the misses several per model call (autopilot runs and
+POST /pitches/generate/batch).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal
+from app import crud
+from app.config import settings
+from app.services.ai_provider import get_ai_provider, get_async_ai_provider
+from app.services.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Run DB eviction after this many cache writes (per worker)
+PITCH_CACHE_EVICT_EVERY = 50
+
+# Write buffered hit counts (last_used_at, hits) at most this often
+PITCH_CACHE_TOUCH_FLUSH_SECONDS = 30.0
+
+# Brands per batched generation call — enough to send the profile once for
+# several pitches, few enough that the JSON answer comes back complete
+PITCH_BATCH_SIZE = 5
+
+# cache_key → (created_at epoch, pitch dict, entry id or None)
+_memory = LRUCache(max_entries=settings.pitch_cache_memory_entries)
+
+_lock = threading.Lock()
+_writes_since_eviction = 0
+
+# entry id → hits not yet written to the database
+_touches: Dict[int, int] = {}
+_last_touch_flush = time.monotonic()
+
+_stats = {
+    "db_hits": 0,
+    "misses": 0,
+    "forced": 0,
+    "evicted": 0,
+    "errors": 0,
+}
+
+
+def _count(name: str, amount: int = 1) -> None:
+    with _lock:
+        _stats[name] += amount
+
+
+def _normalize(value: Any) -> Any:
+    """Canonical form of a brand/profile value, so cosmetic differences share a key."""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, dict):
+        normalized = {str(k): _normalize(v) for k, v in value.items()}
+        return {k: v for k, v in normalized.items() if v not in (None, "", [], {})}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def pitch_cache_key(brand_data: dict, profile_data: dict, model: str, prompt_version: str) -> str:
+    """SHA-256 hex digest of everything that determines a generated pitch."""
+    payload = json.dumps(
+        {
+            "brand": _normalize(brand_data),
+            "profile": _normalize(profile_data),
+            "model": model,
+            "prompt_version": prompt_version,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _touch(entry_id: Optional[int]) -> bool:
+    """Count a hit for an entry. Returns True when the buffered hits are due for a write."""
+    with _lock:
+        if entry_id is not None:
+            _touches[entry_id] = _touches.get(entry_id, 0) + 1
+        return bool(_touches) and time.monotonic() - _last_touch_flush >= PITCH_CACHE_TOUCH_FLUSH_SECONDS
+
+
+def _write_touches(db) -> None:
+    """Write the buffered hits in one UPDATE (put back on failure)."""
+    global _touches, _last_touch_flush
+
+    with _lock:
+        touches, _touches = _touches, {}
+        _last_touch_flush = time.monotonic()
+    if not touches:
+        return
+    try:
+        crud.touch_pitch_cache_entries(db, touches)
+    except Exception:
+        with _lock:
+            for entry_id, hits in touches.items():
+                _touches[entry_id] = _touches.get(entry_id, 0) + hits
+        raise
+
+
+def flush_pitch_cache_touches() -> None:
+    """Write buffered cache hits now (end of a batch, shutdown)."""
+    with _lock:
+        if not _touches:
+            return
+    db = SessionLocal()
+    try:
+        _write_touches(db)
+    except Exception as e:
+        db.rollback()
+        _count("errors")
+        logger.warning(f"Pitch cache hit write failed: {str(e)}")
+    finally:
+        db.close()
+
+
+def _lookup(cache_key: str) -> Optional[Dict[str, str]]:
+    """Memory first, then the database. Expired entries count as misses."""
+    ttl = settings.pitch_cache_ttl_seconds
+    cached = _memory.get(cache_key)
+    if cached is not None:
+        created_at, pitch, entry_id = cached
+        if time.time() - created_at < ttl:
+            if _touch(entry_id):
+                flush_pitch_cache_touches()
+            return dict(pitch)
+        _memory.delete(cache_key)
+
+    db = SessionLocal()
+    try:
+        entry = crud.get_pitch_cache_entry(db, cache_key, ttl)
+        if entry is None:
+            _count("misses")
+            return None
+        pitch = {"subject": entry.subject, "body": entry.body}
+        # TIMESTAMP columns come back naive, in UTC
+        created_at = entry.created_at.replace(tzinfo=None)
+        age = (datetime.utcnow() - created_at).total_seconds()
+        entry_id = entry.id
+    except Exception as e:
+        db.rollback()
+        _count("errors")
+        logger.warning(f"Pitch cache lookup failed, generating instead: {str(e)}")
+        return None
+    finally:
+        db.close()
+
+    _count("db_hits")
+    _memory.set(cache_key, (time.time() - age, pitch, entry_id))
+    # Hit counting is bookkeeping: written after the read, and a failed
+    # write (logged, retried next flush) never turns this hit into a miss
+    if _touch(entry_id):
+        flush_pitch_cache_touches()
+    return dict(pitch)
+
+
+def _store(cache_key: str, model: str, prompt_version: str, pitch: Dict[str, str]) -> None:
+    """Save a fresh generation (database + memory) and evict now and then."""
+    global _writes_since_eviction
+
+    if not pitch.get("subject") or not pitch.get("body"):
+        return
+    pitch = {"subject": pitch["subject"], "body": pitch["body"]}
+    entry_id = None
+
+    with _lock:
+        _writes_since_eviction += 1
+        evict = _writes_since_eviction >= PITCH_CACHE_EVICT_EVERY
+        if evict:
+            _writes_since_eviction = 0
+
+    db = SessionLocal()
+    try:
+        entry_id = crud.save_pitch_cache_entry(db, cache_key, model, prompt_version, pitch)
+        if evict:
+            # Eviction goes by last_used_at, so write the pending hits first
+            _write_touches(db)
+            deleted = crud.evict_pitch_cache(
+                db, settings.pitch_cache_ttl_seconds, settings.pitch_cache_max_entries
+            )
+            _count("evicted", deleted)
+            if deleted:
+                logger.info(f"Pitch cache: evicted {deleted} entries")
+    except Exception as e:
+        db.rollback()
+        _count("errors")
+        logger.warning(f"Pitch cache write failed: {str(e)}")
+    finally:
+        db.close()
+        _memory.set(cache_key, (time.time(), pitch, entry_id))
+
+
+def generate_pitch_cached(brand_data: dict, profile_data: dict, force_regenerate: bool = False) -> Dict[str, str]:
+    """Generate a pitch with the shared AI provider, reusing a cached one for identical inputs.
+
+    Args:
+        brand_data: Dictionary with brand info (name, website, category, etc.)
+        profile_data: Dictionary with creator info (name, niches, bio, etc.)
+        force_regenerate: Always call the model (and replace the cached pitch)
+
+    Returns:
+        Dictionary with 'subject' and 'body' keys
+    """
+    provider = get_ai_provider()
+    if not settings.pitch_cache_enabled:
+        return provider.generate_pitch(brand_data, profile_data)
+
+    cache_key = pitch_cache_key(brand_data, profile_data, provider.model_name, provider.pitch_prompt_version)
+    if force_regenerate:
+        _count("forced")
+    else:
+        cached = _lookup(cache_key)
+        if cached is not None:
+            return cached
+
+    pitch = provider.generate_pitch(brand_data, profile_data)
+    _store(cache_key, provider.model_name, provider.pitch_prompt_version, pitch)
+    return pitch
+
+
+async def generate_pitch_cached_async(
+    brand_data: dict, profile_data: dict, force_regenerate: bool = False
+) -> Dict[str, str]:
+    """generate_pitch_cached for `async def` routes (async provider, DB work on the threadpool)."""
+    provider = get_async_ai_provider()
+    if not settings.pitch_cache_enabled:
+        return await provider.generate_pitch(brand_data, profile_data)
+
+    cache_key = pitch_cache_key(brand_data, profile_data, provider.model_name, provider.pitch_prompt_version)
+    if force_regenerate:
+        _count("forced")
+    else:
+        cached = await run_in_threadpool(_lookup, cache_key)
+        if cached is not None:
+            return cached
+
+    pitch = await provider.generate_pitch(brand_data, profile_data)
+    await run_in_threadpool(_store, cache_key, provider.model_name, provider.pitch_prompt_version, pitch)
+    return pitch
+
+
+# ============ Batched generation ============
+#
+# Cache misses are sent PITCH_BATCH_SIZE brands per model call (the profile
+# and instructions go out once per call instead of once per brand). Brands
+# the batch answer left out or got wrong are regenerated one at a time;
+# a whole batch that fails for a rate limit is not retried singly, since
+# N single calls would only queue behind the same limit.
+
+def _batch_keys(brands_data: List[dict], profile_data: dict, provider) -> List[Optional[str]]:
+    if not settings.pitch_cache_enabled:
+        return [None] * len(brands_data)
+    return [
+        pitch_cache_key(brand_data, profile_data, provider.model_name, provider.pitch_prompt_version)
+        for brand_data in brands_data
+    ]
+
+
+def _batch_lookup(keys: List[Optional[str]], force_regenerate: bool) -> List[dict]:
+    """Start one result per brand: {pitch, status, error}, filled from the cache where possible."""
+    results = []
+    for key in keys:
+        cached = None
+        if key and force_regenerate:
+            _count("forced")
+        elif key:
+            cached = _lookup(key)
+        results.append({
+            "pitch": cached,
+            "status": "cached" if cached is not None else None,
+            "error": None,
+        })
+    return results
+
+
+def _batch_chunks(results: List[dict]) -> List[List[int]]:
+    """Indexes of the cache misses, PITCH_BATCH_SIZE at a time (single leftovers go straight to generate_pitch)."""
+    misses = [index for index, result in enumerate(results) if result["pitch"] is None]
+    chunks = [misses[i:i + PITCH_BATCH_SIZE] for i in range(0, len(misses), PITCH_BATCH_SIZE)]
+    return [chunk for chunk in chunks if len(chunk) > 1]
+
+
+def _apply_batch(results: List[dict], chunk: List[int], answer) -> None:
+    """Fill in one batch call's answer (a list of pitches/None, or the exception it raised)."""
+    if isinstance(answer, BaseException):
+        logger.warning(f"Batch pitch generation failed for {len(chunk)} brands: {str(answer)}")
+        if "rate limit" in str(answer).lower():
+            for index in chunk:
+                results[index]["error"] = str(answer)
+        return
+    for index, pitch in zip(chunk, answer):
+        if pitch is not None:
+            results[index].update(pitch=pitch, status="generated")
+
+
+def _needs_single(results: List[dict]) -> List[int]:
+    return [index for index, result in enumerate(results) if result["pitch"] is None and not result["error"]]
+
+
+def _apply_single(results: List[dict], index: int, answer) -> None:
+    if isinstance(answer, BaseException):
+        results[index]["status"] = "failed"
+        results[index]["error"] = str(answer)
+    else:
+        results[index].update(pitch=answer, status="generated")
+
+
+def _batch_store(keys: List[Optional[str]], provider, results: List[dict]) -> None:
+    for key, result in zip(keys, results):
+        if result["pitch"] is None:
+            result["status"] = "failed"
+        elif key and result["status"] == "generated":
+            _store(key, provider.model_name, provider.pitch_prompt_version, result["pitch"])
+
+
+def generate_pitches_batch_cached(
+    brands_data: List[dict], profile_data: dict, force_regenerate: bool = False
+) -> dict:
+    """Generate pitches for many brands with as few model calls as possible.
+
+    Args:
+        brands_data: Brand dicts (name, website, category, etc.)
+        profile_data: Dictionary with creator info (name, niches, bio, etc.)
+        force_regenerate: Always call the model (and replace the cached pitches)
+
+    Returns:
+        {"results": [{pitch, status, error}, ...] in brand order, "ai_calls": int}
+        where status is "cached", "generated" or "failed" (pitch None, error set)
+    """
+    provider = get_ai_provider()
+    keys = _batch_keys(brands_data, profile_data, provider)
+    results = _batch_lookup(keys, force_regenerate)
+    ai_calls = 0
+
+    for chunk in _batch_chunks(results):
+        ai_calls += 1
+        try:
+            answer = provider.generate_pitches_batch([brands_data[i] for i in chunk], profile_data)
+        except Exception as e:
+            answer = e
+        _apply_batch(results, chunk, answer)
+
+    for index in _needs_single(results):
+        ai_calls += 1
+        try:
+            answer = provider.generate_pitch(brands_data[index], profile_data)
+        except Exception as e:
+            answer = e
+        _apply_single(results, index, answer)
+
+    _batch_store(keys, provider, results)
+    flush_pitch_cache_touches()
+    return {"results": results, "ai_calls": ai_calls}
+
+
+async def generate_pitches_batch_cached_async(
+    brands_data: List[dict], profile_data: dict, force_regenerate: bool = False
+) -> dict:
+    """generate_pitches_batch_cached for `async def` routes — batch calls (and
+    then the single fallbacks) run concurrently; the shared rate limiter paces them."""
+    provider = get_async_ai_provider()
+    keys = _batch_keys(brands_data, profile_data, provider)
+    results = await run_in_threadpool(_batch_lookup, keys, force_regenerate)
+
+    chunks = _batch_chunks(results)
+    answers = await asyncio.gather(
+        *(provider.generate_pitches_batch([brands_data[i] for i in chunk], profile_data) for chunk in chunks),
+        return_exceptions=True,
+    )
+    for chunk, answer in zip(chunks, answers):
+        _apply_batch(results, chunk, answer)
+
+    singles = _needs_single(results)
+    answers = await asyncio.gather(
+        *(provider.generate_pitch(brands_data[index], profile_data) for index in singles),
+        return_exceptions=True,
+    )
+    for index, answer in zip(singles, answers):
+        _apply_single(results, index, answer)
+
+    await run_in_threadpool(_batch_store, keys, provider, results)
+    await run_in_threadpool(flush_pitch_cache_touches)
+    return {"results": results, "ai_calls": len(chunks) + len(singles)}
+
+
+def pitch_cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+    memory = _memory.stats()
+    stats["memory_hits"] = memory["hits"]
+    stats["memory_entries"] = memory["entries"]
+    hits = stats["memory_hits"] + stats["db_hits"]
+    lookups = hits + stats["misses"]
+    stats["hit_rate"] = round(hits / lookups, 3) if lookups else None
+    stats["enabled"] = settings.pitch_cache_enabled
+    stats["ttl_seconds"] = settings.pitch_cache_ttl_seconds
+    stats["max_entries"] = settings.pitch_cache_max_entries
+    return stats
@@ -2,45 +2,93 @@
 
 This is the core engine of autopilot mode. It:
 1. Loads config from the database
-2. Calls Gemini ONCE to discover multiple brands (token-efficient)
-3. De-duplicates against existing brands
-4. Filters blacklisted domains
-5. Generates pitches for new brands only
+2. Resumes unfinished work items (see below) before anything else
+3. Draws the rest from the pool of surplus candidates earlier discovery
+   calls found; only when the pool is below AUTOPILOT_POOL_LOW_WATER does
+   it call Gemini ONCE to discover a larger batch (token-efficient) and
+   refill it
+4. Pre-filters the whole batch in one pass: confidence, blacklisted
+   domains, brands already in the database, pool or queue (one IN query
+   each), excluded categories and repeats — every skip is logged with its
+   reason. Pooled candidates are checked again when drawn.
+5. Generates pitches for new brands only, several per Gemini call
 6. Optionally sends them (if auto_send=True)
 7. Logs everything for audit
 
+Accepted brands become rows in the autopilot_work_items table ("pooled",
+tagged with their niche, until a run draws them), and each
+finished step (brand created, pitch generated, pitch sent) is recorded on
+the row. Runs claim rows with SELECT ... FOR UPDATE SKIP LOCKED and a
+lease (AUTOPILOT_WORK_LEASE_SECONDS), so if a process dies mid-cycle the
+next run — scheduler, POST /autopilot/run or the cron task — continues
+where it stopped instead of paying for a new discovery call, and several
+workers can drain the queue in parallel without double-pitching.
+
+Creating the brands, generating and sending run as a pipeline
+(app.services.pipeline): create → generate → send stages connected by
+bounded queues, each with its own worker threads and rate limit
+(AUTOPILOT_*_WORKERS / AUTOPILOT_*_PER_MINUTE). Brand inserts overlap
+with in-flight Gemini calls, and sends overlap with generation.
+Per-stage throughput and queue depth are returned in the run result
+under "stages"; the sequential steps before the pipeline (discover,
+prefilter, pool draw) are timed separately under "steps".
+
 Can be triggered by:
 - POST /autopilot/run (manual testing)
 - python -m app.tasks.autopilot_daily (Heroku Scheduler / cron)
 """
 import logging
+import os
+import socket
+import threading
 import time
 from datetime import datetime, timezone, date
+from typing import List, Optional
 from sqlalchemy.orm import Session
 from app import crud
-from app.services.gemini import GeminiProvider
+from app.services.ai_provider import get_ai_provider
+from app.services.ai_usage import measure_ai_usage
+from app.services.pipeline import Stage, run_pipeline
+from app.services.pitch_cache import PITCH_BATCH_SIZE
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
-# Seconds to wait between consecutive Gemini calls in the autopilot loop.
-# This prevents rate-limit (429) errors when generating pitches for
-# multiple brands back-to-back. The free tier allows ~15 RPM, so
-# 10s between calls keeps us safely under the limit.
-AUTOPILOT_COOLDOWN_SECONDS = 10
+# Gemini calls are paced by the shared rate limiter
+# (app.services.rate_limiter, AI_REQUESTS_PER_MINUTE / AI_TOKENS_PER_MINUTE),
+# so the generate stage runs back-to-back at exactly the allowed rate.
+
+CONFIDENCE_LEVELS = {"high": 3, "medium": 2, "low": 1}
+
+# Why prefilter_brands() skipped a brand (the "reason" in the run log's `skipped`)
+SKIP_REASONS = (
+    "low_confidence", "blacklisted", "already_exists", "already_queued", "excluded_category", "duplicate",
+)
 
 
 def run_autopilot_cycle(db: Session, target_limit: int = None) -> dict:
     """Execute one complete autopilot cycle or micro-batch.
     
     Token usage:
-    - 1 Gemini call for batch brand discovery
-    - N Gemini calls for pitch generation (N = new brands only)
+    - 1 Gemini call for batch brand discovery, only when the candidate
+      pool is below AUTOPILOT_POOL_LOW_WATER (0 otherwise)
+    - ~N/5 Gemini calls for pitch generation (N = new brands only, batched;
+      brands a batch answer misses get one call each)
     - 0 Gemini calls for de-duplication, blacklist filtering, email sending
     
     Returns:
-        dict with run results (brands_discovered, pitches_generated, etc.)
+        dict with run results (brands_discovered, pitches_generated,
+        resumed, from_pool, etc.), plus "steps" (timings of the sequential
+        discover / prefilter / pool draw steps before the pipeline),
+        "stages" (per pipeline stage throughput and max queue depth) and
+        "duration_seconds"
     """
+    # Every AI call of the run is totalled from the model's usage metadata
+    with measure_ai_usage() as usage:
+        return _run_cycle(db, target_limit, usage)
+
+
+def _run_cycle(db: Session, target_limit: Optional[int], usage: dict) -> dict:
     # Step 1: Load and validate config
     config = crud.get_autopilot_config(db)
     if not config:
@@ -63,127 +111,57 @@ def run_autopilot_cycle(db: Session, target_limit: int = None) -> dict:
         "brands_skipped": 0,
         "pitches_generated": 0,
         "pitches_sent": 0,
+        "resumed": 0,
+        "from_pool": 0,
         "errors": [],
+        "skipped": [],
+        "steps": {},
+        "stages": {},
     }
+    run_started = time.perf_counter()
+    limit = target_limit or config.daily_limit
+    worker_id = _worker_id()
     
-    # Step 3: Batch discover brands
-    # If using micro-batches (target_limit), ask for a few extra to account for skipped brands
-    discovery_limit = min(target_limit * 3 if target_limit else config.daily_limit, 20)
-    logger.info(f"Autopilot: Discovering up to {discovery_limit} brands in niches: {config.niches}")
+    # Step 3: Resume unfinished work items first — left by a run that died,
+    # or a parallel worker's whose lease expired (0 tokens)
+    claimed = crud.claim_autopilot_work_items(db, limit, worker_id, settings.autopilot_work_lease_seconds)
+    results["resumed"] = len(claimed)
+    if claimed:
+        logger.info(f"Autopilot: Resuming {len(claimed)} unfinished work items")
     
-    try:
-        gemini = GeminiProvider()
-        discovered = gemini.discover_brands(
-            niches=config.niches,
-            limit=discovery_limit
-        )
-    except Exception as e:
-        error_msg = f"Brand discovery failed: {str(e)}"
-        logger.error(f"Autopilot: {error_msg}")
-        results["errors"].append({"step": "discovery", "error": error_msg})
-        _log_run(db, config, results)
-        return results
+    # Step 4: Fill the rest from the candidate pool, discovering (one larger
+    # batch) only when the pool is below its low-water mark
+    needed = limit - len(claimed)
+    if needed > 0:
+        crud.expire_autopilot_pool(db, settings.autopilot_pool_max_age_days)
+        pooled = crud.count_autopilot_pool(db, config.niches, settings.autopilot_pool_max_age_days)
+        if pooled < max(needed, settings.autopilot_pool_low_water):
+            try:
+                _refill_pool(db, config, needed, results)
+            except Exception as e:
+                # Whatever is still pooled can be drawn below
+                error_msg = f"Brand discovery failed: {str(e)}"
+                logger.error(f"Autopilot: {error_msg}")
+                results["errors"].append({"step": "discovery", "error": error_msg})
+        else:
+            logger.info(f"Autopilot: {pooled} candidates pooled — skipping discovery")
+        claimed += _draw_from_pool(db, config, needed, worker_id, results)
+    results["brands_skipped"] = len(results["skipped"])
     
-    # Cooldown after batch discovery before starting pitch generation.
-    # The discovery call uses search grounding which is heavier on quota.
-    logger.info(f"Autopilot: Waiting {AUTOPILOT_COOLDOWN_SECONDS}s after discovery before generating pitches...")
-    time.sleep(AUTOPILOT_COOLDOWN_SECONDS)
+    # Steps 5-6: create → generate → send pipeline over the claimed work items
+    run = _AutopilotRun(config, profile.id, results, claimed)
+    results["stages"] = run_pipeline(run.stages(), claimed)
+    results["duration_seconds"] = round(time.perf_counter() - run_started, 3)
     
-    results["brands_discovered"] = len(discovered)
-    logger.info(f"Autopilot: Discovered {len(discovered)} brands")
-    
-    # Step 4: Process each discovered brand
-    for brand_data in discovered:
-        brand_email = brand_data.get("email", "")
-        brand_name = brand_data.get("name", "Unknown")
-        
-        try:
-            # 4a: Check confidence threshold
-            confidence = brand_data.get("confidence", "low")
-            confidence_levels = {"high": 3, "medium": 2, "low": 1}
-            min_level = confidence_levels.get(config.min_confidence, 2)
-            brand_level = confidence_levels.get(confidence, 1)
-            
-            if brand_level < min_level:
-                logger.info(f"Autopilot: Skipping '{brand_name}' — confidence too low ({confidence})")
-                results["brands_skipped"] += 1
-                continue
-            
-            # 4b: Check blacklist (0 tokens — pure DB check)
-            if crud.is_brand_blacklisted(db, brand_email):
-                logger.info(f"Autopilot: Skipping '{brand_name}' — domain blacklisted")
-                results["brands_skipped"] += 1
-                continue
-            
-            # 4c: Check if brand email already exists (0 tokens — pure DB check)
-            existing = crud.get_brand_by_email(db, brand_email)
-            if existing:
-                logger.info(f"Autopilot: Skipping '{brand_name}' — already in database (id={existing.id})")
-                results["brands_skipped"] += 1
-                continue
-            
-            # 4d: Check excluded categories
-            category = brand_data.get("category", "")
-            if category and config.excluded_categories:
-                if category.lower() in [c.lower() for c in config.excluded_categories]:
-                    logger.info(f"Autopilot: Skipping '{brand_name}' — category '{category}' excluded")
-                    results["brands_skipped"] += 1
-                    continue
-            
-            # 4e: Create brand in database
-            brand = crud.create_brand(db, {
-                "name": brand_name,
-                "email": brand_email,
-                "category": category,
-                "discovered_by_ai": True,
-                "discovered_at": datetime.now(timezone.utc),
-            })
-            logger.info(f"Autopilot: Created brand '{brand_name}' (id={brand.id})")
-            
-            # 4f: Generate pitch (1 Gemini call per brand — only for NEW brands)
-            pitch = crud.generate_and_create_pitch(db, brand.id, profile.id)
-            
-            # Mark pitch as autopilot mode
-            pitch.mode = "autopilot"
-            if config.auto_send:
-                pitch.auto_approved = True
-            db.commit()
-            
-            results["pitches_generated"] += 1
-            logger.info(f"Autopilot: Generated pitch for '{brand_name}' (pitch_id={pitch.id})")
-            
-            # 4g: Send if auto_send is enabled
-            if config.auto_send:
-                try:
-                    crud.send_pitch_email(db, pitch.id)
-                    results["pitches_sent"] += 1
-                    logger.info(f"Autopilot: Sent pitch to '{brand_name}'")
-                except Exception as send_err:
-                    error_msg = f"Failed to send pitch to '{brand_name}': {str(send_err)}"
-                    logger.error(f"Autopilot: {error_msg}")
-                    results["errors"].append({"brand": brand_name, "error": error_msg})
-            
-            # 4h: Break if we reached the micro-batch target limit
-            if target_limit and results["pitches_generated"] >= target_limit:
-                logger.info(f"Autopilot: Reached micro-batch target limit ({target_limit}). Stopping loop.")
-                break
-                
-            # Cooldown between brands to avoid rate-limiting
-            logger.info(f"Autopilot: Cooldown {AUTOPILOT_COOLDOWN_SECONDS}s before next brand...")
-            time.sleep(AUTOPILOT_COOLDOWN_SECONDS)
-            
-        except Exception as e:
-            error_msg = f"Failed to process '{brand_name}': {str(e)}"
-            logger.error(f"Autopilot: {error_msg}")
-            results["errors"].append({"brand": brand_name, "error": error_msg})
-    
-    # Step 5: Log the run and update config
-    _log_run(db, config, results)
+    # Step 7: Log the run and update config
+    _log_run(db, config, results, usage)
     
     logger.info(
         f"Autopilot cycle complete: "
         f"{results['brands_discovered']} discovered, "
         f"{results['brands_skipped']} skipped, "
+        f"{results['resumed']} resumed, "
+        f"{results['from_pool']} from pool, "
         f"{results['pitches_generated']} pitches generated, "
         f"{results['pitches_sent']} sent"
     )
@@ -191,13 +169,321 @@ def run_autopilot_cycle(db: Session, target_limit: int = None) -> dict:
     return results
 
 
-def _log_run(db: Session, config, results: dict):
-    """Save the autopilot run results to the log table and update config."""
-    # Rough token estimate:
-    # ~500 tokens for batch discovery prompt + response
-    # ~800 tokens per pitch generation
-    token_estimate = 500 + (results["pitches_generated"] * 800)
+def _worker_id() -> str:
+    """Who holds a work item's lease (read per run — uvicorn forks workers after import)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _record_skip(results: dict, decision: dict) -> None:
+    brand_data = decision["brand"]
+    brand_name = brand_data.get("name", "Unknown")
+    logger.info(f"Autopilot: Skipping '{brand_name}' — {decision['detail']}")
+    results["skipped"].append({
+        "brand": brand_name,
+        "email": brand_data.get("email", ""),
+        "reason": decision["reason"],
+        "detail": decision["detail"],
+    })
+
+
+def _niche_tag(brand_data: dict, niches: List[str]) -> str:
+    """The configured niche a discovered brand belongs to (the one its category names, else the first)."""
+    category = (brand_data.get("category") or "").lower()
+    for niche in niches:
+        if niche.lower() in category:
+            return niche.lower()[:100]
+    return niches[0].lower()[:100]
+
+
+def _refill_pool(db: Session, config, needed: int, results: dict) -> None:
+    """Discover one batch of brands, pre-filter it and pool every accepted one."""
+    # One larger call now saves a discovery call on each of the next few
+    # micro-batches — but never more than one call can return
+    provider = get_ai_provider()
+    discovery_limit = min(max(settings.autopilot_pool_refill_size, needed), provider.max_discovered_brands)
+    logger.info(f"Autopilot: Candidate pool low — discovering up to {discovery_limit} brands in niches: {config.niches}")
+    
+    started = time.perf_counter()
+    discovered = provider.discover_brands(
+        niches=config.niches,
+        limit=discovery_limit
+    )
+    results["brands_discovered"] = len(discovered)
+    results["steps"]["discover"] = {
+        "emitted": len(discovered),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info(f"Autopilot: Discovered {len(discovered)} brands")
     
+    # Pre-filter the whole batch at once (0 tokens — 3 DB queries)
+    started = time.perf_counter()
+    accepted = []
+    for decision in prefilter_brands(db, config, discovered):
+        if decision["accepted"]:
+            accepted.append(dict(decision["brand"], niche=_niche_tag(decision["brand"], config.niches)))
+        else:
+            _record_skip(results, decision)
+    
+    crud.add_to_autopilot_pool(db, accepted)
+    results["steps"]["prefilter"] = {
+        "received": len(discovered),
+        "emitted": len(accepted),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _draw_from_pool(db: Session, config, needed: int, worker_id: str, results: dict) -> List[dict]:
+    """Claim up to `needed` pooled candidates as this run's work items.
+    
+    Each is checked against the pre-filter again — the blacklist, exclusions
+    or brands table may have changed since it was pooled — and dropped if
+    it no longer passes.
+    """
+    started = time.perf_counter()
+    received = 0
+    drawn = []
+    while len(drawn) < needed:
+        items = crud.draw_autopilot_pool(
+            db, config.niches, needed - len(drawn), bool(config.auto_send),
+            worker_id, settings.autopilot_pool_max_age_days,
+        )
+        if not items:
+            break
+        received += len(items)
+        candidates = [
+            {"name": item["brand_name"], "email": item["email"],
+             "category": item["category"], "confidence": item["confidence"]}
+            for item in items
+        ]
+        rejected = []
+        for item, decision in zip(items, prefilter_brands(db, config, candidates, check_queue=False)):
+            if decision["accepted"]:
+                drawn.append(item)
+            else:
+                _record_skip(results, decision)
+                rejected.append(item["id"])
+        crud.delete_autopilot_work_items(db, rejected)
+    
+    results["from_pool"] = len(drawn)
+    results["steps"]["pool_draw"] = {
+        "received": received,
+        "emitted": len(drawn),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+    if drawn:
+        logger.info(f"Autopilot: Drew {len(drawn)} candidates from the pool")
+    return drawn
+
+
+def prefilter_brands(db: Session, config, discovered: List[dict], check_queue: bool = True) -> List[dict]:
+    """Accept/skip decision for every discovered brand, in order.
+    
+    The blacklist and excluded categories are loaded into sets once, and
+    existing brands (and pooled/queued work items, unless check_queue is
+    False) are found with one IN query each for the whole batch — instead
+    of two queries and a config reload per brand.
+    
+    Returns:
+        [{brand, accepted, reason, detail}, ...] — reason is one of
+        SKIP_REASONS (None when accepted)
+    """
+    min_level = CONFIDENCE_LEVELS.get(config.min_confidence, 2)
+    excluded_categories = {c.lower() for c in (config.excluded_categories or [])}
+    blacklisted_domains = crud.get_blacklisted_domains(db)
+    emails = [b.get("email", "") for b in discovered]
+    existing = crud.get_existing_brand_emails(db, emails)
+    queued = crud.get_queued_emails(db, emails) if check_queue else set()
+    
+    decisions = []
+    accepted_emails = set()
+    for brand_data in discovered:
+        email = (brand_data.get("email") or "").lower()
+        domain = email.split("@")[-1] if "@" in email else ""
+        confidence = brand_data.get("confidence", "low")
+        category = brand_data.get("category", "")
+        
+        reason, detail = None, None
+        if CONFIDENCE_LEVELS.get(confidence, 1) < min_level:
+            reason, detail = "low_confidence", f"confidence too low ({confidence})"
+        elif domain in blacklisted_domains:
+            reason, detail = "blacklisted", "domain blacklisted"
+        elif email in existing:
+            reason, detail = "already_exists", f"already in database (id={existing[email]})"
+        elif email in queued:
+            reason, detail = "already_queued", "already in the autopilot pool or work queue"
+        elif category and category.lower() in excluded_categories:
+            reason, detail = "excluded_category", f"category '{category}' excluded"
+        elif email in accepted_emails:
+            reason, detail = "duplicate", "duplicate in this discovery batch"
+        else:
+            accepted_emails.add(email)
+        
+        decisions.append({"brand": brand_data, "accepted": reason is None, "reason": reason, "detail": detail})
+    return decisions
+
+
+class _AutopilotRun:
+    """Stage handlers for one autopilot run, sharing its results across worker threads.
+    
+    Items are work item dicts (crud.work_item_to_dict). Every stage skips
+    steps an item has already done, so resumed items pick up where they
+    stopped, and records each finished step on the item's row.
+    """
+
+    def __init__(self, config, profile_id: int, results: dict, items: List[dict]):
+        # Plain copies — the config ORM object belongs to the caller's session/thread
+        self.auto_send = bool(config.auto_send) or any(item["auto_send"] for item in items)
+        self.profile_id = profile_id
+        self.results = results
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.results[name] += 1
+
+    def _fail(self, db: Session, item: dict, error_msg: str) -> None:
+        """Record a failed step; the item is retried by a later run (up to AUTOPILOT_WORK_MAX_ATTEMPTS)."""
+        logger.error(f"Autopilot: {error_msg}")
+        with self._lock:
+            self.results["errors"].append({"brand": item["brand_name"], "error": error_msg})
+        try:
+            crud.fail_autopilot_work_item(db, item["id"], error_msg, settings.autopilot_work_max_attempts)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Autopilot: Could not record failure of work item {item['id']}: {str(e)}")
+
+    # ---- Step 5: create accepted brands ----
+
+    def create_brand(self, db: Session, item: dict, emit) -> None:
+        if item["brand_id"] is None:
+            # A run that died after saving the brand left it without a brand_id
+            brand = crud.get_brand_by_email(db, item["email"])
+            if brand is None:
+                brand = crud.create_brand(db, {
+                    "name": item["brand_name"],
+                    "email": item["email"],
+                    "category": item["category"],
+                    "discovered_by_ai": True,
+                    "discovered_at": datetime.now(timezone.utc),
+                })
+                logger.info(f"Autopilot: Created brand '{item['brand_name']}' (id={brand.id})")
+            crud.advance_autopilot_work_item(db, item["id"], "created", brand_id=brand.id)
+            item = dict(item, status="created", brand_id=brand.id)
+        emit(item)
+
+    def create_failed(self, db: Session, item: dict, error: Exception) -> None:
+        self._fail(db, item, f"Failed to process '{item['brand_name']}': {str(error)}")
+
+    # ---- Step 6: generate pitches, several brands per Gemini call ----
+
+    def _generated(self, db: Session, item: dict, pitch_id: int, emit) -> None:
+        self._count("pitches_generated")
+        logger.info(f"Autopilot: Generated pitch for '{item['brand_name']}' (pitch_id={pitch_id})")
+        # Without auto_send the item is done once its draft exists
+        crud.advance_autopilot_work_item(
+            db, item["id"], "generated", release=not item["auto_send"], pitch_id=pitch_id
+        )
+        # Updated in place so generate_failed() leaves this item alone
+        item.update(status="generated", pitch_id=pitch_id)
+        if item["auto_send"]:
+            emit(dict(item))
+
+    def generate_pitches(self, db: Session, items: list, emit) -> None:
+        todo = []
+        for item in items:
+            if item["pitch_id"] is not None:
+                emit(item)  # Resumed item waiting to be sent
+            else:
+                todo.append(item)
+        
+        # A run that died after saving the pitch left it without a pitch_id
+        saved = crud.get_autopilot_pitch_ids(db, [item["brand_id"] for item in todo])
+        for item in [item for item in todo if item["brand_id"] in saved]:
+            self._generated(db, item, saved[item["brand_id"]], emit)
+        todo = [item for item in todo if item["brand_id"] not in saved]
+        
+        for auto_send in (False, True):
+            group = [item for item in todo if item["auto_send"] == auto_send]
+            if not group:
+                continue
+            generated = crud.generate_and_create_pitches(
+                db,
+                [item["brand_id"] for item in group],
+                self.profile_id,
+                mode="autopilot",
+                auto_approved=auto_send,
+            )
+            logger.info(
+                f"Autopilot: Generated pitches for {len(group)} brands "
+                f"in {generated['ai_calls']} AI calls"
+            )
+            for item, outcome in zip(group, generated["results"]):
+                if outcome["pitch"] is None:
+                    self._fail(db, item, f"Failed to process '{item['brand_name']}': {outcome['error']}")
+                    item["status"] = "failed"  # This run's view — already recorded, don't fail it twice
+                else:
+                    self._generated(db, item, outcome["pitch"].id, emit)
+
+    def generate_failed(self, db: Session, items: list, error: Exception) -> None:
+        # Items the batch already generated (or failed one by one) before it raised keep their outcome
+        for item in items:
+            if item["status"] in ("pending", "created"):
+                self._fail(db, item, f"Failed to process '{item['brand_name']}': {str(error)}")
+
+    # ---- Step 6a: send (if auto_send is enabled) ----
+
+    def send_pitch(self, db: Session, item: dict, emit) -> None:
+        pitch = crud.get_pitch(db, item["pitch_id"])
+        if pitch is None:
+            raise Exception(f"Pitch {item['pitch_id']} no longer exists")
+        if pitch.status == "draft":
+            # The key makes a retry of a send that already went out a no-op at Resend
+            crud.send_pitch_email(db, pitch.id, idempotency_key=f"autopilot-pitch-{pitch.id}")
+            self._count("pitches_sent")
+            logger.info(f"Autopilot: Sent pitch to '{item['brand_name']}'")
+        crud.advance_autopilot_work_item(db, item["id"], "sent", release=True)
+        emit(item)
+
+    def send_failed(self, db: Session, item: dict, error: Exception) -> None:
+        self._fail(db, item, f"Failed to send pitch to '{item['brand_name']}': {str(error)}")
+
+    def stages(self) -> List[Stage]:
+        queue_size = settings.autopilot_queue_size
+        send = None
+        if self.auto_send:
+            send = Stage(
+                "send", self.send_pitch,
+                workers=settings.autopilot_send_workers,
+                per_minute=settings.autopilot_send_per_minute,
+                queue_size=queue_size,
+                on_error=self.send_failed,
+            )
+        generate = Stage(
+            "generate", self.generate_pitches,
+            workers=settings.autopilot_generate_workers,
+            per_minute=settings.autopilot_generate_per_minute,
+            queue_size=queue_size,
+            batch_size=PITCH_BATCH_SIZE,
+            downstream=send,
+            on_error=self.generate_failed,
+        )
+        create = Stage(
+            "create", self.create_brand,
+            workers=settings.autopilot_create_workers,
+            per_minute=settings.autopilot_create_per_minute,
+            queue_size=queue_size,
+            downstream=generate,
+            on_error=self.create_failed,
+        )
+        return [stage for stage in (create, generate, send) if stage is not None]
+
+
+def _log_run(db: Session, config, results: dict, usage: dict):
+    """Save the autopilot run results to the log table and update config.
+    
+    `usage` holds the real token counts of the run's AI calls (from
+    measure_ai_usage), including discovery retries.
+    """
     crud.upsert_autopilot_log(db, {
         "run_date": date.today(),
         "brands_discovered": results["brands_discovered"],
@@ -205,7 +491,13 @@ def _log_run(db: Session, config, results: dict):
         "pitches_generated": results["pitches_generated"],
         "pitches_sent": results["pitches_sent"],
         "errors": results["errors"],
-        "tokens_used_estimate": token_estimate,
+        "skipped": results["skipped"],
+        "tokens_used_estimate": usage["total_tokens"],  # kept for API compatibility
+        "ai_calls": usage["calls"],
+        "ai_retries": usage["retries"],
+        "prompt_tokens": usage["prompt_tokens"],
+        "candidate_tokens": usage["candidate_tokens"],
+        "tokens_used": usage["total_tokens"],
     })
     
     # Update config with last run time and total sent count
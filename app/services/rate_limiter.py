@@ -0,0 +1,204 @@
+"""Shared token-bucket rate limiter for AI provider calls.
+
+Gemini enforces requests-per-minute (RPM) and tokens-per-minute (TPM)
+quotas per API key — across every uvicorn worker and the cron task that
+use it. Each process backing off on its own 429s (or sleeping a fixed
+cooldown) either wastes quota or trips over the others, so every provider
+call first takes from ONE bucket stored in the `ai_rate_buckets` table:
+
+- requests refill at AI_REQUESTS_PER_MINUTE / 60 per second, up to
+  AI_REQUEST_BURST (1 by default, so calls are spaced evenly and no
+  60-second window ever sees more than the configured RPM)
+- tokens refill at AI_TOKENS_PER_MINUTE / 60 per second, up to one
+  minute's worth. A call takes an estimate up front; settle() corrects
+  the bucket with the real usage once the response is in.
+
+Taking from the bucket is a single UPDATE on a row lock, with the
+refill computed from the database clock, so it is safe across
+processes and hosts. A caller that finds the bucket short still takes
+from it — the bucket goes negative — and gets back how long until its
+share has refilled. That reserves it the next free slot: N queued
+callers get waits of 1, 2, ... N intervals and each sleeps exactly once,
+instead of all waking together to re-poll the row. A reservation that
+would wait longer than AI_RATE_LIMIT_MAX_WAIT_SECONDS isn't taken, and
+the call fails right away. If the database can't be reached, calls go
+ahead (the providers still retry 429s) rather than failing.
+
+A setting of 0 turns that limit off.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for estimating a prompt's size
+CHARS_PER_TOKEN = 4
+
+# Waits shorter than this aren't worth a log line
+LOG_WAIT_SECONDS = 1.0
+
+# Seconds until the bucket is back above zero after taking this call's
+# cost. A limit that is turned off (rate 0) never holds a call back.
+_WAIT = (
+    "GREATEST(0, -(current.requests - :request_cost) / NULLIF(:request_rate, 0), "
+    "-(current.tokens - :token_cost) / NULLIF(:token_rate, 0))"
+)
+
+_RESERVE_SQL = text("""
+    WITH current AS (
+        SELECT name,
+               clock_timestamp()::timestamp AS now,
+               LEAST(:request_capacity, requests
+                     + EXTRACT(EPOCH FROM clock_timestamp()::timestamp - updated_at) * :request_rate) AS requests,
+               LEAST(:token_capacity, tokens
+                     + EXTRACT(EPOCH FROM clock_timestamp()::timestamp - updated_at) * :token_rate) AS tokens
+        FROM ai_rate_buckets
+        WHERE name = :name
+        FOR UPDATE
+    ), reservation AS (
+        SELECT current.*, {wait} AS wait FROM current
+    )
+    UPDATE ai_rate_buckets AS bucket
+    SET requests = reservation.requests - CASE WHEN reservation.wait <= :max_wait THEN :request_cost ELSE 0 END,
+        tokens = reservation.tokens - CASE WHEN reservation.wait <= :max_wait THEN :token_cost ELSE 0 END,
+        updated_at = reservation.now
+    FROM reservation
+    WHERE bucket.name = reservation.name
+    RETURNING reservation.wait
+""".format(wait=_WAIT))
+
+_CREATE_SQL = text("""
+    INSERT INTO ai_rate_buckets (name, requests, tokens, updated_at)
+    VALUES (:name, :request_capacity, :token_capacity, clock_timestamp()::timestamp)
+    ON CONFLICT (name) DO NOTHING
+""")
+
+_SETTLE_SQL = text("UPDATE ai_rate_buckets SET tokens = tokens - :delta WHERE name = :name")
+
+
+def estimate_tokens(prompt: str, output_tokens: int) -> int:
+    """Rough token cost of a call: the prompt's size plus the expected answer."""
+    return len(prompt) // CHARS_PER_TOKEN + output_tokens
+
+
+class RateLimiter:
+    """A token bucket shared by every process through one database row."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._created = False
+
+    def _limits(self) -> dict:
+        """Bucket parameters from settings (read per call, so changes apply at once)."""
+        rpm = max(settings.ai_requests_per_minute, 0)
+        tpm = max(settings.ai_tokens_per_minute, 0)
+        return {
+            "name": self.name,
+            "request_rate": rpm / 60,
+            "request_capacity": max(settings.ai_request_burst, 1) if rpm else 0,
+            "token_rate": tpm / 60,
+            "token_capacity": tpm,
+        }
+
+    @staticmethod
+    def enabled() -> bool:
+        return settings.ai_requests_per_minute > 0 or settings.ai_tokens_per_minute > 0
+
+    def _reserve(self, tokens: int) -> float:
+        """Reserve one request + `tokens` from the bucket, going negative if need be.
+
+        Returns:
+            Seconds until the reserved slot (0 = go now). A wait over
+            AI_RATE_LIMIT_MAX_WAIT_SECONDS means nothing was reserved.
+        """
+        limits = self._limits()
+        request_cost = 1 if limits["request_rate"] else 0
+        # A call bigger than a whole minute's budget waits for a full bucket
+        token_cost = min(tokens, limits["token_capacity"]) if limits["token_rate"] else 0
+        params = dict(
+            limits,
+            request_cost=request_cost,
+            token_cost=token_cost,
+            max_wait=settings.ai_rate_limit_max_wait_seconds,
+        )
+
+        with engine.connect() as connection:
+            if not self._created:
+                connection.execute(_CREATE_SQL, params)
+                self._created = True
+            row = connection.execute(_RESERVE_SQL, params).first()
+            if row is None:
+                # Row deleted since we created it — recreate and take again
+                connection.execute(_CREATE_SQL, params)
+                row = connection.execute(_RESERVE_SQL, params).first()
+            connection.commit()
+        return float(row[0]) if row else 0.0
+
+    def _next_wait(self, tokens: int) -> float:
+        """_reserve, failing open: 0 (go now) if the bucket is unusable.
+
+        Raises:
+            Exception: If the wait would exceed AI_RATE_LIMIT_MAX_WAIT_SECONDS
+        """
+        try:
+            wait = self._reserve(tokens)
+        except Exception as e:
+            logger.warning(f"Rate limiter '{self.name}' unavailable, calling without it: {str(e)}")
+            return 0.0
+        if wait > settings.ai_rate_limit_max_wait_seconds:
+            raise Exception(
+                "AI rate limit reached. "
+                "Too many AI requests are queued right now. "
+                "Wait 1-2 minutes and try again."
+            )
+        if wait >= LOG_WAIT_SECONDS:
+            logger.info(f"Rate limiter '{self.name}': waiting {wait:.1f}s for quota")
+        return wait
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until this call's reserved slot in the bucket comes up.
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            Exception: If the wait would exceed AI_RATE_LIMIT_MAX_WAIT_SECONDS
+        """
+        if not self.enabled():
+            return 0.0
+        wait = self._next_wait(tokens)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: int = 0) -> float:
+        """acquire() for coroutines — reserves on the threadpool, waits with asyncio.sleep."""
+        if not self.enabled():
+            return 0.0
+        wait = await run_in_threadpool(self._next_wait, tokens)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Correct the token bucket once a call's real usage is known."""
+        if not settings.ai_tokens_per_minute or actual_tokens is None:
+            return
+        delta = actual_tokens - min(estimated_tokens, settings.ai_tokens_per_minute)
+        if not delta:
+            return
+        try:
+            with engine.begin() as connection:
+                connection.execute(_SETTLE_SQL, {"name": self.name, "delta": delta})
+        except Exception as e:
+            logger.warning(f"Rate limiter '{self.name}' could not record usage: {str(e)}")
+
+
+# One bucket per provider API key
+gemini_rate_limiter = RateLimiter("gemini")
@@ -1,15 +1,27 @@
+"""Background autopilot scheduler.
+
+Every uvicorn worker calls start_scheduler(), but only one process in the
+whole deployment runs the APScheduler: leadership is a PostgreSQL
+advisory lock (app.services.locks.LeaderElection). The other workers only
+poll for the lock every SCHEDULER_LEADER_POLL_SECONDS — they never build
+a scheduler — and the first to poll after the leader dies takes over.
+"""
 import logging
+from typing import Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from app.database import SessionLocal
+from app.services.locks import LeaderElection
 from app.services.pitch_scheduler import run_autopilot_cycle
 from app.crud import get_autopilot_config
+from app.config import settings
 import datetime
 
 logger = logging.getLogger(__name__)
 
-# Global instance
-scheduler = BackgroundScheduler()
+# Only set while this process is the scheduler leader
+scheduler: Optional[BackgroundScheduler] = None
 
 def scheduled_autopilot_job():
     """Job function that runs the autopilot cycle."""
@@ -39,13 +51,13 @@ def scheduled_autopilot_job():
     finally:
         db.close()
 
-from apscheduler.triggers.interval import IntervalTrigger
-
-def start_scheduler():
-    """Initializes and starts the APScheduler."""
-    if scheduler.running:
+def _start_jobs():
+    """Build and start the APScheduler (called once this process is elected leader)."""
+    global scheduler
+    if scheduler is not None and scheduler.running:
         return
 
+    scheduler = BackgroundScheduler()
     # Check every 5 minutes if it's time to trigger a micro-batch
     scheduler.add_job(
         continuous_check_job,
@@ -56,11 +68,34 @@ def start_scheduler():
     scheduler.start()
     logger.info("Autopilot continuous background scheduler started.")
 
-def stop_scheduler():
-    """Stops the APScheduler."""
-    if scheduler.running:
-        scheduler.shutdown()
+def _stop_jobs():
+    """Stop the APScheduler (leadership lost or shutting down).
+
+    Doesn't wait for a job that is already running: this runs on the
+    election thread, which has to release the lock (and keep polling)
+    rather than block for a whole autopilot run.
+    """
+    global scheduler
+    if scheduler is not None and scheduler.running:
+        scheduler.shutdown(wait=False)
         logger.info("Autopilot background scheduler stopped.")
+    scheduler = None
+
+# Global instance
+scheduler_leader = LeaderElection(
+    "scheduler", "autopilot",
+    on_elected=_start_jobs,
+    on_demoted=_stop_jobs,
+    poll_seconds=settings.scheduler_leader_poll_seconds,
+)
+
+def start_scheduler():
+    """Campaign for scheduler leadership; only the elected process starts the APScheduler."""
+    scheduler_leader.start()
+
+def stop_scheduler():
+    """Stop campaigning, and stop the APScheduler if this process is the leader."""
+    scheduler_leader.stop()
 
 def continuous_check_job():
     """Runs continuously to perfectly space out autopilot operations without bursting."""
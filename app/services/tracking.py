@@ -0,0 +1,270 @@
+"""Write-behind buffer for tracking pixel opens.
+
+Email clients prefetch images in bursts, so a large send can produce
+hundreds of pixel hits within seconds. Instead of doing a DB lookup +
+UPDATE + commit on the request path for each one, the pixel endpoint
+drops the hit into this in-memory buffer and returns the PNG immediately.
+
+A background thread flushes the buffer as ONE batched
+`UPDATE ... WHERE opened_at IS NULL` every few seconds, or sooner when
+the buffer fills up. The buffer is flushed one last time on shutdown
+(see the lifespan hook in app.main).
+
+Most pixel hits after the first one (reopens, forwards, image proxies)
+are for pitches that are already opened. An LRU of tracking IDs known to
+be opened (`opened_pixels`) answers those without buffering anything —
+it is warmed on startup from recently opened pitches and updated after
+every flush and every webhook open.
+
+Tracking IDs are signed ('<pitch_id>.<hmac>', see app.services.email),
+so forged or garbage IDs from scanners are rejected in microseconds and
+valid ones are flushed by primary key. Legacy UUID pixels from before
+signed IDs still work — they are flushed by tracking_pixel_id instead.
+
+Opens are best-effort analytics: if the buffer is completely full the
+hit is dropped and counted, rather than blocking the request. Resend's
+`email.opened` webhook still records the open independently.
+"""
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from app.database import SessionLocal
+from app import crud
+from app.services.cache import LRUCache
+from app.services.email import (
+    is_signed_tracking_pixel_id, verify_tracking_pixel_id, is_legacy_tracking_pixel_id
+)
+
+logger = logging.getLogger(__name__)
+
+# Flush at least this often while opens are pending
+OPEN_BUFFER_FLUSH_SECONDS = 2.0
+
+# Flush early once this many distinct pixels are pending
+OPEN_BUFFER_FLUSH_THRESHOLD = 500
+
+# Hard cap on pending pixels — new pixels beyond this are dropped
+OPEN_BUFFER_MAX_PENDING = 10_000
+
+# Tracking pixel IDs are stored in a VARCHAR(255) column
+MAX_TRACKING_ID_LENGTH = 255
+
+# How many "already opened" tracking IDs to remember (~100 bytes each)
+OPENED_CACHE_SIZE = 50_000
+
+# Tracking IDs known to belong to opened pitches — repeat hits stop here
+opened_pixels = LRUCache(max_entries=OPENED_CACHE_SIZE)
+
+
+class OpenBuffer:
+    """Bounded, de-duplicating buffer of pixel opens with a background flusher."""
+
+    def __init__(
+        self,
+        flush_seconds: float = OPEN_BUFFER_FLUSH_SECONDS,
+        flush_threshold: int = OPEN_BUFFER_FLUSH_THRESHOLD,
+        max_pending: int = OPEN_BUFFER_MAX_PENDING
+    ):
+        self.flush_seconds = flush_seconds
+        self.flush_threshold = flush_threshold
+        self.max_pending = max_pending
+
+        # tracking_pixel_id -> (time of the FIRST hit, verified pitch ID or
+        # None for legacy UUID pixels). Repeat hits collapse.
+        self._pending: Dict[str, Tuple[datetime, Optional[int]]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.flush_errors = 0
+
+    def add(self, tracking_pixel_id: str, pitch_id: Optional[int] = None) -> bool:
+        """Queue a pixel hit. Never touches the database.
+
+        Args:
+            tracking_pixel_id: The ID from the pixel URL
+            pitch_id: The pitch ID from a verified signed tracking ID, or
+                None for legacy UUID pixels
+
+        Returns:
+            True if the hit was queued (or already pending), False if dropped
+        """
+        if not tracking_pixel_id or len(tracking_pixel_id) > MAX_TRACKING_ID_LENGTH:
+            return False
+
+        with self._lock:
+            if tracking_pixel_id in self._pending:
+                return True
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    logger.warning(f"Open buffer full ({self.max_pending} pending) — dropping pixel opens")
+                return False
+            self._pending[tracking_pixel_id] = (datetime.now(timezone.utc), pitch_id)
+            self.recorded += 1
+            pending = len(self._pending)
+
+        if pending >= self.flush_threshold:
+            self._wake.set()
+        return True
+
+    def flush(self) -> int:
+        """Write all pending opens to the database in one batch.
+
+        Returns:
+            Number of pitches newly marked as opened
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+
+            opens, opens_by_pitch_id = {}, {}
+            for pixel_id, (opened_at, pitch_id) in batch.items():
+                if pitch_id is None:
+                    opens[pixel_id] = opened_at
+                else:
+                    opens_by_pitch_id[pitch_id] = opened_at
+
+            db = SessionLocal()
+            try:
+                newly_opened = crud.record_pitch_opens_bulk(db, opens, opens_by_pitch_id)
+            except Exception as e:
+                db.rollback()
+                db.close()
+                self.flush_errors += 1
+                logger.error(f"Open buffer flush failed ({len(batch)} pixels): {str(e)}")
+                self._requeue(batch)
+                return 0
+
+            self.flushed += len(newly_opened)
+            logger.debug(f"Open buffer: flushed {len(batch)} pixels, {len(newly_opened)} newly opened")
+
+            # Remember every pixel that is now known to be opened — including
+            # ones that were already opened before this batch — so repeat
+            # hits never reach the buffer again
+            try:
+                opened_pixels.update(newly_opened)
+                newly_opened_set = set(newly_opened)
+                remaining = [pixel_id for pixel_id in batch if pixel_id not in newly_opened_set]
+                opened_pixels.update(crud.get_opened_tracking_ids(db, remaining))
+            except Exception as e:
+                logger.warning(f"Open buffer: could not refresh opened-pixel cache: {str(e)}")
+            finally:
+                db.close()
+
+            return len(newly_opened)
+
+    def _requeue(self, batch: Dict[str, Tuple[datetime, Optional[int]]]) -> None:
+        """Put a failed batch back so the next flush retries it (within the cap)."""
+        with self._lock:
+            for pixel_id, entry in batch.items():
+                if len(self._pending) >= self.max_pending:
+                    self.dropped += 1
+                    continue
+                # Keep the earliest hit time if the pixel was hit again meanwhile
+                self._pending[pixel_id] = min(entry, self._pending.get(pixel_id, entry), key=lambda e: e[0])
+
+    def start(self) -> None:
+        """Start the background flusher thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="open-buffer-flusher", daemon=True)
+        self._thread.start()
+        logger.info("Tracking pixel open buffer started.")
+
+    def stop(self) -> None:
+        """Stop the flusher and write whatever is still pending."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+        logger.info("Tracking pixel open buffer stopped.")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "flush_errors": self.flush_errors,
+        }
+
+
+# Pixel hits with forged/malformed tracking IDs (scanners, bots)
+rejected_pixel_hits = 0
+
+
+def record_pixel_hit(tracking_pixel_id: str) -> None:
+    """Handle one tracking pixel request without touching the database.
+
+    Invalid IDs are dropped after a signature/format check, known-opened
+    pixels are answered from the LRU, and anything else goes into the
+    write-behind buffer.
+    """
+    global rejected_pixel_hits
+
+    pitch_id = None
+    if is_signed_tracking_pixel_id(tracking_pixel_id):
+        pitch_id = verify_tracking_pixel_id(tracking_pixel_id)
+        if pitch_id is None:
+            rejected_pixel_hits += 1
+            return
+    elif not is_legacy_tracking_pixel_id(tracking_pixel_id):
+        rejected_pixel_hits += 1
+        return
+
+    if tracking_pixel_id in opened_pixels:
+        return
+    open_buffer.add(tracking_pixel_id, pitch_id)
+
+
+def warm_opened_pixels(limit: int = OPENED_CACHE_SIZE) -> int:
+    """Pre-load the "already opened" LRU from the most recently opened pitches.
+
+    Called on startup. Failures are logged and ignored — the cache just
+    starts cold.
+    """
+    db = SessionLocal()
+    try:
+        tracking_ids = crud.get_recently_opened_tracking_ids(db, limit=limit)
+        # Oldest first, so the most recent opens end up as most-recently-used
+        opened_pixels.update(reversed(tracking_ids))
+        logger.info(f"Opened-pixel cache warmed with {len(tracking_ids)} tracking IDs.")
+        return len(tracking_ids)
+    except Exception as e:
+        logger.warning(f"Could not warm opened-pixel cache: {str(e)}")
+        return 0
+    finally:
+        db.close()
+
+
+def tracking_stats() -> dict:
+    return {
+        "open_buffer": open_buffer.stats(),
+        "opened_cache": opened_pixels.stats(),
+        "rejected_hits": rejected_pixel_hits,
+    }
+
+
+# Global instance — started/stopped by the FastAPI lifespan hook
+open_buffer = OpenBuffer()
@@ -0,0 +1,399 @@
+"""Webhook event processing — applies Resend events to pitches in batches.
+
+POST /webhooks/resend only verifies the signature, appends the raw event
+to the `webhook_events` inbox table and returns 202. Retried deliveries
+(same svix-id) are dropped before they reach the inbox, so an event is
+applied at most once. This module holds:
+
+1. The state rules for each event type (apply_events) — shared by the
+   background consumer and any bulk tooling that replays events
+2. WebhookConsumer — a background thread that claims pending inbox rows
+   with SELECT ... FOR UPDATE SKIP LOCKED, resolves their pitches in bulk,
+   applies them grouped by pitch and commits ONE transaction per batch
+
+Several uvicorn workers can each run a consumer — SKIP LOCKED guarantees
+an event is only ever claimed by one of them.
+
+The consumer also purges the inbox: every WEBHOOK_PURGE_INTERVAL_SECONDS
+it deletes applied/skipped rows older than WEBHOOK_RETENTION_DAYS, a
+batch at a time. Failed rows are kept.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app import crud
+from app.config import settings
+from app.services.cache import TTLCache
+from app.services.tracking import opened_pixels
+
+logger = logging.getLogger(__name__)
+
+# Events claimed and committed together
+WEBHOOK_BATCH_SIZE = 200
+
+# How long the consumer sleeps when the inbox is empty
+WEBHOOK_POLL_SECONDS = 1.0
+
+# Give up on an event after this many failed attempts
+WEBHOOK_MAX_ATTEMPTS = 5
+
+# How often the consumer purges old inbox rows, and how many it deletes
+# per transaction (at most WEBHOOK_PURGE_MAX_BATCHES per purge, so a big
+# backlog of old rows never holds up new events for long)
+WEBHOOK_PURGE_INTERVAL_SECONDS = 3600
+WEBHOOK_PURGE_BATCH_SIZE = 1000
+WEBHOOK_PURGE_MAX_BATCHES = 20
+
+# Svix retries a delivery for up to ~a day — remember IDs that long
+SEEN_SVIX_ID_TTL_SECONDS = 24 * 60 * 60
+SEEN_SVIX_ID_CACHE_SIZE = 20_000
+
+# Svix delivery IDs this worker has already queued. Answers most retries
+# without a DB round trip; the unique index on webhook_events.svix_id
+# catches the rest (other workers, restarts, evictions).
+seen_svix_ids = TTLCache(ttl_seconds=SEEN_SVIX_ID_TTL_SECONDS, max_entries=SEEN_SVIX_ID_CACHE_SIZE)
+
+
+def _recipient(data: dict) -> str:
+    """Extract the recipient email from a Resend event's data block."""
+    if isinstance(data.get("to"), list) and data["to"]:
+        return data["to"][0]
+    if isinstance(data.get("to"), str):
+        return data["to"]
+    return ""
+
+
+def _event_time(payload: dict) -> Optional[datetime]:
+    """When Resend says the event happened, or None (record functions then use now)."""
+    created_at = payload.get("created_at")
+    if not created_at:
+        return None
+    try:
+        return datetime.fromisoformat(str(created_at).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def resolve_pitches(db: Session, payloads: List[dict]) -> List[Optional[object]]:
+    """Find the pitch for every event payload with bulk IN queries.
+
+    Resolution order per event:
+    1. Resend email ID stored on the pitch (one IN query for the batch)
+    2. Legacy fallback — brand by recipient email, newest active pitch
+       without a stored email ID (two IN queries for the whole batch)
+
+    Returns:
+        list aligned with `payloads`: PitchModel or None
+    """
+    email_ids = [p.get("data", {}).get("email_id") for p in payloads]
+    by_email_id = crud.get_pitches_by_resend_email_ids(db, [e for e in set(email_ids) if e])
+
+    unresolved = {
+        _recipient(p.get("data", {}))
+        for p, email_id in zip(payloads, email_ids)
+        if email_id not in by_email_id
+    }
+    by_recipient = crud.get_legacy_pitches_by_recipients(db, [e for e in unresolved if e])
+
+    pitches = []
+    for payload, email_id in zip(payloads, email_ids):
+        pitch = by_email_id.get(email_id) if email_id else None
+        if pitch is None:
+            pitch = by_recipient.get(_recipient(payload.get("data", {})))
+        pitches.append(pitch)
+    return pitches
+
+
+def apply_event(db: Session, pitch, payload: dict, config=None, brand=None) -> str:
+    """Apply ONE event to its pitch. Does not commit.
+
+    State rules:
+    - email.delivered → confirmation only (pitch is marked sent on send)
+    - email.opened → records open time, brand status "opened"
+    - email.clicked → records click time
+    - email.bounced → marks pitch as bounced
+    - email.complained → marks pitch as bounced + blacklists the domain
+
+    Args:
+        db: Database session
+        pitch: The resolved PitchModel
+        payload: The raw Resend event
+        config: Autopilot config for complaints (loaded here if not given)
+        brand: The pitch's BrandModel (loaded here if needed and not given)
+    
+    Returns:
+        "processed" or "skipped"
+    """
+    event_type = payload.get("type", "")
+    to_email = _recipient(payload.get("data", {}))
+    occurred_at = _event_time(payload)
+
+    if not to_email and event_type == "email.complained":
+        brand = brand or crud.get_brand(db, pitch.brand_id)
+        to_email = brand.email if brand else ""
+
+    if event_type == "email.delivered":
+        logger.info(f"Email delivered to {to_email} (pitch {pitch.id})")
+
+    elif event_type == "email.opened":
+        crud.record_pitch_opened(db, pitch.id, occurred_at, commit=False)
+        crud.update_brand_status(db, pitch.brand_id, "opened", commit=False)
+        logger.info(f"Email opened by {to_email} (pitch {pitch.id})")
+
+    elif event_type == "email.clicked":
+        crud.record_pitch_clicked(db, pitch.id, occurred_at, commit=False)
+        logger.info(f"Link clicked by {to_email} (pitch {pitch.id})")
+
+    elif event_type == "email.bounced":
+        crud.record_pitch_bounced(db, pitch.id, occurred_at, commit=False)
+        logger.warning(f"Email bounced for {to_email} (pitch {pitch.id})")
+
+    elif event_type == "email.complained":
+        crud.record_pitch_bounced(db, pitch.id, occurred_at, commit=False)  # Treat complaint like bounce
+        # Auto-blacklist the domain
+        domain = to_email.split("@")[-1] if "@" in to_email else ""
+        if domain:
+            config = config or crud.get_autopilot_config(db)
+            if config and domain not in (config.blacklisted_domains or []):
+                blacklist = list(config.blacklisted_domains or [])
+                blacklist.append(domain)
+                crud.update_autopilot_config(db, {"blacklisted_domains": blacklist}, commit=False)
+        logger.warning(f"Spam complaint from {to_email} — domain blacklisted (pitch {pitch.id})")
+
+    else:
+        logger.info(f"Unhandled webhook event type: {event_type}")
+        return "skipped"
+
+    return "processed"
+
+
+def apply_events(db: Session, payloads: List[dict]) -> List[dict]:
+    """Resolve and apply a batch of events, grouped by pitch. Does not commit.
+
+    Events for the same pitch are applied together, in the order they
+    were given, so each pitch's state is walked forward once per batch.
+
+    Returns:
+        list aligned with `payloads`: {"status", "pitch_id", "tracking_pixel_id", "reason"}
+    """
+    pitches = resolve_pitches(db, payloads)
+    outcomes: List[dict] = [None] * len(payloads)
+
+    # Load everything the state rules touch up front, in bulk. Each event
+    # gets its brand passed in, and since the brands are loaded into this
+    # session, update_brand_status's lookup is answered from the identity map.
+    brands = crud.get_brands_by_ids(db, list({pitch.brand_id for pitch in pitches if pitch}))
+    config = None
+    if any(p.get("type") == "email.complained" for p in payloads):
+        config = crud.get_autopilot_config(db)
+
+    by_pitch: Dict[int, List[int]] = {}
+    for index, pitch in enumerate(pitches):
+        if pitch is None:
+            outcomes[index] = {
+                "status": "skipped", "pitch_id": None, "tracking_pixel_id": None, "reason": "no active pitch"
+            }
+        else:
+            by_pitch.setdefault(pitch.id, []).append(index)
+
+    for indexes in by_pitch.values():
+        for index in indexes:
+            pitch = pitches[index]
+            status = apply_event(db, pitch, payloads[index], config, brands.get(pitch.brand_id))
+            reason = None if status == "processed" else f"unhandled event type: {payloads[index].get('type', '')}"
+            outcomes[index] = {
+                "status": status, "pitch_id": pitch.id,
+                "tracking_pixel_id": pitch.tracking_pixel_id, "reason": reason
+            }
+
+    return outcomes
+
+
+def remember_opens(payloads: List[dict], outcomes: List[dict]) -> None:
+    """After commit: mark opened pitches in the pixel cache so repeat pixel hits skip the DB."""
+    for payload, outcome in zip(payloads, outcomes):
+        if payload.get("type") == "email.opened" and outcome["status"] == "processed" and outcome["tracking_pixel_id"]:
+            opened_pixels.set(outcome["tracking_pixel_id"])
+
+
+class WebhookConsumer:
+    """Background thread that drains the webhook inbox in batches."""
+
+    def __init__(self, batch_size: int = WEBHOOK_BATCH_SIZE, poll_seconds: float = WEBHOOK_POLL_SECONDS):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.batches = 0
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.last_batch_ms = None
+        self.last_lag_seconds = None
+        self.purged = 0
+        self._next_purge = time.monotonic()
+
+    def wake(self) -> None:
+        """Nudge the consumer after a new event was queued in this process."""
+        self._wake.set()
+
+    def process_batch(self) -> int:
+        """Claim, apply and commit one batch of pending events.
+
+        Returns:
+            Number of inbox rows handled (0 when the inbox is empty)
+        """
+        db = SessionLocal()
+        started = time.perf_counter()
+        try:
+            rows = crud.claim_pending_webhook_events(db, limit=self.batch_size)
+            if not rows:
+                db.rollback()
+                return 0
+
+            payloads = [row.payload or {} for row in rows]
+            try:
+                outcomes = apply_events(db, payloads)
+            except Exception as e:
+                # One bad event shouldn't poison the batch — retry them one by one
+                db.rollback()
+                logger.error(f"Webhook batch of {len(rows)} failed, retrying individually: {str(e)}")
+                return self._process_individually(db, [row.id for row in rows])
+
+            self._finish(db, rows, payloads, outcomes)
+            self.batches += 1
+            self.last_batch_ms = round((time.perf_counter() - started) * 1000, 1)
+            return len(rows)
+        finally:
+            db.close()
+
+    def _finish(self, db: Session, rows, payloads: List[dict], outcomes: List[dict]) -> None:
+        """Mark inbox rows done and commit everything in one transaction."""
+        now = datetime.now(timezone.utc)
+        for row, outcome in zip(rows, outcomes):
+            row.status = outcome["status"]
+            row.pitch_id = outcome["pitch_id"]
+            row.error = outcome["reason"]
+            row.attempts = (row.attempts or 0) + 1
+            row.processed_at = now
+
+        oldest = min((row.received_at for row in rows if row.received_at), default=None)
+        db.commit()
+
+        remember_opens(payloads, outcomes)
+        self.processed += sum(1 for o in outcomes if o["status"] == "processed")
+        self.skipped += sum(1 for o in outcomes if o["status"] == "skipped")
+        if oldest:
+            self.last_lag_seconds = round((datetime.utcnow() - oldest).total_seconds(), 1)
+
+    def _process_individually(self, db: Session, event_ids: List[int]) -> int:
+        """Fallback after a failed batch: one transaction per event."""
+        for event_id in event_ids:
+            row = crud.claim_webhook_event(db, event_id)
+            if not row:
+                db.rollback()
+                continue
+
+            payload = row.payload or {}
+            try:
+                outcomes = apply_events(db, [payload])
+                self._finish(db, [row], [payload], outcomes)
+            except Exception as e:
+                db.rollback()
+                row = crud.claim_webhook_event(db, event_id)
+                if not row:
+                    db.rollback()
+                    continue
+                row.attempts = (row.attempts or 0) + 1
+                row.error = str(e)[:1000]
+                if row.attempts >= WEBHOOK_MAX_ATTEMPTS:
+                    row.status = "failed"
+                    row.processed_at = datetime.now(timezone.utc)
+                    self.failed += 1
+                    logger.error(f"Webhook event {event_id} failed permanently: {str(e)}")
+                db.commit()
+        return len(event_ids)
+
+    def purge(self) -> int:
+        """Delete old applied/skipped inbox rows, in batches.
+
+        Returns:
+            Number of rows deleted
+        """
+        retention_days = max(settings.webhook_retention_days, 1)
+        deleted = 0
+        db = SessionLocal()
+        try:
+            for _ in range(WEBHOOK_PURGE_MAX_BATCHES):
+                batch = crud.purge_webhook_events(db, retention_days, WEBHOOK_PURGE_BATCH_SIZE)
+                deleted += batch
+                if batch < WEBHOOK_PURGE_BATCH_SIZE:
+                    break
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Webhook inbox purge failed: {str(e)}")
+        finally:
+            db.close()
+
+        self.purged += deleted
+        if deleted:
+            logger.info(f"Webhook inbox: purged {deleted} events older than {retention_days} days")
+        return deleted
+
+    def _purge_if_due(self) -> None:
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + WEBHOOK_PURGE_INTERVAL_SECONDS
+            self.purge()
+
+    def start(self) -> None:
+        """Start the consumer thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="webhook-consumer", daemon=True)
+        self._thread.start()
+        logger.info("Webhook event consumer started.")
+
+    def stop(self) -> None:
+        """Stop the consumer. Pending events stay in the inbox for the next run."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+            self._thread = None
+        logger.info("Webhook event consumer stopped.")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                handled = self.process_batch()
+            except Exception as e:
+                logger.error(f"Webhook consumer error: {str(e)}")
+                handled = 0
+            self._purge_if_due()
+
+            # A full batch means there's probably more waiting — go again now
+            if handled < self.batch_size:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "last_batch_ms": self.last_batch_ms,
+            "last_batch_lag_seconds": self.last_lag_seconds,
+            "purged": self.purged,
+        }
+
+
+# Global instance — started/stopped by the FastAPI lifespan hook
+webhook_consumer = WebhookConsumer()
@@ -0,0 +1,46 @@
+"""Rebuild the analytics daily rollup and overview counters from the raw tables.
+
+Run with: python -m app.tasks.rebuild_analytics_rollup
+
+Both are normally kept up to date incrementally (the pitch event CRUD
+functions and the session commit hooks). Run this once after first
+deploying them (to backfill history), or any time the numbers look out
+of sync.
+"""
+import sys
+import time
+import logging
+from app.database import SessionLocal, engine
+from app.models import AnalyticsCounter, AnalyticsDailyRollup
+from app import crud
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    # Make sure the table exists (idempotent)
+    AnalyticsDailyRollup.__table__.create(bind=engine, checkfirst=True)
+    AnalyticsCounter.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        rows = crud.rebuild_analytics_rollup(db)
+        logger.info(f"Rollup rebuilt: {rows} rows in {time.perf_counter() - started:.2f}s")
+        counters = crud.rebuild_analytics_counters(db)
+        logger.info(f"Overview counters rebuilt: {counters}")
+        sys.exit(0)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Rollup rebuild failed: {str(e)}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Replay / backfill Resend webhook events from a JSONL dump.
+
+Usage:
+    python -m app.tasks.replay_webhooks events.jsonl
+    python -m app.tasks.replay_webhooks events.jsonl --chunk-size 2000
+    cat events.jsonl | python -m app.tasks.replay_webhooks -
+
+Use this to recover webhook deliveries that were lost (e.g. during a
+deploy) instead of re-POSTing them one by one. Each line is one Resend
+event payload, exactly as Resend POSTs it ({"type": ..., "data": {...}}).
+
+This script:
+1. Streams the file line by line — memory use is bounded by the chunk size,
+   so dumps with millions of lines are fine
+2. Resolves the pitches of each chunk with bulk IN queries
+3. Applies opens, clicks, bounces and complaints with the same state rules
+   as the webhook consumer (app.services.webhook_events), one transaction
+   per chunk
+4. Logs progress and the final throughput in events/sec
+
+The state rules are idempotent (first open/click wins, a pitch is only
+counted as bounced once, a blacklisted domain is never added twice), so
+replaying an event that was already applied changes nothing.
+"""
+import argparse
+import json
+import sys
+import time
+import logging
+from typing import Iterator, List
+from app.database import SessionLocal
+from app.services.webhook_events import apply_events
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Per-event logging from the state rules would drown the progress output
+logging.getLogger("app.services.webhook_events").setLevel(logging.ERROR)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Log progress every this many events
+PROGRESS_EVERY = 50_000
+
+
+def _read_chunks(stream, chunk_size: int, counts: dict) -> Iterator[List[dict]]:
+    """Yield lists of parsed event payloads, skipping blank and invalid lines."""
+    chunk = []
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            payload = json.loads(line)
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            counts["invalid"] += 1
+            logger.warning(f"Line {line_number}: not a JSON event object, skipping")
+            continue
+
+        chunk.append(payload)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _apply_chunk(db, chunk: List[dict], counts: dict) -> None:
+    """Apply one chunk in a single transaction (event by event if it fails)."""
+    try:
+        outcomes = apply_events(db, chunk)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Chunk of {len(chunk)} events failed, retrying one by one: {str(e)}")
+        outcomes = []
+        for payload in chunk:
+            try:
+                outcomes.extend(apply_events(db, [payload]))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                counts["failed"] += 1
+                logger.error(f"Event {payload.get('type', '')} failed: {str(e)}")
+    finally:
+        # Keep the identity map from growing across chunks
+        db.expunge_all()
+
+    for outcome in outcomes:
+        counts[outcome["status"]] += 1
+
+
+def replay(stream, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """Replay every event in `stream` (an iterable of JSONL lines).
+
+    Returns:
+        dict with processed/skipped/failed/invalid counts, events and events_per_second
+    """
+    counts = {"processed": 0, "skipped": 0, "failed": 0, "invalid": 0}
+    events = 0
+    next_progress = PROGRESS_EVERY
+    started = time.perf_counter()
+
+    db = SessionLocal()
+    try:
+        for chunk in _read_chunks(stream, chunk_size, counts):
+            _apply_chunk(db, chunk, counts)
+            events += len(chunk)
+            if events >= next_progress:
+                elapsed = time.perf_counter() - started
+                logger.info(f"{events} events replayed ({events / elapsed:.0f} events/sec)")
+                next_progress += PROGRESS_EVERY
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    counts["events"] = events
+    counts["seconds"] = round(elapsed, 2)
+    counts["events_per_second"] = round(events / elapsed, 1) if elapsed else None
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay Resend webhook events from a JSONL dump")
+    parser.add_argument("path", help="JSONL file with one Resend event per line ('-' for stdin)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Events applied per transaction")
+    args = parser.parse_args()
+
+    logger.info(f"Replaying webhook events from {args.path}...")
+    try:
+        if args.path == "-":
+            result = replay(sys.stdin, args.chunk_size)
+        else:
+            with open(args.path, encoding="utf-8") as f:
+                result = replay(f, args.chunk_size)
+    except Exception as e:
+        logger.error(f"Replay failed: {str(e)}")
+        sys.exit(1)
+
+    logger.info(
+        f"Replay complete: {result['events']} events in {result['seconds']}s "
+        f"({result['events_per_second']} events/sec) — "
+        f"{result['processed']} applied, {result['skipped']} skipped, "
+        f"{result['failed']} failed, {result['invalid']} invalid lines"
+    )
+    sys.exit(1 if result["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
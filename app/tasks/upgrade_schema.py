@@ -0,0 +1,72 @@
+"""Bring an existing database up to date with the current models.
+
+Run with: python -m app.tasks.upgrade_schema
+
+create_all() only creates tables that are missing — it never touches
+tables that already exist. New columns and indexes on existing tables
+are added by the idempotent statements in SCHEMA_UPGRADES, so this
+script is safe to run on every deploy.
+"""
+from sqlalchemy import text
+from app.config import settings
+from app.database import Base, engine, SessionLocal
+from app import crud
+import app.models  # noqa: F401 — registers every model on Base.metadata
+
+# Each statement must be safe to run repeatedly (IF NOT EXISTS, etc.)
+SCHEMA_UPGRADES = [
+    # Analytics status breakdown is a GROUP BY on status
+    "CREATE INDEX IF NOT EXISTS ix_pitches_status ON pitches (status)",
+    # Analytics timeseries computes median open latency over an opened_at range
+    "CREATE INDEX IF NOT EXISTS ix_pitches_opened_at ON pitches (opened_at)",
+    # Webhooks resolve pitches by the Resend email ID
+    "ALTER TABLE pitches ADD COLUMN IF NOT EXISTS resend_email_id VARCHAR(255)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_pitches_resend_email_id ON pitches (resend_email_id)",
+    # Webhook retries are deduplicated on the Svix delivery ID
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_webhook_events_svix_id ON webhook_events (svix_id)",
+    # Autopilot runs log real token usage from the model's usage metadata
+    "ALTER TABLE autopilot_log ADD COLUMN IF NOT EXISTS ai_calls INTEGER DEFAULT 0",
+    "ALTER TABLE autopilot_log ADD COLUMN IF NOT EXISTS ai_retries INTEGER DEFAULT 0",
+    "ALTER TABLE autopilot_log ADD COLUMN IF NOT EXISTS prompt_tokens INTEGER DEFAULT 0",
+    "ALTER TABLE autopilot_log ADD COLUMN IF NOT EXISTS candidate_tokens INTEGER DEFAULT 0",
+    "ALTER TABLE autopilot_log ADD COLUMN IF NOT EXISTS tokens_used INTEGER DEFAULT 0",
+    # ...and why each skipped brand was skipped
+    "ALTER TABLE autopilot_log ADD COLUMN IF NOT EXISTS skipped JSON DEFAULT '[]'",
+    # Discovered emails are matched against brands case-insensitively
+    "CREATE INDEX IF NOT EXISTS ix_brands_email_lower ON brands (lower(email))",
+    # Surplus discovered candidates are pooled per niche for later micro-batches
+    "ALTER TABLE autopilot_work_items ADD COLUMN IF NOT EXISTS niche VARCHAR(100)",
+]
+
+# Only applied when settings.discovery_fuzzy_match is enabled — creating
+# the extension may need elevated privileges on some hosts
+FUZZY_DISCOVERY_UPGRADES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_brand_discovery_cache_brand_key_trgm "
+    "ON brand_discovery_cache USING gin (brand_key gin_trgm_ops)",
+]
+
+
+def upgrade():
+    """Create missing tables, apply column/index upgrades, then backfill."""
+    Base.metadata.create_all(bind=engine)
+    print("✓ tables ready")
+
+    statements = SCHEMA_UPGRADES + (FUZZY_DISCOVERY_UPGRADES if settings.discovery_fuzzy_match else [])
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+            print(f"✓ {statement}")
+
+    db = SessionLocal()
+    try:
+        copied = crud.backfill_discovery_cache(db)
+        print(f"✓ discovery cache backfilled ({copied} legacy entries)")
+        counters = crud.rebuild_analytics_counters(db)
+        print(f"✓ analytics counters recounted ({counters.get('brands', 0)} brands)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,108 @@
+"""Benchmark — per-pitch cost of building a provider per call vs the shared one.
+
+Usage:
+    python -m benchmarks.ai_provider
+    python -m benchmarks.ai_provider --calls 200
+    python -m benchmarks.ai_provider --live 5     # also time real generate_pitch calls
+
+This script compares the two ways code used to / now gets an AI provider:
+
+- "per call": GeminiProvider() for every pitch, as crud.generate_and_create_pitch
+  and the autopilot used to do — re-runs genai.configure() and builds a new
+  genai.Client (fresh HTTP pool, fresh TLS handshake on first request)
+- "shared":   get_ai_provider(), the process-wide instance from the registry
+
+The default mode needs no network and measures only the setup overhead
+each pitch paid. --live N additionally runs N real generate_pitch() calls
+each way (needs a valid GEMINI_API_KEY and uses tokens), which includes
+the connection setup the per-call instances pay on their first request.
+"""
+import argparse
+import statistics
+import time
+from app.services.ai_provider import get_ai_provider, close_ai_provider
+from app.services.gemini import GeminiProvider
+
+BRAND = {
+    "name": "Benchmark Skincare",
+    "website": "https://example.com",
+    "category": "skincare",
+    "notes": "Mid-size skincare brand with a creator program",
+    "instagram": "@benchmark",
+}
+
+PROFILE = {
+    "name": "Benchmark Creator",
+    "bio": "Skincare and wellness creator",
+    "niches": ["skincare", "wellness"],
+    "interests": ["clean beauty"],
+    "content_style": "educational",
+    "unique_angle": "dermatology-backed routines",
+    "top_performing_content": "30-day routine series",
+}
+
+
+def _summary(label: str, timings: list) -> None:
+    print(
+        f"{label:<24} median {statistics.median(timings):>9.2f} ms   "
+        f"mean {statistics.mean(timings):>9.2f} ms   max {max(timings):>9.2f} ms"
+    )
+
+
+def _time_setup(calls: int):
+    per_call, shared = [], []
+    for _ in range(calls):
+        started = time.perf_counter()
+        provider = GeminiProvider()
+        per_call.append((time.perf_counter() - started) * 1000)
+        provider.close()
+
+    close_ai_provider()
+    for _ in range(calls):
+        started = time.perf_counter()
+        get_ai_provider()
+        shared.append((time.perf_counter() - started) * 1000)
+    return per_call, shared
+
+
+def _time_live(calls: int):
+    per_call, shared = [], []
+    for _ in range(calls):
+        started = time.perf_counter()
+        provider = GeminiProvider()
+        provider.generate_pitch(BRAND, PROFILE)
+        per_call.append((time.perf_counter() - started) * 1000)
+        provider.close()
+
+    get_ai_provider().generate_pitch(BRAND, PROFILE)  # warm the shared pool
+    for _ in range(calls):
+        started = time.perf_counter()
+        get_ai_provider().generate_pitch(BRAND, PROFILE)
+        shared.append((time.perf_counter() - started) * 1000)
+    return per_call, shared
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-call vs shared AI provider")
+    parser.add_argument("--calls", type=int, default=100, help="Provider acquisitions to time")
+    parser.add_argument("--live", type=int, default=0,
+                        help="Also time this many real generate_pitch calls each way")
+    args = parser.parse_args()
+
+    try:
+        print(f"Provider setup per pitch ({args.calls} calls, no network):")
+        per_call, shared = _time_setup(args.calls)
+        _summary("  per call GeminiProvider", per_call)
+        _summary("  shared get_ai_provider", shared)
+
+        if args.live:
+            print(f"\nEnd-to-end generate_pitch ({args.live} calls):")
+            per_call, shared = _time_live(args.live)
+            _summary("  per call GeminiProvider", per_call)
+            _summary("  shared get_ai_provider", shared)
+    finally:
+        close_ai_provider()
+
+
+if __name__ == "__main__":
+    main()
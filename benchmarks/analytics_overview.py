@@ -0,0 +1,117 @@
+"""Benchmark — /analytics/overview latency as the pitch count grows.
+
+Usage:
+    python -m benchmarks.analytics_overview
+    python -m benchmarks.analytics_overview --sizes 1000 10000 50000 --repeats 7
+
+This script:
+1. Opens ONE outer transaction on the configured database
+2. Seeds synthetic brands + pitches (with realistic ~4KB HTML bodies) in steps
+3. Times crud.get_analytics_overview() at each step
+4. Rolls everything back — nothing is left behind in the database
+
+Because the overview is a single aggregate query, no rows are loaded into
+Python — latency should stay in the tens of milliseconds while the pitch
+count grows by orders of magnitude (the old load-everything version took
+~1.6s at 30k pitches).
+"""
+import argparse
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.database import engine
+from app.models import Brand as BrandModel, Profile as ProfileModel, Pitch as PitchModel
+from app import crud
+
+# Roughly the size of a generated pitch body — the old implementation
+# loaded every one of these into memory on each call.
+FAKE_BODY = "<p>" + ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 70) + "</p>"
+
+STATUSES = ["draft", "sent", "opened", "clicked", "replied", "bounced"]
+
+
+def _seed(db: Session, profile_id: int, brand_ids: list, count: int, offset: int):
+    """Bulk insert `count` synthetic pitches spread over the last 60 days."""
+    now = datetime.utcnow()
+    rows = []
+    for i in range(offset, offset + count):
+        status = STATUSES[i % len(STATUSES)]
+        sent_at = now - timedelta(hours=i % (60 * 24)) if status != "draft" else None
+        opened_at = sent_at + timedelta(hours=(i % 48) + 1) if sent_at and i % 3 == 0 else None
+        replied_at = sent_at + timedelta(days=2) if sent_at and status == "replied" else None
+        rows.append({
+            "brand_id": brand_ids[i % len(brand_ids)],
+            "creator_profile_id": profile_id,
+            "subject": f"Benchmark pitch {i}",
+            "body": FAKE_BODY,
+            "status": status,
+            "mode": "autopilot" if i % 2 else "manual",
+            "tracking_pixel_id": f"bench-{uuid.uuid4()}",
+            "sent_at": sent_at,
+            "opened_at": opened_at,
+            "replied_at": replied_at,
+        })
+    # Insert in chunks so parameter lists stay reasonable
+    for start in range(0, len(rows), 5000):
+        db.execute(insert(PitchModel), rows[start:start + 5000])
+    db.flush()
+
+
+def _time_overview(db: Session, repeats: int) -> list:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        crud.get_analytics_overview(db)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /analytics/overview")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000],
+                        help="Total pitch counts to measure at (ascending)")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed calls per size")
+    parser.add_argument("--brands", type=int, default=500, help="Synthetic brands to spread pitches over")
+    args = parser.parse_args()
+
+    connection = engine.connect()
+    outer = connection.begin()
+    # crud functions call commit() — turn those into savepoints so the
+    # outer transaction can still roll everything back at the end.
+    db = Session(bind=connection, join_transaction_mode="create_savepoint")
+
+    try:
+        profile = ProfileModel(
+            name="Benchmark Creator",
+            sender_email="bench@example.com",
+            tiktok_url="https://www.tiktok.com/@bench",
+            portfolio_url="https://example.com",
+        )
+        db.add(profile)
+        db.flush()
+
+        brand_rows = [
+            {"name": f"Bench Brand {i}", "email": f"bench-{i}-{uuid.uuid4().hex[:8]}@example.com"}
+            for i in range(args.brands)
+        ]
+        brand_ids = [r.id for r in db.execute(insert(BrandModel).returning(BrandModel.id), brand_rows)]
+
+        print(f"{'pitches':>10} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+        seeded = 0
+        for size in sorted(args.sizes):
+            _seed(db, profile.id, brand_ids, size - seeded, seeded)
+            seeded = size
+            crud.get_analytics_overview(db)  # warm-up (plan cache, buffers)
+            timings = _time_overview(db, args.repeats)
+            print(f"{size:>10} {statistics.median(timings):>10.1f} {min(timings):>8.1f} {max(timings):>8.1f}")
+    finally:
+        db.close()
+        outer.rollback()
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
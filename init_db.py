@@ -1,5 +1,5 @@
 from app.database import Base, engine
-from app.models import Brand, Profile, Pitch, AutopilotConfig, AutopilotLog
+from app.models import Brand, Profile, Pitch, AutopilotConfig, AutopilotLog, AutopilotWorkItem, AnalyticsDailyRollup, AnalyticsCounter, WebhookEvent, BrandDiscoveryCache, DiscoverySearchLease, AIRateBucket, PitchGenerationCache, AIUsageDaily
 
 Base.metadata.create_all(bind=engine)
 
@@ -1 +1,59 @@
+"""Shared test fixtures.
 
+Tests that need PostgreSQL (SKIP LOCKED claims, advisory locks, upserts)
+take the `db` fixture. They run against TEST_DATABASE_URL — never
+DATABASE_URL, since tests empty the tables they use — and are skipped
+when it isn't set or can't be reached:
+
+    TEST_DATABASE_URL=postgresql://postgres@localhost:5432/hermes_test pytest
+"""
+import os
+import time
+import pytest
+
+# Settings are read at import time: point the app at the test database
+# (or nowhere) before anything under app/ is imported
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", "postgresql://localhost/hermes_test")
+for name in ("POSTGRES_PASSWORD", "GEMINI_API_KEY", "RESEND_API_KEY", "SECRET_KEY"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("AI_PROVIDER", "gemini")
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Create the tables once per run (skips DB tests without a test database)."""
+    if not os.environ.get("TEST_DATABASE_URL"):
+        pytest.skip("TEST_DATABASE_URL not set")
+
+    from sqlalchemy.exc import OperationalError
+    from app.database import Base, engine
+    import app.models  # noqa: F401 — registers every table on Base
+
+    try:
+        Base.metadata.create_all(bind=engine)
+    except OperationalError as e:
+        pytest.skip(f"Test database unreachable: {str(e)}")
+    return engine
+
+
+@pytest.fixture
+def db(database):
+    """A session on the test database."""
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    """Poll condition() until it is true or `timeout` seconds pass."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
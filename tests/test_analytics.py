@@ -0,0 +1,93 @@
+"""Analytics overview counters, kept current by the session commit hooks."""
+import pytest
+from sqlalchemy import func
+from app import crud
+from app.models import AnalyticsCounter, Brand, Pitch, Profile
+
+
+def _counters(db) -> dict:
+    db.expire_all()
+    return {name: value for name, value in db.query(AnalyticsCounter.name, AnalyticsCounter.value) if value}
+
+
+def _recount(db) -> dict:
+    status = func.coalesce(Pitch.status, "draft")
+    counts = {f"pitches:{s}": n for s, n in db.query(status, func.count(Pitch.id)).group_by(status)}
+    counts["brands"] = db.query(func.count(Brand.id)).scalar()
+    return {name: value for name, value in counts.items() if value}
+
+
+@pytest.fixture
+def profile(db):
+    crud.rebuild_analytics_counters(db)
+    profile = Profile(name="Test", sender_email="me@example.com", tiktok_url="t", portfolio_url="p")
+    db.add(profile)
+    db.commit()
+    yield profile
+    db.rollback()
+    db.query(Brand).filter(Brand.email.like("%@counters.test")).delete(synchronize_session=False)
+    db.delete(db.get(Profile, profile.id))
+    db.commit()
+
+
+def _brand_with_pitches(db, profile, name: str, statuses: list) -> Brand:
+    brand = Brand(name=name, email=f"{name}@counters.test")
+    db.add(brand)
+    db.flush()
+    db.add_all([
+        Pitch(brand_id=brand.id, creator_profile_id=profile.id, subject="s", body="b", status=status)
+        for status in statuses
+    ])
+    db.commit()
+    return brand
+
+
+def test_inserts_and_status_changes_are_counted(db, profile):
+    _brand_with_pitches(db, profile, "one", [None, "draft", "sent"])
+    assert _counters(db) == _recount(db)
+
+    pitch = db.query(Pitch).filter(Pitch.status == "sent").first()
+    pitch.status = "replied"
+    db.commit()
+    assert _counters(db) == _recount(db)
+
+    # Status set on an expired instance (old value never loaded)
+    db.expire(pitch)
+    pitch.status = "bounced"
+    db.commit()
+    assert _counters(db) == _recount(db)
+
+
+def test_deletes_and_cascades_are_counted(db, profile):
+    kept = _brand_with_pitches(db, profile, "kept", ["draft", "sent"])
+    gone = _brand_with_pitches(db, profile, "gone", ["draft", "opened", "opened"])
+
+    db.delete(db.query(Pitch).filter(Pitch.brand_id == kept.id).first())
+    db.commit()
+    assert _counters(db) == _recount(db)
+
+    # The database deletes the brand's pitches (ON DELETE CASCADE)
+    crud.delete_brand(db, gone.id)
+    assert _counters(db) == _recount(db)
+
+
+def test_rolled_back_changes_are_not_counted(db, profile):
+    before = _counters(db)
+    db.add(Brand(name="rolled", email="rolled@counters.test"))
+    db.flush()
+    db.rollback()
+
+    _brand_with_pitches(db, profile, "after", ["draft"])
+    expected = dict(before, brands=before.get("brands", 0) + 1)
+    expected["pitches:draft"] = before.get("pitches:draft", 0) + 1
+    assert _counters(db) == expected
+
+
+def test_overview_reads_the_counters(db, profile):
+    _brand_with_pitches(db, profile, "overview", ["draft", "sent", "sent"])
+    recount = _recount(db)
+
+    overview = crud.get_analytics_overview(db)
+    assert overview["total_brands"] == recount["brands"]
+    assert overview["total_pitches"] == sum(v for k, v in recount.items() if k.startswith("pitches:"))
+    assert overview["status_breakdown"]["sent"] == recount.get("pitches:sent", 0)
@@ -1 +1,117 @@
+"""Autopilot work queue: claims, leases and failure limits."""
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import update
+from app import crud
+from app.database import SessionLocal
+from app.models import AutopilotWorkItem
 
+LEASE_SECONDS = 60
+
+
+@pytest.fixture(autouse=True)
+def empty_queue(db):
+    db.query(AutopilotWorkItem).delete()
+    db.commit()
+    yield
+    db.rollback()
+    db.query(AutopilotWorkItem).delete()
+    db.commit()
+
+
+def _queue(db, count: int, status: str = "pending") -> list:
+    items = [
+        AutopilotWorkItem(brand_name=f"Brand {i}", email=f"{status}{i}@example.com", status=status, attempts=0)
+        for i in range(count)
+    ]
+    db.add_all(items)
+    db.commit()
+    return [item.id for item in items]
+
+
+def _claim(db, limit: int, worker_id: str) -> list:
+    return [item["id"] for item in crud.claim_autopilot_work_items(db, limit, worker_id, LEASE_SECONDS)]
+
+
+def test_claim_takes_at_most_limit_oldest_first(db):
+    ids = _queue(db, 5)
+
+    assert _claim(db, 3, "worker-a") == ids[:3]
+    assert _claim(db, 10, "worker-b") == ids[3:]
+    assert _claim(db, 10, "worker-c") == []
+
+
+def test_claim_skips_rows_locked_by_another_run(db):
+    ids = _queue(db, 3)
+    other = SessionLocal()
+    try:
+        # Another run is mid-claim on the first row
+        other.query(AutopilotWorkItem).filter(AutopilotWorkItem.id == ids[0]).with_for_update().one()
+        assert _claim(db, 10, "worker-a") == ids[1:]
+    finally:
+        other.rollback()
+        other.close()
+
+
+def test_only_unfinished_work_is_claimed(db):
+    _queue(db, 1, status="pooled")
+    _queue(db, 1, status="sent")
+    _queue(db, 1, status="failed")
+    created = _queue(db, 1, status="created")
+
+    assert _claim(db, 10, "worker-a") == created
+
+
+def test_live_lease_is_not_reclaimed(db):
+    ids = _queue(db, 1)
+    assert _claim(db, 1, "worker-a") == ids
+
+    assert _claim(db, 1, "worker-b") == []
+
+
+def test_expired_lease_is_reclaimed(db):
+    ids = _queue(db, 1)
+    assert _claim(db, 1, "worker-a") == ids
+
+    # worker-a died: its lease runs out
+    db.execute(
+        update(AutopilotWorkItem)
+        .where(AutopilotWorkItem.id == ids[0])
+        .values(claimed_at=datetime.now(timezone.utc) - timedelta(seconds=LEASE_SECONDS + 1))
+    )
+    db.commit()
+
+    assert _claim(db, 1, "worker-b") == ids
+    db.expire_all()
+    assert db.get(AutopilotWorkItem, ids[0]).claimed_by == "worker-b"
+
+
+def test_failed_step_releases_until_max_attempts(db):
+    ids = _queue(db, 1)
+    max_attempts = 3
+
+    for attempt in range(1, max_attempts):
+        assert _claim(db, 1, "worker-a") == ids
+        crud.fail_autopilot_work_item(db, ids[0], f"error {attempt}", max_attempts)
+        db.expire_all()
+        item = db.get(AutopilotWorkItem, ids[0])
+        assert (item.status, item.attempts, item.claimed_by) == ("pending", attempt, None)
+
+    assert _claim(db, 1, "worker-a") == ids
+    crud.fail_autopilot_work_item(db, ids[0], "error 3", max_attempts)
+    db.expire_all()
+    item = db.get(AutopilotWorkItem, ids[0])
+    assert (item.status, item.attempts, item.last_error) == ("failed", max_attempts, "error 3")
+    assert _claim(db, 1, "worker-a") == []
+
+
+def test_advancing_a_step_resets_attempts(db):
+    ids = _queue(db, 1)
+    _claim(db, 1, "worker-a")
+    crud.fail_autopilot_work_item(db, ids[0], "flaky", max_attempts=3)
+
+    _claim(db, 1, "worker-a")
+    crud.advance_autopilot_work_item(db, ids[0], "created")
+    db.expire_all()
+    item = db.get(AutopilotWorkItem, ids[0])
+    assert (item.status, item.attempts, item.last_error, item.claimed_by) == ("created", 0, None, "worker-a")
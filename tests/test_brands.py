@@ -1 +1,29 @@
+"""Brand helpers: discovery cache keys."""
+import pytest
+from app.crud import normalize_brand_key
 
+
+@pytest.mark.parametrize("name, key", [
+    ("CeraVe", "cerave"),
+    ("cerave ", "cerave"),
+    ("Cera-Ve", "cerave"),
+    ("CeraVe (discovered)", "cerave"),
+    ("L'Oréal Paris", "lorealparis"),
+    ("ＣｅｒａＶｅ", "cerave"),
+    ("資生堂", "資生堂"),
+    ("Лэтуаль", "лэтуаль"),
+    ("", ""),
+    ("  (pr)", ""),
+])
+def test_key_normalizes_cosmetic_differences(name, key):
+    assert normalize_brand_key(name) == key
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Dove", "Dovetail"),
+    ("バス", "ハス"),  # dakuten
+    ("कुल", "कल"),  # Devanagari vowel sign
+    ("ปิ", "ป"),  # Thai vowel mark
+])
+def test_different_brands_get_different_keys(first, second):
+    assert normalize_brand_key(first) != normalize_brand_key(second)
@@ -0,0 +1,87 @@
+"""Brand discovery: one search per brand across workers (async path)."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import update
+from app import crud
+from app.database import SessionLocal
+from app.models import BrandDiscoveryCache, DiscoverySearchLease
+from app.services import ai_provider, discovery
+
+BRAND = "Lease Test Brand"
+KEY = crud.normalize_brand_key(BRAND)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(db):
+    def clear():
+        db.query(BrandDiscoveryCache).filter(BrandDiscoveryCache.brand_key == KEY).delete()
+        db.query(DiscoverySearchLease).filter(DiscoverySearchLease.brand_key == KEY).delete()
+        db.commit()
+    clear()
+    yield
+    db.rollback()
+    clear()
+
+
+class _SlowProvider:
+    def __init__(self):
+        self.calls = 0
+
+    async def discover_brand_contacts(self, brand_name):
+        self.calls += 1
+        await asyncio.sleep(0.3)
+        return {"brand_name": brand_name, "contacts": [{"email": "pr@example.com"}]}
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = _SlowProvider()
+    monkeypatch.setattr(ai_provider, "_async_provider", provider)
+    monkeypatch.setattr(discovery, "DISCOVERY_LEASE_POLL_SECONDS", 0.05)
+    return provider
+
+
+def test_lease_goes_to_one_holder_until_it_runs_out(db):
+    assert crud.claim_discovery_lease(db, KEY, "first", lease_seconds=60)
+    assert not crud.claim_discovery_lease(db, KEY, "second", lease_seconds=60)
+
+    db.execute(
+        update(DiscoverySearchLease)
+        .where(DiscoverySearchLease.brand_key == KEY)
+        .values(searching_until=datetime.now(timezone.utc) - timedelta(seconds=1))
+    )
+    db.commit()
+    assert crud.claim_discovery_lease(db, KEY, "second", lease_seconds=60)
+
+    # The first holder's release can't drop the lease it lost
+    crud.release_discovery_lease(db, KEY, "first")
+    assert not crud.claim_discovery_lease(db, KEY, "third", lease_seconds=60)
+
+
+def test_workers_share_one_search(db, provider):
+    async def worker():
+        # Each "worker" has its own session and skips the in-process flight
+        session = SessionLocal()
+        try:
+            return await discovery._search_and_cache_async(session, BRAND, KEY)
+        finally:
+            session.close()
+
+    async def both():
+        return await asyncio.gather(worker(), worker())
+
+    first, second = asyncio.run(both())
+
+    assert provider.calls == 1
+    assert first["contacts"] == second["contacts"]
+    assert db.query(DiscoverySearchLease).filter(DiscoverySearchLease.brand_key == KEY).count() == 0
+
+
+def test_waiter_gives_up_instead_of_searching_again(db, provider, monkeypatch):
+    monkeypatch.setattr(discovery, "DISCOVERY_LOCK_TIMEOUT_SECONDS", 0.2)
+    crud.claim_discovery_lease(db, KEY, "stuck-worker", lease_seconds=60)
+
+    with pytest.raises(Exception, match="still running"):
+        asyncio.run(discovery._search_and_cache_async(db, BRAND, KEY))
+    assert provider.calls == 0
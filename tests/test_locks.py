@@ -0,0 +1,94 @@
+"""Scheduler leader election over PostgreSQL advisory locks."""
+import uuid
+import pytest
+from sqlalchemy import text
+from app.database import engine
+from app.services.locks import LeaderElection
+from tests.conftest import wait_for
+
+
+class _Callbacks:
+    def __init__(self):
+        self.elected = 0
+        self.demoted = 0
+
+    def on_elected(self):
+        self.elected += 1
+
+    def on_demoted(self):
+        self.demoted += 1
+
+
+def _election(key: str):
+    callbacks = _Callbacks()
+    election = LeaderElection(
+        "test-leader", key,
+        on_elected=callbacks.on_elected,
+        on_demoted=callbacks.on_demoted,
+        poll_seconds=0.05,
+    )
+    return election, callbacks
+
+
+@pytest.fixture
+def key(database):
+    # A fresh lock per test, so a slow teardown can't leak leadership
+    return uuid.uuid4().hex
+
+
+def test_exactly_one_process_is_elected(key):
+    first, first_calls = _election(key)
+    second, second_calls = _election(key)
+    first.start()
+    second.start()
+    try:
+        assert wait_for(lambda: first.is_leader or second.is_leader)
+        wait_for(lambda: first.is_leader and second.is_leader, timeout=0.5)
+        assert first.is_leader != second.is_leader
+        assert first_calls.elected + second_calls.elected == 1
+        assert first.leader_exists() and second.leader_exists()
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_follower_takes_over_when_leader_stops(key):
+    leader, leader_calls = _election(key)
+    leader.start()
+    assert wait_for(lambda: leader.is_leader)
+
+    follower, follower_calls = _election(key)
+    follower.start()
+    try:
+        leader.stop()
+        assert leader_calls.demoted == 1
+        assert wait_for(lambda: follower.is_leader)
+        assert follower_calls.elected == 1
+    finally:
+        follower.stop()
+
+
+def test_leader_steps_down_when_its_lock_is_lost(key):
+    election, calls = _election(key)
+    election.start()
+    try:
+        assert wait_for(lambda: election.is_leader)
+
+        # Kill the session holding the lock, as a dropped connection would
+        _, params = election._held_query(own_session=False)
+        with engine.connect() as connection:
+            connection.execute(
+                text(
+                    "SELECT pg_terminate_backend(pid) FROM pg_locks WHERE locktype = 'advisory' "
+                    "AND classid::bigint = :high AND objid::bigint = :low AND objsubid = 1 AND granted"
+                ),
+                params,
+            )
+            connection.commit()
+
+        assert wait_for(lambda: calls.demoted == 1)
+        # Nobody else holds it, so the same process campaigns and wins again
+        assert wait_for(lambda: calls.elected == 2 and election.is_leader)
+    finally:
+        election.stop()
+    assert calls.demoted == 2
@@ -1 +1,52 @@
+"""Pitch generation cache: lookups and buffered hit counts."""
+import pytest
+from app import crud
+from app.models import PitchGenerationCache
+from app.services import pitch_cache
 
+KEY = "0" * 63 + "1"
+PITCH = {"subject": "Hello", "body": "A pitch"}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(db, monkeypatch):
+    monkeypatch.setattr(pitch_cache, "_touches", {})
+    pitch_cache._memory.delete(KEY)
+    db.query(PitchGenerationCache).filter(PitchGenerationCache.cache_key == KEY).delete()
+    db.commit()
+    yield
+    pitch_cache._memory.delete(KEY)
+    db.rollback()
+    db.query(PitchGenerationCache).filter(PitchGenerationCache.cache_key == KEY).delete()
+    db.commit()
+
+
+def _hits(db) -> int:
+    db.expire_all()
+    return db.query(PitchGenerationCache).filter(PitchGenerationCache.cache_key == KEY).one().hits
+
+
+def test_memory_and_db_hits_are_counted_in_one_write(db):
+    entry_id = crud.save_pitch_cache_entry(db, KEY, "model", "v1", PITCH)
+
+    assert pitch_cache._lookup(KEY) == PITCH  # database hit
+    assert pitch_cache._lookup(KEY) == PITCH  # memory hit
+    assert pitch_cache._touches == {entry_id: 2}
+    assert _hits(db) == 0
+
+    pitch_cache.flush_pitch_cache_touches()
+    assert pitch_cache._touches == {}
+    assert _hits(db) == 2
+
+
+def test_failed_hit_write_keeps_the_hit(db, monkeypatch):
+    entry_id = crud.save_pitch_cache_entry(db, KEY, "model", "v1", PITCH)
+    monkeypatch.setattr(pitch_cache, "PITCH_CACHE_TOUCH_FLUSH_SECONDS", 0)
+
+    def fail(db, hits_by_id):
+        raise RuntimeError("database is read-only")
+    monkeypatch.setattr(crud, "touch_pitch_cache_entries", fail)
+
+    assert pitch_cache._lookup(KEY) == PITCH
+    # The count is kept for the next flush
+    assert pitch_cache._touches == {entry_id: 1}
@@ -0,0 +1,97 @@
+"""Shared AI token bucket: refill, reserved slots, token debt and settle()."""
+import uuid
+import pytest
+from sqlalchemy import text
+from app.config import settings
+from app.database import engine
+from app.services.rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def limiter(database, monkeypatch):
+    monkeypatch.setattr(settings, "ai_requests_per_minute", 0)
+    monkeypatch.setattr(settings, "ai_tokens_per_minute", 0)
+    monkeypatch.setattr(settings, "ai_request_burst", 1)
+    limiter = RateLimiter(f"test-{uuid.uuid4().hex[:12]}")
+    yield limiter
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM ai_rate_buckets WHERE name = :name"), {"name": limiter.name})
+
+
+def _age_bucket(limiter: RateLimiter, seconds: float) -> None:
+    """Pretend the bucket was last touched `seconds` earlier (so it refills without sleeping)."""
+    with engine.begin() as connection:
+        connection.execute(
+            text("UPDATE ai_rate_buckets SET updated_at = updated_at - make_interval(secs => :seconds) "
+                 "WHERE name = :name"),
+            {"name": limiter.name, "seconds": seconds},
+        )
+
+
+def test_requests_are_spaced_and_refill(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "ai_requests_per_minute", 60)  # one per second
+
+    assert limiter._reserve(0) == 0
+    wait = limiter._reserve(0)
+    assert 0 < wait <= 1.0
+
+    # The second call's slot is reserved, so the next one is a second behind it
+    _age_bucket(limiter, 2.0)
+    assert limiter._reserve(0) == 0
+
+
+def test_queued_callers_get_staggered_slots(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "ai_requests_per_minute", 60)
+
+    waits = [limiter._reserve(0) for _ in range(5)]
+
+    assert waits[0] == 0
+    for slot, wait in enumerate(waits[1:], start=1):
+        assert slot - 0.5 < wait <= slot
+
+
+def test_refill_is_capped_at_the_burst(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "ai_requests_per_minute", 60)
+    monkeypatch.setattr(settings, "ai_request_burst", 2)
+
+    assert limiter._reserve(0) == 0
+    _age_bucket(limiter, 3600)
+    assert limiter._reserve(0) == 0
+    assert limiter._reserve(0) == 0
+    assert limiter._reserve(0) > 0
+
+
+def test_settle_charges_underestimated_calls_as_debt(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "ai_tokens_per_minute", 6000)  # 100 tokens per second
+
+    assert limiter._reserve(1000) == 0
+    # The call really used 7000 tokens: the bucket goes 1000 into debt
+    limiter.settle(1000, 7000)
+
+    wait = limiter._reserve(100)
+    assert 10 < wait <= 11
+
+
+def test_settle_returns_overestimated_tokens(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "ai_tokens_per_minute", 6000)
+
+    assert limiter._reserve(5000) == 0
+    # Reserved 4000 tokens into debt: 40 seconds out
+    assert 39 < limiter._reserve(5000) <= 40
+    # Both calls really used 1000 tokens: 8000 go back in
+    limiter.settle(5000, 1000)
+    limiter.settle(5000, 1000)
+
+    assert limiter._reserve(1000) == 0
+
+
+def test_acquire_fails_instead_of_waiting_past_the_max(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "ai_requests_per_minute", 1)
+    monkeypatch.setattr(settings, "ai_rate_limit_max_wait_seconds", 5)
+
+    assert limiter.acquire() == 0
+    with pytest.raises(Exception, match="AI rate limit reached"):
+        limiter.acquire()
+    # A refused call reserves nothing, so it doesn't push back the callers after it
+    _age_bucket(limiter, 60)
+    assert limiter.acquire() == 0
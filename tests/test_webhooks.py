@@ -0,0 +1,137 @@
+"""Webhook inbox: Svix delivery dedup, the consumer's batch fallback and retention purge."""
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import update
+from app import crud
+from app.config import settings
+from app.models import WebhookEvent
+from app.services import webhook_events
+from app.services.webhook_events import WEBHOOK_MAX_ATTEMPTS, WebhookConsumer
+
+
+@pytest.fixture(autouse=True)
+def empty_inbox(db):
+    db.query(WebhookEvent).delete()
+    db.commit()
+    yield
+    db.rollback()
+    db.query(WebhookEvent).delete()
+    db.commit()
+
+
+def _payload(name: str) -> dict:
+    return {"type": "email.delivered", "data": {"to": [f"{name}@example.com"]}}
+
+
+def test_redelivery_with_same_svix_id_is_ignored(db):
+    first = crud.enqueue_webhook_event(db, "msg_1", "email.delivered", _payload("a"))
+    again = crud.enqueue_webhook_event(db, "msg_1", "email.delivered", _payload("a"))
+    other = crud.enqueue_webhook_event(db, "msg_2", "email.delivered", _payload("b"))
+
+    assert first is not None and other is not None
+    assert again is None
+    assert db.query(WebhookEvent).count() == 2
+
+
+def test_events_without_svix_id_are_always_queued(db):
+    first = crud.enqueue_webhook_event(db, None, "email.delivered", _payload("a"))
+    second = crud.enqueue_webhook_event(db, "", "email.delivered", _payload("a"))
+
+    assert first is not None and second is not None and first != second
+
+
+@pytest.fixture
+def poisoned_apply(monkeypatch):
+    """apply_events that fails any batch containing a "poison" event."""
+    def apply_events(db, payloads):
+        if any(payload.get("poison") for payload in payloads):
+            raise ValueError("bad event")
+        return [
+            {"status": "processed", "pitch_id": None, "tracking_pixel_id": None, "reason": None}
+            for _ in payloads
+        ]
+    monkeypatch.setattr(webhook_events, "apply_events", apply_events)
+
+
+def test_batch_is_applied_in_one_go(db, poisoned_apply):
+    for name in ("a", "b", "c"):
+        crud.enqueue_webhook_event(db, f"msg_{name}", "email.delivered", _payload(name))
+    consumer = WebhookConsumer(batch_size=10)
+
+    assert consumer.process_batch() == 3
+    assert consumer.batches == 1 and consumer.processed == 3
+    db.expire_all()
+    assert {row.status for row in db.query(WebhookEvent)} == {"processed"}
+
+
+def test_failed_batch_falls_back_to_one_event_at_a_time(db, poisoned_apply):
+    good = crud.enqueue_webhook_event(db, "msg_good", "email.delivered", _payload("good"))
+    bad = crud.enqueue_webhook_event(db, "msg_bad", "email.delivered", dict(_payload("bad"), poison=True))
+    consumer = WebhookConsumer(batch_size=10)
+
+    assert consumer.process_batch() == 2
+    db.expire_all()
+    good_row, bad_row = db.get(WebhookEvent, good), db.get(WebhookEvent, bad)
+    assert (good_row.status, good_row.attempts) == ("processed", 1)
+    # The bad event stays queued for another try
+    assert (bad_row.status, bad_row.attempts, bad_row.error) == ("pending", 1, "bad event")
+
+
+def test_event_fails_for_good_after_max_attempts(db, poisoned_apply):
+    bad = crud.enqueue_webhook_event(db, "msg_bad", "email.delivered", dict(_payload("bad"), poison=True))
+    consumer = WebhookConsumer(batch_size=10)
+
+    for _ in range(WEBHOOK_MAX_ATTEMPTS):
+        consumer.process_batch()
+
+    db.expire_all()
+    row = db.get(WebhookEvent, bad)
+    assert (row.status, row.attempts) == ("failed", WEBHOOK_MAX_ATTEMPTS)
+    assert row.processed_at is not None
+    assert consumer.failed == 1
+    assert consumer.process_batch() == 0
+
+
+def _inbox_row(db, name: str, status: str, processed_days_ago: float) -> int:
+    event_id = crud.enqueue_webhook_event(db, f"msg_{name}", "email.delivered", _payload(name))
+    db.execute(
+        update(WebhookEvent)
+        .where(WebhookEvent.id == event_id)
+        .values(status=status, processed_at=datetime.now(timezone.utc) - timedelta(days=processed_days_ago))
+    )
+    db.commit()
+    return event_id
+
+
+def test_purge_deletes_only_old_applied_events(db, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_retention_days", 7)
+    old_processed = _inbox_row(db, "old_processed", "processed", 8)
+    old_skipped = _inbox_row(db, "old_skipped", "skipped", 8)
+    recent = _inbox_row(db, "recent", "processed", 1)
+    failed = _inbox_row(db, "failed", "failed", 30)
+    pending = crud.enqueue_webhook_event(db, "msg_pending", "email.delivered", _payload("pending"))
+    consumer = WebhookConsumer()
+
+    assert consumer.purge() == 2
+    remaining = {row.id for row in db.query(WebhookEvent)}
+    assert remaining == {recent, failed, pending}
+    assert old_processed not in remaining and old_skipped not in remaining
+    assert consumer.stats()["purged"] == 2
+
+
+def test_purge_works_in_batches(db, monkeypatch):
+    monkeypatch.setattr(webhook_events, "WEBHOOK_PURGE_BATCH_SIZE", 2)
+    monkeypatch.setattr(webhook_events, "WEBHOOK_PURGE_MAX_BATCHES", 2)
+    for i in range(5):
+        _inbox_row(db, f"old{i}", "processed", 30)
+
+    # At most 2 batches of 2 per purge; the rest waits for the next one
+    assert WebhookConsumer().purge() == 4
+    assert db.query(WebhookEvent).count() == 1
+
+
+def test_retention_never_drops_below_the_svix_retry_window(db, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_retention_days", 0)
+    _inbox_row(db, "hours_old", "processed", 0.5)
+
+    assert WebhookConsumer().purge() == 0